@@ -16,12 +16,13 @@ from app.schemas.diagnosis import (
 )
 from app.models.medical_record import EnhancedMedicalRecord
 from app.models.user import User
+from app.services.inference.model_manager import model_manager
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-# Initialize MedGemma service
-medgemma_service = MedGemmaService()
+# MedGemma service, constructed by the model manager at startup or on first use
+model_manager.register('medgemma', MedGemmaService)
 
 @router.post("/analyze", response_model=EnhancedDiagnosisResponse)
 async def analyze_medical_data(
@@ -37,6 +38,8 @@ async def analyze_medical_data(
     Analyze medical data using MedGemma AI
     """
     try:
+        medgemma_service = await model_manager.get('medgemma')
+        
         # Convert symptoms to dictionary format
         symptoms_dict = [
             {
@@ -131,6 +134,8 @@ async def analyze_radiology_image(
     Specialized radiology analysis for different imaging modalities
     """
     try:
+        medgemma_service = await model_manager.get('medgemma')
+        
         contents = await file.read()
         image = Image.open(io.BytesIO(contents))
         
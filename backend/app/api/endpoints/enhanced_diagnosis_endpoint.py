@@ -1,10 +1,13 @@
 # app/api/endpoints/enhanced_diagnosis.py - Drop-in replacement for diagnosis.py
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Header
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 from PIL import Image
+import base64
 import io
 import logging
+import math
 
 from app.api import deps
 from app.services.enhanced_ai_service import EnhancedAIService  # NEW: MedGemma service
@@ -17,12 +20,44 @@ from app.schemas.diagnosis import (
 )
 from app.models.medical_record import MedicalRecord, EnhancedMedicalRecord  # NEW: Enhanced model
 from app.models.user import User
+from app.services.admission.gate import analysis_gate
+from app.services.admission.limiter import RateLimitExceededError
+from app.services.emergency.screening import triage_priority
+from app.services.inference.executor import InferenceQueueFullError
+from app.services.inference.model_manager import model_manager
+from app.services.inference.streaming import sse_frame
+from app.services.jobs.runner import job_runner
+from app.services.jobs.store import TERMINAL_STATES
+from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-# Initialize enhanced AI service with MedGemma
-ai_service = EnhancedAIService()
+# Enhanced AI service with MedGemma, constructed by the model manager at startup or on first use
+model_manager.register(
+    'enhanced_ai',
+    EnhancedAIService,
+    warmup=lambda service: service.medgemma_service.warmup()
+)
+
+async def _run_analysis_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Job body for /analyze-enhanced/jobs: the same analysis /analyze-enhanced runs inline"""
+    ai_service = await model_manager.get('enhanced_ai')
+    image = None
+    if payload.get('image'):
+        image = Image.open(io.BytesIO(base64.b64decode(payload['image'])))
+    return await ai_service.process_medical_data(
+        image=image,
+        symptoms=payload['symptoms'],
+        vital_signs=payload['vital_signs'],
+        risk_factors=payload['risk_factors'],
+        # Charged against the rate limit when the job was submitted, at the priority it was admitted at
+        tenant=payload.get('tenant'),
+        rate_limit=False,
+        priority=payload.get('priority')
+    )
+
+job_runner.register('enhanced_analysis', _run_analysis_job)
 
 @router.post("/analyze-enhanced", response_model=EnhancedDiagnosisResponse)
 async def analyze_medical_data_enhanced(
@@ -39,25 +74,11 @@ async def analyze_medical_data_enhanced(
     Maintains backward compatibility with your existing API
     """
     try:
-        # Convert symptoms to your existing format
-        symptoms_dict = [
-            {
-                'name': symptom.name,
-                'severity': symptom.severity,
-                'duration': symptom.duration,
-                'description': symptom.description
-            }
-            for symptom in symptoms
-        ]
-        
-        # Convert vital signs to your existing format
-        vital_signs_dict = {
-            'blood_pressure': vital_signs.blood_pressure,
-            'heart_rate': vital_signs.heart_rate,
-            'temperature': vital_signs.temperature,
-            'respiratory_rate': vital_signs.respiratory_rate,
-            'oxygen_saturation': vital_signs.oxygen_saturation
-        }
+        ai_service = await model_manager.get('enhanced_ai')
+        
+        # Convert symptoms and vital signs to your existing format
+        symptoms_dict = _symptoms_to_dict(symptoms)
+        vital_signs_dict = _vital_signs_to_dict(vital_signs)
         
         # Process medical image if provided
         image = None
@@ -70,7 +91,8 @@ async def analyze_medical_data_enhanced(
             image=image,
             symptoms=symptoms_dict,
             vital_signs=vital_signs_dict,
-            risk_factors={'age': current_user.age, **(patient_history or {})}
+            risk_factors={'age': current_user.age, **(patient_history or {})},
+            tenant=_tenant_key(current_user)
         )
         
         # Create enhanced medical record with MedGemma results
@@ -117,10 +139,249 @@ async def analyze_medical_data_enhanced(
         
         return response
         
+    except RateLimitExceededError as e:
+        raise _too_many_requests(e)
+    except InferenceQueueFullError as e:
+        logger.error(f"Inference queue full: {str(e)}")
+        raise _service_unavailable(e)
     except Exception as e:
         logger.error(f"Enhanced analysis failed: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
+@router.post("/analyze-enhanced/stream/clinical-reasoning")
+async def stream_clinical_reasoning(
+    *,
+    current_user: User = Depends(deps.get_current_user),
+    symptoms: List[SymptomInput],
+    vital_signs: VitalSigns,
+    patient_history: Optional[dict] = None
+):
+    """
+    Server-sent events for MedGemma clinical reasoning: a `token` event per
+    generated text delta, then a `result` event with the parsed JSON analysis
+    (only the `result` event when it is served from the response cache).
+    Admitted through the same rate limit and fair queue as /analyze-enhanced.
+    """
+    ai_service = await model_manager.get('enhanced_ai')
+    symptoms_dict = _symptoms_to_dict(symptoms)
+    vital_signs_dict = _vital_signs_to_dict(vital_signs)
+    tenant, priority = await _charge_stream(current_user, symptoms_dict, vital_signs_dict)
+    events = ai_service.medgemma_service.stream_clinical_reasoning(
+        symptoms=symptoms_dict,
+        vital_signs=vital_signs_dict,
+        history={'age': current_user.age, **(patient_history or {})}
+    )
+    return _event_stream(_admitted(tenant, priority, events))
+
+@router.post("/analyze-enhanced/stream/image")
+async def stream_image_analysis(
+    *,
+    current_user: User = Depends(deps.get_current_user),
+    file: UploadFile = File(...),
+    symptoms: Optional[str] = None
+):
+    """
+    Server-sent events for MedGemma image analysis: a `token` event per
+    generated text delta, then a `result` event with the parsed JSON analysis.
+    Admitted through the same rate limit and fair queue as /analyze-enhanced.
+    """
+    ai_service = await model_manager.get('enhanced_ai')
+    contents = await file.read()
+    try:
+        image = Image.open(io.BytesIO(contents))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid image file")
+    
+    symptoms_list = [{'name': symptoms, 'severity': 'moderate'}] if symptoms else None
+    tenant, priority = await _charge_stream(current_user, symptoms_list)
+    events = ai_service.medgemma_service.stream_image_analysis(image=image, symptoms=symptoms_list)
+    return _event_stream(_admitted(tenant, priority, events))
+
+@router.get("/analyze-enhanced/metrics")
+async def medgemma_metrics():
+    """
+    MedGemma model load state, text batching, time-to-first-token and per-priority
+    queue wait metrics, and per-user rate limiting and fair scheduling
+    """
+    ai_service = await model_manager.get('enhanced_ai')
+    return {**ai_service.medgemma_service.get_status(), 'admission': analysis_gate.get_metrics()}
+
+@router.post("/analyze-enhanced/jobs", status_code=202)
+async def submit_analysis_job(
+    *,
+    current_user: User = Depends(deps.get_current_user),
+    symptoms: List[SymptomInput],
+    vital_signs: VitalSigns,
+    medical_image: Optional[UploadFile] = File(None),
+    patient_history: Optional[dict] = None,
+    idempotency_key: Optional[str] = Header(None)
+):
+    """
+    Queue an /analyze-enhanced analysis and return its job id immediately.
+    
+    Poll GET /analyze-enhanced/jobs/{job_id} or subscribe to its /events stream for
+    the result. Resubmitting with the same Idempotency-Key header returns the
+    original job instead of queueing the work again. The job's priority comes from
+    the emergency pre-pass over its symptoms and vital signs, so flagged cases are
+    picked up ahead of routine ones (within the user's EMERGENCY_RATE_LIMIT_PER_MINUTE).
+    """
+    image = None
+    if medical_image:
+        image = base64.b64encode(await medical_image.read()).decode('ascii')
+    symptoms_dict = _symptoms_to_dict(symptoms)
+    vital_signs_dict = _vital_signs_to_dict(vital_signs)
+    priority = triage_priority(symptoms_dict, vital_signs_dict)
+    tenant = _tenant_key(current_user)
+    try:
+        priority = await analysis_gate.charge(tenant, priority)
+    except RateLimitExceededError as e:
+        raise _too_many_requests(e)
+    payload = {
+        'image': image,
+        'symptoms': symptoms_dict,
+        'vital_signs': vital_signs_dict,
+        'risk_factors': {'age': current_user.age, **(patient_history or {})},
+        'tenant': tenant,
+        'priority': priority
+    }
+    job, created = await job_runner.submit(
+        'enhanced_analysis',
+        payload,
+        priority=priority,
+        owner=str(current_user.id),
+        idempotency_key=idempotency_key
+    )
+    return {'job_id': job['id'], 'status': job['status'], 'created': created}
+
+@router.get("/analyze-enhanced/jobs/metrics")
+async def analysis_job_metrics():
+    """
+    Job queue depth by status and priority, retries, and queue wait and run time distributions
+    """
+    return await job_runner.get_metrics()
+
+@router.get("/analyze-enhanced/jobs/{job_id}")
+async def get_analysis_job(
+    job_id: str,
+    current_user: User = Depends(deps.get_current_user)
+):
+    """
+    Status of an analysis job, with its result once it has succeeded
+    """
+    return _job_view(await _owned_job(job_id, current_user))
+
+@router.get("/analyze-enhanced/jobs/{job_id}/events")
+async def stream_analysis_job(
+    job_id: str,
+    current_user: User = Depends(deps.get_current_user)
+):
+    """
+    Server-sent events for an analysis job: `status` events (also sent periodically
+    as a keep-alive while it waits or runs), then one `result` event when it finishes,
+    or a `not_found` event if the job is deleted meanwhile
+    """
+    job = await _owned_job(job_id, current_user)
+    
+    async def events():
+        current = job
+        while current['status'] not in TERMINAL_STATES:
+            yield {'event': 'status', 'data': _job_view(current)}
+            current = await job_runner.wait(job_id, timeout=15)
+            if current is None:
+                # Pruned (JOB_RETENTION_SECONDS) or otherwise removed while subscribed
+                yield {'event': 'not_found', 'data': {'job_id': job_id}}
+                return
+        yield {'event': 'result', 'data': _job_view(current)}
+    
+    return _event_stream(events())
+
+def _tenant_key(user: User) -> str:
+    """Rate limit and fair-share key of a user's analyses"""
+    return f"user:{user.id}"
+
+def _too_many_requests(e: RateLimitExceededError) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=str(e),
+        headers={"Retry-After": str(math.ceil(e.retry_after))}
+    )
+
+def _service_unavailable(e: InferenceQueueFullError) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail=str(e),
+        headers={"Retry-After": str(settings.INFERENCE_RETRY_AFTER_SECONDS)}
+    )
+
+async def _owned_job(job_id: str, user: User) -> Dict[str, Any]:
+    job = await job_runner.get(job_id)
+    if job is None or job['owner'] != str(user.id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+def _job_view(job: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'job_id': job['id'],
+        'status': job['status'],
+        'priority': job['priority'],
+        'attempts': job['attempts'],
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at'],
+        'result': job['result'],
+        'error': job['error']
+    }
+
+async def _charge_stream(user: User, symptoms=None, vital_signs=None) -> Tuple[str, int]:
+    """Charge a streamed analysis to the user's rate limit before the response starts, so excess is a 429"""
+    tenant = _tenant_key(user)
+    try:
+        return tenant, await analysis_gate.charge(tenant, triage_priority(symptoms, vital_signs))
+    except RateLimitExceededError as e:
+        raise _too_many_requests(e)
+
+async def _admitted(tenant: str, priority: int, events: AsyncIterator[Dict]) -> AsyncIterator[Dict]:
+    """Hold a fair-share analysis slot while ``events`` is generated; a full queue ends the stream with an `error` event"""
+    try:
+        async with analysis_gate.admit(tenant, priority, rate_limit=False):
+            async for event in events:
+                yield event
+    except InferenceQueueFullError as e:
+        logger.error(f"Inference queue full: {str(e)}")
+        yield {'event': 'error', 'data': {'error': str(e), 'retry_after': settings.INFERENCE_RETRY_AFTER_SECONDS}}
+
+def _event_stream(events: AsyncIterator[Dict]) -> StreamingResponse:
+    async def body():
+        async for event in events:
+            yield sse_frame(event)
+    
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        # Proxies must not buffer the stream or the first token arrives with the last
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _symptoms_to_dict(symptoms: List[SymptomInput]) -> List[Dict]:
+    return [
+        {
+            'name': symptom.name,
+            'severity': symptom.severity,
+            'duration': symptom.duration,
+            'description': symptom.description
+        }
+        for symptom in symptoms
+    ]
+
+def _vital_signs_to_dict(vital_signs: VitalSigns) -> Dict:
+    return {
+        'blood_pressure': vital_signs.blood_pressure,
+        'heart_rate': vital_signs.heart_rate,
+        'temperature': vital_signs.temperature,
+        'respiratory_rate': vital_signs.respiratory_rate,
+        'oxygen_saturation': vital_signs.oxygen_saturation
+    }
+
 # EDIT POINT 7: Keep your existing pneumonia endpoint but enhance it
 @router.post("/pneumonia/enhanced", response_model=dict)
 async def enhanced_pneumonia_analysis(
@@ -134,6 +395,8 @@ async def enhanced_pneumonia_analysis(
     Enhanced pneumonia analysis comparing MedGemma vs your existing model
     """
     try:
+        ai_service = await model_manager.get('enhanced_ai')
+        
         # Load image
         contents = await file.read()
         image = Image.open(io.BytesIO(contents))
@@ -155,6 +418,9 @@ async def enhanced_pneumonia_analysis(
             }
         }
         
+    except InferenceQueueFullError as e:
+        logger.error(f"Inference queue full: {str(e)}")
+        raise _service_unavailable(e)
     except Exception as e:
         logger.error(f"Enhanced pneumonia analysis failed: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -174,6 +440,8 @@ async def analyze_radiology_image(
     Leverages MedGemma's multimodal capabilities for specific imaging types
     """
     try:
+        ai_service = await model_manager.get('enhanced_ai')
+        
         contents = await file.read()
         image = Image.open(io.BytesIO(contents))
         
@@ -201,6 +469,9 @@ async def analyze_radiology_image(
             'recommendations': analysis.get('recommendations', [])
         }
         
+    except InferenceQueueFullError as e:
+        logger.error(f"Inference queue full: {str(e)}")
+        raise _service_unavailable(e)
     except Exception as e:
         logger.error(f"Radiology analysis failed: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -1,12 +1,20 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from typing import Optional
-import os
-import shutil
+from fastapi import APIRouter, UploadFile, File, Form, Header, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, List, Optional
+from collections import deque
+import asyncio
+import json
 import logging
-from pathlib import Path
+import math
+import time
 
 from ...schemas.pneumonia import PneumoniaPrediction, PneumoniaDiagnosisRequest
 from ...services.pneumonia_service import PneumoniaService
+from ...services.admission.gate import classification_gate
+from ...services.admission.limiter import RateLimitExceededError
+from ...services.inference.executor import InferenceQueueFullError, inference_executor
+from ...services.inference.model_manager import model_manager
+from ...core.config import settings
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -15,15 +23,48 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 pneumonia_service = PneumoniaService()
 
-# Create uploads directory if it doesn't exist
-UPLOAD_DIR = Path(__file__).parent.parent.parent.parent.parent / "uploads"
-UPLOAD_DIR.mkdir(exist_ok=True)
-logger.info(f"Upload directory: {UPLOAD_DIR}")
+# Register each architecture so it can be preloaded and warmed up at startup
+for _model_type in ('resnet50', 'densenet121', 'efficientnet_b0'):
+    model_manager.register(
+        f"pneumonia/{_model_type}",
+        lambda model_type=_model_type: pneumonia_service.load_model(model_type),
+        warmup=lambda _, model_type=_model_type: pneumonia_service.warmup(
+            model_type,
+            batch_sizes=settings.MODEL_WARMUP_BATCH_SIZES,
+            iterations=settings.MODEL_WARMUP_ITERATIONS
+        )
+    )
+
+def _tenant_key(http_request: Request, tenant_id: Optional[str]) -> str:
+    """
+    Rate limit and fair-share key: the X-Tenant-ID header (set by the gateway for
+    each hospital), else the client address
+    """
+    if tenant_id:
+        return f"tenant:{tenant_id}"
+    return f"client:{http_request.client.host if http_request.client else 'unknown'}"
+
+def _too_many_requests(e: RateLimitExceededError) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=str(e),
+        headers={"Retry-After": str(math.ceil(e.retry_after))}
+    )
+
+def _service_unavailable(e: InferenceQueueFullError) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail=str(e),
+        headers={"Retry-After": str(settings.INFERENCE_RETRY_AFTER_SECONDS)}
+    )
 
 @router.post("/diagnose", response_model=PneumoniaPrediction)
 async def diagnose_pneumonia(
+    http_request: Request,
     file: Optional[UploadFile] = File(None),
-    request: Optional[PneumoniaDiagnosisRequest] = None
+    request: Optional[PneumoniaDiagnosisRequest] = None,
+    model_type: Optional[str] = Form(None),
+    x_tenant_id: Optional[str] = Header(None)
 ):
     """
     Diagnose pneumonia from a chest X-ray image.
@@ -31,45 +72,38 @@ async def diagnose_pneumonia(
     Args:
         file: Uploaded chest X-ray image
         request: Optional request containing image_path and model_type
+        model_type: Classifier architecture or 'ensemble' for an uploaded file (default resnet50)
+        x_tenant_id: Tenant whose RATE_LIMIT_PER_MINUTE and capacity share the call uses
         
     Returns:
         PneumoniaPrediction: Prediction results including class and confidence
     """
+    tenant = _tenant_key(http_request, x_tenant_id)
     try:
         # Handle file upload
         if file:
             logger.info(f"Processing uploaded file: {file.filename}")
-            # Save uploaded file
-            file_path = UPLOAD_DIR / file.filename
             try:
-                with file_path.open("wb") as buffer:
-                    shutil.copyfileobj(file.file, buffer)
-                logger.info(f"File saved to: {file_path}")
-            except Exception as e:
-                logger.error(f"Error saving uploaded file: {str(e)}")
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Error saving uploaded file: {str(e)}"
+                # Decode straight from the upload's spooled buffer on the inference executor
+                return await pneumonia_service.predict_bytes_async(
+                    file.file,
+                    model_type=model_type or (request.model_type if request else 'resnet50'),
+                    tenant=tenant
                 )
-            
-            try:
-                # Make prediction
-                result = pneumonia_service.predict(
-                    str(file_path),
-                    model_type=request.model_type if request else 'resnet50'
+            except ValueError as e:
+                logger.error(f"Invalid image: {str(e)}")
+                raise HTTPException(
+                    status_code=400,
+                    detail=str(e)
                 )
-                
-                # Clean up uploaded file
-                os.remove(file_path)
-                logger.info(f"Temporary file removed: {file_path}")
-                
-                return result
-                
+            except RateLimitExceededError as e:
+                logger.warning(f"Rate limited {tenant}: {str(e)}")
+                raise _too_many_requests(e)
+            except InferenceQueueFullError as e:
+                logger.error(f"Inference queue full: {str(e)}")
+                raise _service_unavailable(e)
             except Exception as e:
-                # Clean up on error
-                if file_path.exists():
-                    os.remove(file_path)
-                    logger.info(f"Temporary file removed after error: {file_path}")
+                logger.error(f"Error processing image: {str(e)}")
                 raise HTTPException(
                     status_code=500,
                     detail=f"Error processing image: {str(e)}"
@@ -79,9 +113,10 @@ async def diagnose_pneumonia(
         elif request and request.image_path:
             logger.info(f"Processing file path: {request.image_path}")
             try:
-                return pneumonia_service.predict(
+                return await pneumonia_service.predict_async(
                     request.image_path,
-                    model_type=request.model_type
+                    model_type=request.model_type,
+                    tenant=tenant
                 )
             except FileNotFoundError as e:
                 logger.error(f"File not found: {str(e)}")
@@ -95,6 +130,12 @@ async def diagnose_pneumonia(
                     status_code=400,
                     detail=str(e)
                 )
+            except RateLimitExceededError as e:
+                logger.warning(f"Rate limited {tenant}: {str(e)}")
+                raise _too_many_requests(e)
+            except InferenceQueueFullError as e:
+                logger.error(f"Inference queue full: {str(e)}")
+                raise _service_unavailable(e)
             except Exception as e:
                 logger.error(f"Error processing image: {str(e)}")
                 raise HTTPException(
@@ -116,4 +157,112 @@ async def diagnose_pneumonia(
         raise HTTPException(
             status_code=500,
             detail=f"Unexpected error: {str(e)}"
-        ) 
\ No newline at end of file
+        )
+
+@router.post("/diagnose-batch")
+async def diagnose_pneumonia_batch(
+    http_request: Request,
+    files: List[UploadFile] = File(...),
+    model_type: str = Form('resnet50'),
+    x_tenant_id: Optional[str] = Header(None)
+):
+    """
+    Diagnose pneumonia for many chest X-ray images in one request.
+    
+    The call counts once against the tenant's rate limit; its images then share the
+    tenant's fair share of classification capacity, so a bulk import cannot starve
+    other tenants.
+    
+    Args:
+        files: Image files and/or zip/tar archives of images
+        model_type: Classifier architecture used for every image
+        x_tenant_id: Tenant whose rate limit and capacity share the batch uses
+        
+    Returns:
+        StreamingResponse: NDJSON, one line per image in input order followed by a summary line
+    """
+    tenant = _tenant_key(http_request, x_tenant_id)
+    try:
+        await classification_gate.charge(tenant)
+    except RateLimitExceededError as e:
+        raise _too_many_requests(e)
+    return StreamingResponse(
+        _stream_batch_results(files, model_type, tenant),
+        media_type="application/x-ndjson"
+    )
+
+async def _score_image(index: int, filename: str, data: bytes, model_type: str, tenant: str) -> dict:
+    try:
+        prediction = await pneumonia_service.predict_bytes_async(
+            data, model_type=model_type, tenant=tenant, rate_limit=False
+        )
+        return {'index': index, 'filename': filename, **prediction}
+    except Exception as e:
+        logger.error(f"Error processing {filename}: {str(e)}")
+        return {'index': index, 'filename': filename, 'error': str(e)}
+
+async def _stream_batch_results(files: List[UploadFile], model_type: str, tenant: str) -> AsyncIterator[str]:
+    """
+    Score images with a bounded number in flight so memory stays flat for large archives.
+    Pending images are batched together by the service's micro-batcher.
+    """
+    start = time.perf_counter()
+    pending = deque()
+    total = failed = 0
+    
+    def emit(result: dict) -> str:
+        nonlocal failed
+        if 'error' in result:
+            failed += 1
+        return json.dumps(result) + "\n"
+    
+    try:
+        for upload in files:
+            members = pneumonia_service.iter_upload(upload.file, upload.filename or '')
+            while True:
+                try:
+                    # Archive members are read and decompressed off the event loop
+                    member = await inference_executor.run('preprocess', next, members, None)
+                except Exception as e:
+                    logger.error(f"Error reading {upload.filename}: {str(e)}")
+                    while pending:
+                        yield emit(await pending.popleft())
+                    total += 1
+                    yield emit({'index': total - 1, 'filename': upload.filename, 'error': f"Unreadable upload: {str(e)}"})
+                    break
+                if member is None:
+                    break
+                
+                name, data = member
+                pending.append(asyncio.ensure_future(_score_image(total, name, data, model_type, tenant)))
+                total += 1
+                
+                # Emit finished results in order, and wait once the window is full
+                while pending and (pending[0].done() or len(pending) >= settings.PNEUMONIA_BULK_MAX_IN_FLIGHT):
+                    yield emit(await pending.popleft())
+        
+        while pending:
+            yield emit(await pending.popleft())
+        
+        yield json.dumps({
+            'summary': {
+                'total': total,
+                'succeeded': total - failed,
+                'failed': failed,
+                'elapsed_ms': (time.perf_counter() - start) * 1000
+            }
+        }) + "\n"
+    finally:
+        # Client went away mid-stream: drop work that nobody will read
+        for task in pending:
+            task.cancel()
+
+@router.get("/metrics")
+async def pneumonia_metrics():
+    """
+    Inference metrics for the pneumonia classifier.
+    
+    Returns:
+        dict: Batch size and queue wait distributions used to tune the batching window
+    """
+    return pneumonia_service.get_metrics()
\ No newline at end of file
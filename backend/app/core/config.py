@@ -44,11 +44,14 @@ class EnhancedSettings(BaseSettings):
     MEDGEMMA_MULTIMODAL_MODEL: str = "google/medgemma-4b-it"
     MEDGEMMA_TEXT_MODEL: str = "google/medgemma-27b-text-it"
     MEDGEMMA_CACHE_DIR: str = "./model_cache"
+    MEDGEMMA_IDLE_UNLOAD_SECONDS: float = 1800  # Release a model unused this long (0 = keep loaded)
     
     # Model parameters - EDIT POINT 11: Tune these for your use case
     MEDGEMMA_TEMPERATURE: float = 0.2          # Conservative for medical accuracy
-    MEDGEMMA_MAX_LENGTH: int = 2048            # Maximum response length
+    MEDGEMMA_MAX_LENGTH: int = 2048            # Maximum response length (prompt + output), image analysis
+    MEDGEMMA_TEXT_MAX_LENGTH: int = 3072       # Maximum response length (prompt + output), text model
     MEDGEMMA_TOP_P: float = 0.9                # Nucleus sampling parameter
+    MEDGEMMA_DO_SAMPLE: bool = True            # False = greedy decoding (deterministic output)
     
     # Legacy model paths (keep your existing paths)
     SISR_MODEL_PATH: str = "ml_models/image_enhancement/sisr_model.pth"
@@ -60,6 +63,13 @@ class EnhancedSettings(BaseSettings):
     CONSENSUS_THRESHOLD: float = 0.8           # Threshold for model agreement
     LEGACY_MODEL_WEIGHT: float = 0.3           # Weight for legacy models in consensus
     MEDGEMMA_MODEL_WEIGHT: float = 0.7         # Weight for MedGemma in consensus
+    ENABLE_MODEL_CASCADE: bool = True          # Skip MedGemma when legacy/expert confidence >= CONSENSUS_THRESHOLD
+    ANALYSIS_STAGE_TIMEOUTS: Dict[str, float] = {  # Seconds per analysis stage before it is reported as timed out
+        "legacy_cnn": 10.0,
+        "expert_system": 5.0,
+        "medgemma_image": 120.0,
+        "medgemma_clinical": 180.0
+    }
     
     # NEW: Emergency detection settings - EDIT POINT 12
     EMERGENCY_CONFIDENCE_THRESHOLD: float = 0.8
@@ -67,10 +77,13 @@ class EnhancedSettings(BaseSettings):
         "severe chest pain", "difficulty breathing", "unconscious",
         "severe bleeding", "stroke symptoms", "heart attack"
     ]
+    # Outside these limits a vital sign is an emergency, for triage and EmergencyDetectionService alike
     EMERGENCY_VITAL_SIGNS_THRESHOLDS: Dict[str, Dict[str, float]] = {
-        "heart_rate": {"min": 50, "max": 120},
+        "heart_rate": {"min": 40, "max": 150},
         "blood_pressure_systolic": {"min": 90, "max": 180},
+        "blood_pressure_diastolic": {"min": 60, "max": 120},
         "temperature": {"min": 35.0, "max": 39.5},
+        "respiratory_rate": {"min": 8, "max": 30},
         "oxygen_saturation": {"min": 90, "max": 100}
     }
     
@@ -113,37 +126,140 @@ class EnhancedSettings(BaseSettings):
     # NEW: API rate limiting
     RATE_LIMIT_PER_MINUTE: int = 60            # API calls per minute per user
     ANALYSIS_RATE_LIMIT: int = 10              # AI analyses per minute per user
+    # Emergency analyses skip ANALYSIS_RATE_LIMIT and the fair queue only within this quota;
+    # beyond it they are charged and queued like routine work (0 = no separate quota)
+    EMERGENCY_RATE_LIMIT_PER_MINUTE: int = 5
+    RATE_LIMIT_STORE_PATH: str = ""            # SQLite buckets shared by app instances ("" = per-process)
+    FAIR_SCHEDULER_CONCURRENCY: Dict[str, int] = {
+        "analysis": 2,                         # MedGemma analyses admitted at once, shared fairly per user
+        "classification": 32                   # Pneumonia classifications admitted at once
+    }
+    FAIR_SCHEDULER_WEIGHTS: Dict[str, float] = {}  # Capacity share per key, e.g. {"tenant:icu": 2.0} (default 1)
+    FAIR_SCHEDULER_MAX_QUEUE: int = 1024       # Requests waiting per scheduler before rejecting (0 = unbounded)
     
     # NEW: Model resource management
     GPU_MEMORY_FRACTION: float = 0.8           # Fraction of GPU memory to use
     BATCH_SIZE_MULTIMODAL: int = 1             # Batch size for multimodal model
     BATCH_SIZE_TEXT: int = 4                   # Batch size for text model
+    TEXT_CONTINUOUS_BATCHING: bool = True      # Merge concurrent clinical reasoning prompts into one decode batch
+    TEXT_MAX_TOKENS_IN_FLIGHT: int = 16384     # Prompt + max new tokens summed over the batch (0 = unbounded)
+    PREFIX_CACHE_ENABLED: bool = True          # Reuse the KV cache of static prompt preambles
+    PREFIX_CACHE_MAX_MB: int = 2048            # Memory budget for cached prompt prefixes, all models
+    # The response cache only serves greedy output (MEDGEMMA_DO_SAMPLE=False or temperature 0)
+    # unless LLM_RESPONSE_CACHE_SAMPLED opts sampled responses in
+    LLM_RESPONSE_CACHE_ENABLED: bool = True    # Reuse clinical reasoning for identical clinical data
+    LLM_RESPONSE_CACHE_MAX_ENTRIES: int = 2048  # In-memory LRU size
+    LLM_RESPONSE_CACHE_TTL_SECONDS: int = 3600  # Entry lifetime (0 = no expiry)
+    LLM_RESPONSE_CACHE_SAMPLED: bool = False   # Also cache responses generated with sampling
+    
+    # NEW: Speculative decoding - a small draft model proposes tokens, the text model verifies them in one pass
+    SPECULATIVE_DECODING_ENABLED: bool = False  # Text model prompts decode speculatively (bypasses continuous batching)
+    SPECULATIVE_DRAFT_MODEL: str = ""          # Must share the text model's tokenizer ("" = MEDGEMMA_MULTIMODAL_MODEL)
+    SPECULATIVE_NUM_DRAFT_TOKENS: int = 4      # Tokens proposed per verification pass
+    
+    # NEW: LLM backend - "transformers" (MedGemma weights in-process), "openai" (an OpenAI-compatible
+    # server such as vLLM) or "fake" (deterministic stand-in for benchmarks and load tests, no weights)
+    LLM_BACKEND: str = "transformers"
+    LLM_API_BASE_URL: str = "http://localhost:8001/v1"  # openai: server URL up to /chat/completions
+    LLM_API_KEY: str = ""                      # openai: sent as a bearer token when set
+    LLM_API_TIMEOUT_SECONDS: float = 300.0     # openai: connect and between-chunk timeout
+    LLM_API_MODELS: Dict[str, str] = {}        # openai: served name per role ("multimodal", "text"); default MEDGEMMA_*
+    FAKE_LLM_LATENCY_MS: float = 200.0         # fake: time to first token
+    FAKE_LLM_TOKENS_PER_SECOND: float = 30.0   # fake: decode rate (0 = whole response at once)
+    FAKE_LLM_RESPONSE_TOKENS: int = 256        # fake: approximate response length
+    
+    # NEW: Pneumonia classifier micro-batching
+    PNEUMONIA_BATCHING_ENABLED: bool = True    # Merge concurrent requests into one forward pass
+    PNEUMONIA_MAX_BATCH_SIZE: int = 16         # Upper bound on images per forward pass
+    PNEUMONIA_BATCH_MAX_WAIT_MS: float = 10.0  # How long the oldest request may wait for others
+    
+    # NEW: Inference executor pools (keep blocking model work off the event loop)
+    INFERENCE_POOL_SIZES: Dict[str, int] = {
+        "preprocess": 4,                       # Image decoding and transforms
+        "vision": 3,                           # CNN forward passes (one per ensemble member)
+        "llm": 1,                              # MedGemma generate() calls
+        "llm_http": 8                          # Requests in flight to an LLM server (LLM_BACKEND="openai")
+    }
+    INFERENCE_MAX_QUEUE_SIZE: int = 256        # Pending tasks per pool before rejecting (0 = unbounded)
+    INFERENCE_RETRY_AFTER_SECONDS: int = 5     # Retry-After of the 503 returned when a pool is full
+    
+    # NEW: Emergency-first scheduling - queued model work and jobs run by priority, from
+    # 1 (routine) to 5 (flagged by the EMERGENCY_KEYWORDS / EMERGENCY_VITAL_SIGNS_THRESHOLDS pre-pass)
+    SCHEDULER_PRIORITY_AGING_SECONDS: float = 30.0  # Queued work gains a tier per interval, up to 4 (0 = strict)
+    
+    # NEW: Startup preloading and warmup
+    PRELOAD_MODELS: List[str] = ["pneumonia/resnet50"]  # Components loaded before reporting ready
+    MODEL_WARMUP_BATCH_SIZES: List[int] = [1, 4]        # Synthetic batch sizes run after loading
+    MODEL_WARMUP_ITERATIONS: int = 2                    # Passes per warmup batch size
+    
+    # NEW: Disease classifier registry - "disease/architecture/version" -> checkpoint
+    # The last version listed for an architecture is the one served by default. List only
+    # checkpoints that exist; see ml_models/README.md for training other architectures
+    MODEL_CHECKPOINTS: Dict[str, str] = {
+        "pneumonia/resnet50/v1": "ml_models/disease_classifiers/pneumonia/models/best_model.pth"
+    }
+    MODEL_MEMORY_BUDGET_MB: float = 1024.0     # Resident classifier weights before LRU eviction (0 = unlimited)
+    
+    # NEW: Classifier inference engine - "eager", "torchscript" or "onnx" (see export_model.py)
+    PNEUMONIA_ENGINE: str = "eager"
+    ONNX_INTRA_OP_THREADS: int = 0             # ONNX Runtime intra-op threads (0 = runtime default)
+    PNEUMONIA_PRECISION: str = "fp32"          # "fp32" or "int8" (artifact from quantize_model.py)
+    
+    # NEW: Content-addressed prediction cache for repeated uploads
+    PREDICTION_CACHE_ENABLED: bool = True
+    PREDICTION_CACHE_MAX_ENTRIES: int = 10000  # In-memory LRU size
+    PREDICTION_CACHE_TTL_SECONDS: int = 86400  # Entry lifetime (0 = no expiry)
+    PREDICTION_CACHE_DIR: str = ""             # Directory for the persistent tier ("" = memory only)
+    CHECKPOINT_CHECK_INTERVAL_SECONDS: float = 5.0  # How often a checkpoint file is re-stat'ed for changes
+    
+    # NEW: Bulk scoring (/pneumonia/diagnose-batch)
+    PNEUMONIA_BULK_MAX_IN_FLIGHT: int = 64     # Images decoded/scored concurrently per request
+    PNEUMONIA_BULK_IMAGE_EXTENSIONS: List[str] = [".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff"]
+    
+    # NEW: Multi-process pneumonia inference (weights mmapped once, shared by all workers)
+    PNEUMONIA_WORKER_PROCESSES: int = 0        # 0 = run forward passes in the API process
+    PNEUMONIA_WORKER_THREADS: int = 0          # Torch threads per worker (0 = cores / workers)
+    # With workers enabled, INFERENCE_POOL_SIZES["vision"] bounds batches in flight; set it >= workers
+    
+    # NEW: Ensemble scoring (model_type="ensemble"); weights are normalized to sum to 1
+    # Members without a registered checkpoint, or that fail to load, are skipped and the rest renormalized
+    PNEUMONIA_ENSEMBLE_WEIGHTS: Dict[str, float] = {
+        "resnet50": 1.0
+    }
+    
+    # NEW: Asynchronous analysis jobs (/analyze-enhanced/jobs)
+    JOB_QUEUE_PATH: str = "./data/jobs.sqlite3"  # SQLite file backing the durable job queue
+    JOB_WORKERS: int = 2                       # Jobs processed concurrently
+    JOB_MAX_ATTEMPTS: int = 3                  # Runs per job before it is marked failed
+    JOB_RETRY_BACKOFF_SECONDS: float = 5.0     # Delay before the first retry, doubled for each further one
+    JOB_TIMEOUT_SECONDS: float = 900.0         # Upper bound on a single run (0 = none)
+    JOB_RETENTION_SECONDS: int = 604800        # Finished jobs are deleted after this long (0 = keep)
+    JOB_LEASE_SECONDS: float = 60.0            # A running job is requeued if its worker stops renewing it this long
     
     class Config:
         case_sensitive = True
         env_file = ".env"
 
 # EDIT POINT 16: Specialty-specific prompt templates
+# Instructions come before the {fields} so their KV cache can be reused across patients
 PROMPT_TEMPLATES = {
     "general_analysis": """
     Medical Case Analysis:
-    Patient Information: {patient_info}
-    Symptoms: {symptoms}
-    Vital Signs: {vital_signs}
-    Medical History: {history}
-    
     Please provide a comprehensive medical analysis including:
     1. Primary diagnosis with confidence level
     2. Differential diagnoses (top 3)
     3. Recommended tests and follow-up
     4. Risk assessment
     5. Emergency indicators
+    
+    Patient Information: {patient_info}
+    Symptoms: {symptoms}
+    Vital Signs: {vital_signs}
+    Medical History: {history}
     """,
     
     "chest_xray_analysis": """
     Chest X-ray Analysis:
-    Clinical Context: {clinical_context}
-    
     Please analyze this chest X-ray for:
     1. Pulmonary findings (pneumonia, pneumothorax, effusion)
     2. Cardiac silhouette assessment
@@ -151,35 +267,37 @@ PROMPT_TEMPLATES = {
     4. Overall impression and recommendations
     
     Consider the clinical context in your analysis.
+    
+    Clinical Context: {clinical_context}
     """,
     
     "emergency_assessment": """
     EMERGENCY MEDICAL ASSESSMENT:
-    Presenting Symptoms: {symptoms}
-    Vital Signs: {vital_signs}
-    Duration: {duration}
-    
     Urgent Assessment Required:
     1. Immediate life-threatening conditions
     2. Triage level (1-5)
     3. Required immediate interventions
     4. Specialist consultation needs
     5. Time-sensitive diagnostics
+    
+    Presenting Symptoms: {symptoms}
+    Vital Signs: {vital_signs}
+    Duration: {duration}
     """,
     
     "chronic_disease_monitoring": """
     Chronic Disease Monitoring:
-    Conditions: {chronic_conditions}
-    Current Symptoms: {symptoms}
-    Medications: {medications}
-    Recent Changes: {changes}
-    
     Assessment Focus:
     1. Disease progression evaluation
     2. Medication effectiveness
     3. Complications screening
     4. Lifestyle recommendations
     5. Follow-up scheduling
+    
+    Conditions: {chronic_conditions}
+    Current Symptoms: {symptoms}
+    Medications: {medications}
+    Recent Changes: {changes}
     """
 }
 
@@ -1,11 +1,28 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from app.core.config import settings
 from app.api.api_v1.api import api_router
+from app.services.inference.executor import inference_executor
+from app.services.inference.model_manager import model_manager
+from app.services.jobs.runner import job_runner
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Preload and warm up configured models; /health/ready reports 503 until done
+    model_manager.start(settings.PRELOAD_MODELS)
+    await job_runner.start()
+    yield
+    await job_runner.stop()
+    await model_manager.stop()
+    inference_executor.shutdown(wait=False)
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan
 )
 
 # Set up CORS middleware
@@ -22,4 +39,13 @@ app.include_router(api_router, prefix=settings.API_V1_STR)
 
 @app.get("/")
 async def root():
-    return {"message": "Welcome to MedFlow API"} 
\ No newline at end of file
+    return {"message": "Welcome to MedFlow API"}
+
+@app.get("/health/live")
+async def liveness():
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness():
+    status = model_manager.get_status()
+    return JSONResponse(status_code=200 if status['ready'] else 503, content=status)
\ No newline at end of file
@@ -2,13 +2,23 @@ from pydantic import BaseModel
 from typing import Optional
 from fastapi import UploadFile
 
+class PneumoniaModelPrediction(BaseModel):
+    """Schema for a single architecture's prediction within an ensemble"""
+    prediction: str
+    confidence: float
+    probabilities: dict[str, float]
+
 class PneumoniaPrediction(BaseModel):
     """Schema for pneumonia prediction response"""
     prediction: str  # 'NORMAL' or 'PNEUMONIA'
     confidence: float
     probabilities: dict[str, float]  # {'NORMAL': 0.2, 'PNEUMONIA': 0.8}
+    models: Optional[dict[str, PneumoniaModelPrediction]] = None  # Per-architecture results (ensemble only)
+    weights: Optional[dict[str, float]] = None  # Normalized ensemble weights (ensemble only)
+    skipped: Optional[dict[str, str]] = None  # Members left out for lack of a checkpoint, with the reason (ensemble only)
+    failed: Optional[dict[str, str]] = None  # Members whose inference failed, with the error (ensemble only)
 
 class PneumoniaDiagnosisRequest(BaseModel):
     """Schema for pneumonia diagnosis request"""
     image_path: Optional[str] = None  # Path to image if already on server
-    model_type: str = 'resnet50'  # Default to ResNet50, can be 'densenet121' or 'efficientnet_b0' 
\ No newline at end of file
+    model_type: str = 'resnet50'  # Default to ResNet50, can be 'densenet121', 'efficientnet_b0' or 'ensemble' 
\ No newline at end of file
@@ -0,0 +1,128 @@
+import asyncio
+import heapq
+import logging
+import time
+from contextlib import asynccontextmanager
+from itertools import count
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from app.services.inference.executor import InferenceQueueFullError
+from app.services.inference.metrics import Histogram
+from app.services.inference.priority import EMERGENCY_PRIORITY, ROUTINE_PRIORITY
+
+logger = logging.getLogger(__name__)
+
+
+class FairScheduler:
+    """
+    Weighted fair queueing of work from many keys (users, tenants) onto ``capacity`` slots.
+
+    When every slot is busy, waiters are ordered by start-time fair queueing: each
+    request is tagged ``max(virtual time, its key's previous finish tag)`` and its
+    finish tag adds ``cost / weight``. Slots go to the smallest start tag, so a key
+    with a thousand queued requests gets its weighted share while others still get
+    theirs, instead of everyone waiting behind it. Emergency priority requests skip
+    the fair ordering and take the next free slot.
+
+    Runs on a single event loop; use ``async with scheduler.slot(key):``.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        capacity: int,
+        weights: Optional[Dict[str, float]] = None,
+        max_queue: int = 0
+    ):
+        self.name = name
+        self.capacity = max(1, capacity)
+        self.weights = weights or {}
+        self.max_queue = max_queue
+        self._virtual_time = 0.0
+        self._finish: Dict[str, float] = {}
+        self._waiters: List[Tuple[int, float, int, str, asyncio.Future]] = []
+        self._seq = count()
+        self._active = 0
+        self._active_by_key: Dict[str, int] = {}
+        self.queue_wait_ms = Histogram()
+        self.admitted = 0
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def slot(self, key: str, cost: float = 1.0, priority: int = ROUTINE_PRIORITY) -> AsyncIterator[None]:
+        """Hold one slot for ``key`` while the block runs, waiting for a fair turn if all are busy"""
+        await self._acquire(key, cost, priority)
+        try:
+            yield
+        finally:
+            self._release(key)
+
+    async def _acquire(self, key: str, cost: float, priority: int):
+        start_tag = max(self._virtual_time, self._finish.get(key, 0.0))
+        self._finish[key] = start_tag + cost / self.weights.get(key, 1.0)
+
+        while self._waiters and self._waiters[0][-1].done():
+            heapq.heappop(self._waiters)  # cancelled while waiting
+        if self._active < self.capacity and not self._waiters:
+            self._grant(key, start_tag)
+            return
+        if self.max_queue and len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise InferenceQueueFullError(
+                f"Fair scheduler '{self.name}' is full ({len(self._waiters)} requests waiting)"
+            )
+
+        waiter = asyncio.get_running_loop().create_future()
+        # Emergencies sort ahead of every fair-queued request
+        tier = 0 if priority >= EMERGENCY_PRIORITY else 1
+        heapq.heappush(self._waiters, (tier, start_tag, next(self._seq), key, waiter))
+        enqueued_at = time.perf_counter()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted in the same tick the caller gave up: hand the slot on
+                self._release(key)
+            raise
+        self.queue_wait_ms.observe((time.perf_counter() - enqueued_at) * 1000)
+
+    def _grant(self, key: str, start_tag: float):
+        self._virtual_time = max(self._virtual_time, start_tag)
+        self._active += 1
+        self._active_by_key[key] = self._active_by_key.get(key, 0) + 1
+        self.admitted += 1
+
+    def _release(self, key: str):
+        self._active -= 1
+        remaining = self._active_by_key.get(key, 1) - 1
+        if remaining:
+            self._active_by_key[key] = remaining
+        else:
+            self._active_by_key.pop(key, None)
+
+        while self._waiters and self._active < self.capacity:
+            _, start_tag, _, waiter_key, waiter = heapq.heappop(self._waiters)
+            if waiter.done():
+                continue  # cancelled while waiting
+            self._grant(waiter_key, start_tag)
+            waiter.set_result(None)
+
+        if len(self._finish) > 1024:
+            # Keys whose finish tag has passed would restart at the virtual time anyway
+            self._finish = {k: tag for k, tag in self._finish.items() if tag > self._virtual_time}
+
+    def get_metrics(self) -> Dict[str, Any]:
+        waiting: Dict[str, int] = {}
+        for _, _, _, key, waiter in self._waiters:
+            if not waiter.done():
+                waiting[key] = waiting.get(key, 0) + 1
+        return {
+            'capacity': self.capacity,
+            'active': self._active,
+            'queue_depth': sum(waiting.values()),
+            'active_by_key': dict(self._active_by_key),
+            'waiting_by_key': waiting,
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+            'queue_wait_ms': self.queue_wait_ms.snapshot()
+        }
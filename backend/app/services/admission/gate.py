@@ -0,0 +1,111 @@
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+from app.core.config import settings
+from app.services.inference.priority import EMERGENCY_PRIORITY, ROUTINE_PRIORITY
+
+from .fair import FairScheduler
+from .limiter import RateLimiter, RateLimitExceededError
+from .store import BucketStore, LocalBucketStore, SQLiteBucketStore
+
+
+class AdmissionGate:
+    """
+    Per-key admission for one kind of AI work: a rate limit, then a fair share of capacity.
+
+    Emergency priority comes from client-supplied symptoms and vitals, so it is
+    honoured within a separate ``emergency_limiter`` quota per key: those requests
+    skip the regular limit and the fair queue. Emergencies beyond that quota, or
+    all of them without one, are charged and queued like routine work. Callers that
+    already charged the limit for a request (a job at submission, a bulk upload
+    once per call) pass ``rate_limit=False`` and the priority ``charge`` returned
+    for the work it fans out into. A ``key`` of None (internal callers: warmup,
+    scripts) is admitted unconditionally.
+    """
+
+    def __init__(
+        self,
+        limiter: RateLimiter,
+        scheduler: FairScheduler,
+        emergency_limiter: Optional[RateLimiter] = None
+    ):
+        self.limiter = limiter
+        self.scheduler = scheduler
+        self.emergency_limiter = emergency_limiter
+        self.emergencies_admitted = 0
+        self.emergencies_demoted = 0
+
+    @asynccontextmanager
+    async def admit(
+        self,
+        key: Optional[str],
+        priority: int = ROUTINE_PRIORITY,
+        rate_limit: bool = True
+    ) -> AsyncIterator[None]:
+        if key is None:
+            yield
+            return
+        if rate_limit:
+            priority = await self.charge(key, priority)
+        async with self.scheduler.slot(key, priority=priority):
+            yield
+
+    async def charge(self, key: str, priority: int = ROUTINE_PRIORITY) -> int:
+        """
+        Apply the rate limit alone, for work that is admitted later with ``rate_limit=False``.
+        Returns the priority to admit it at: an emergency past its quota is demoted.
+        """
+        if priority >= EMERGENCY_PRIORITY:
+            if self.emergency_limiter is not None:
+                try:
+                    await self.emergency_limiter.check_async(key)
+                    self.emergencies_admitted += 1
+                    return priority
+                except RateLimitExceededError:
+                    pass
+            self.emergencies_demoted += 1
+            priority = EMERGENCY_PRIORITY - 1
+        await self.limiter.check_async(key)
+        return priority
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            'rate_limit': self.limiter.get_metrics(),
+            'emergency_rate_limit': self.emergency_limiter.get_metrics() if self.emergency_limiter is not None else {},
+            # Emergencies let past the regular limit and fair queue, and those treated as routine
+            'emergencies_admitted': self.emergencies_admitted,
+            'emergencies_demoted': self.emergencies_demoted,
+            'fair_scheduler': self.scheduler.get_metrics()
+        }
+
+
+def _bucket_store(path: Optional[str]) -> BucketStore:
+    return SQLiteBucketStore(path) if path else LocalBucketStore()
+
+
+bucket_store = _bucket_store(settings.RATE_LIMIT_STORE_PATH)
+
+# MedGemma analyses (EnhancedAIService.process_medical_data)
+analysis_gate = AdmissionGate(
+    RateLimiter('analysis', bucket_store, settings.ANALYSIS_RATE_LIMIT),
+    FairScheduler(
+        'analysis',
+        settings.FAIR_SCHEDULER_CONCURRENCY.get('analysis', 1),
+        weights=settings.FAIR_SCHEDULER_WEIGHTS,
+        max_queue=settings.FAIR_SCHEDULER_MAX_QUEUE
+    ),
+    emergency_limiter=RateLimiter(
+        'analysis-emergency', bucket_store, settings.EMERGENCY_RATE_LIMIT_PER_MINUTE
+    ) if settings.EMERGENCY_RATE_LIMIT_PER_MINUTE > 0 else None
+)
+
+# Pneumonia classifications (PneumoniaService.predict*)
+classification_gate = AdmissionGate(
+    RateLimiter('api', bucket_store, settings.RATE_LIMIT_PER_MINUTE),
+    FairScheduler(
+        'classification',
+        settings.FAIR_SCHEDULER_CONCURRENCY.get('classification', 1),
+        weights=settings.FAIR_SCHEDULER_WEIGHTS,
+        max_queue=settings.FAIR_SCHEDULER_MAX_QUEUE
+    )
+)
@@ -0,0 +1,60 @@
+from typing import Any, Dict
+
+from .store import BucketStore
+
+
+class RateLimitExceededError(RuntimeError):
+    """Raised when a key has used up its quota; ``retry_after`` is in seconds"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """
+    Token-bucket limit of ``per_minute`` requests per key.
+
+    Each key's bucket holds up to ``burst`` tokens (default: one minute's worth)
+    and refills continuously, so short bursts pass while the sustained rate stays
+    at the limit. Buckets live in ``store``; a shared store makes the limit global
+    across app instances.
+    """
+
+    def __init__(self, name: str, store: BucketStore, per_minute: float, burst: float = 0):
+        self.name = name
+        self.store = store
+        self.per_minute = per_minute
+        self.burst = burst or per_minute
+        self.allowed = 0
+        self.limited = 0
+
+    def check(self, key: str, cost: float = 1.0):
+        """Take ``cost`` tokens from ``key``'s bucket or raise RateLimitExceededError"""
+        if self.per_minute <= 0:
+            return
+        self._record(self.store.take(f"{self.name}:{key}", cost, self.per_minute / 60.0, self.burst))
+
+    async def check_async(self, key: str, cost: float = 1.0):
+        """``check`` without blocking the event loop on the bucket store"""
+        if self.per_minute <= 0:
+            return
+        self._record(await self.store.take_async(f"{self.name}:{key}", cost, self.per_minute / 60.0, self.burst))
+
+    def _record(self, retry_after: float):
+        if retry_after:
+            self.limited += 1
+            raise RateLimitExceededError(
+                f"Rate limit of {self.per_minute:g} {self.name} requests per minute exceeded",
+                retry_after
+            )
+        self.allowed += 1
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            'per_minute': self.per_minute,
+            'burst': self.burst,
+            'store': type(self.store).__name__,
+            'allowed': self.allowed,
+            'limited': self.limited
+        }
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class BucketStore(ABC):
+    """
+    Where token buckets live.
+
+    ``take`` must refill and debit a bucket atomically, so every app instance that
+    shares a store enforces one global quota. A networked store (e.g. Redis with a
+    server-side script) implements the same method.
+    """
+
+    @abstractmethod
+    def take(self, key: str, cost: float, rate: float, capacity: float) -> float:
+        """
+        Refill bucket ``key`` at ``rate`` tokens/second up to ``capacity``, then take
+        ``cost`` tokens. Returns 0 if they were taken, otherwise the seconds until
+        enough will have accumulated (nothing is taken).
+        """
+
+    async def take_async(self, key: str, cost: float, rate: float, capacity: float) -> float:
+        """``take`` from the event loop; stores that block on I/O run it elsewhere"""
+        return self.take(key, cost, rate, capacity)
+
+    def close(self):
+        pass
+
+
+def _debit(tokens: float, elapsed: float, cost: float, rate: float, capacity: float) -> Tuple[float, float]:
+    """Bucket level after refilling for ``elapsed`` seconds and taking ``cost``, and the wait if it cannot"""
+    tokens = min(capacity, tokens + max(0.0, elapsed) * rate)
+    if tokens >= cost:
+        return tokens - cost, 0.0
+    return tokens, (cost - tokens) / rate if rate > 0 else float('inf')
+
+
+class LocalBucketStore(BucketStore):
+    """In-process buckets; each app instance enforces its own quota"""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, cost: float, rate: float, capacity: float) -> float:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens, wait = _debit(tokens, now - updated, cost, rate, capacity)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now, rate, capacity)
+            return wait
+
+    def _prune(self, now: float, rate: float, capacity: float):
+        # A bucket that has refilled completely is the same as no bucket at all
+        self._buckets = {
+            key: (tokens, updated) for key, (tokens, updated) in self._buckets.items()
+            if tokens + (now - updated) * rate < capacity
+        }
+
+
+class SQLiteBucketStore(BucketStore):
+    """
+    Buckets in a SQLite file, shared by every app instance on the host that opens it.
+
+    Each ``take`` is one IMMEDIATE transaction, which serialises writers across
+    processes; it is the local stand-in for a shared store such as Redis. Bucket
+    timestamps are wall-clock time because they are compared between processes.
+    A transaction can wait on another process's lock, so ``take_async`` runs it on
+    a dedicated thread rather than the event loop.
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rate-limit-store")
+        self._db = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+        logger.info(f"Rate limit buckets at {path}")
+
+    def take(self, key: str, cost: float, rate: float, capacity: float) -> float:
+        with self._lock:
+            now = time.time()
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+                tokens, updated = row if row is not None else (capacity, now)
+                tokens, wait = _debit(tokens, now - updated, cost, rate, capacity)
+                self._db.execute(
+                    "INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                    (key, tokens, now)
+                )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            return wait
+
+    async def take_async(self, key: str, cost: float, rate: float, capacity: float) -> float:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._thread, self.take, key, cost, rate, capacity)
+
+    def prune(self, idle_s: float) -> int:
+        """Delete buckets untouched for ``idle_s`` seconds (refilled, so equivalent to absent)"""
+        with self._lock:
+            return self._db.execute("DELETE FROM buckets WHERE updated < ?", (time.time() - idle_s,)).rowcount
+
+    def close(self):
+        self._thread.shutdown(wait=True)
+        with self._lock:
+            self._db.close()
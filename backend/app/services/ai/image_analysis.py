@@ -1,8 +1,10 @@
 from typing import Dict, List, Optional, Union
+import cv2
 import numpy as np
 from loguru import logger
 from app.core.config import settings
 from app.services.ai.medgemma_service import MedGemmaService
+from app.services.inference.executor import inference_executor
 
 class ImageAnalysisService:
     """Service for medical image analysis"""
@@ -54,35 +56,42 @@ class ImageAnalysisService:
         image_data: Union[str, bytes],
         modality: str
     ) -> np.ndarray:
-        """Preprocess image for analysis"""
+        """Preprocess image for analysis on the inference executor"""
         try:
-            # Convert image to numpy array
-            if isinstance(image_data, str):
-                # Handle file path
-                import cv2
-                image = cv2.imread(image_data)
-            else:
-                # Handle bytes
-                import cv2
-                nparr = np.frombuffer(image_data, np.uint8)
-                image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            
-            # Apply modality-specific preprocessing
-            if modality.lower() == "xray":
-                image = self._preprocess_xray(image)
-            elif modality.lower() == "ct":
-                image = self._preprocess_ct(image)
-            elif modality.lower() == "mri":
-                image = self._preprocess_mri(image)
-            elif modality.lower() == "ultrasound":
-                image = self._preprocess_ultrasound(image)
-            
-            return image
-            
+            return await inference_executor.run(
+                'preprocess', self._preprocess_image_sync, image_data, modality
+            )
         except Exception as e:
             logger.error(f"Image preprocessing failed: {str(e)}")
             raise
     
+    def _preprocess_image_sync(
+        self,
+        image_data: Union[str, bytes],
+        modality: str
+    ) -> np.ndarray:
+        """Blocking decode and modality-specific preprocessing"""
+        # Convert image to numpy array
+        if isinstance(image_data, str):
+            # Handle file path
+            image = cv2.imread(image_data)
+        else:
+            # Handle bytes
+            nparr = np.frombuffer(image_data, np.uint8)
+            image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        
+        # Apply modality-specific preprocessing
+        if modality.lower() == "xray":
+            image = self._preprocess_xray(image)
+        elif modality.lower() == "ct":
+            image = self._preprocess_ct(image)
+        elif modality.lower() == "mri":
+            image = self._preprocess_mri(image)
+        elif modality.lower() == "ultrasound":
+            image = self._preprocess_ultrasound(image)
+        
+        return image
+    
     def _preprocess_xray(self, image: np.ndarray) -> np.ndarray:
         """Preprocess X-ray image"""
         # Convert to grayscale
@@ -1,42 +1,119 @@
 # app/services/enhanced_ai_service.py - Completely rebuilt with MedGemma
 import os
+import time
+import asyncio
 import torch
-import torch.nn as nn
 from PIL import Image
-import numpy as np
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Awaitable, AsyncIterator
 import sys
-from transformers import AutoTokenizer, AutoModelForCausalLM
 import json
+import hashlib
 import logging
 
 # Import your existing models for comparison
 sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'ml_models'))
 from disease_classifiers.pneumonia.training.pneumonia_classifier import get_model as get_pneumonia_model
+from disease_classifiers.pneumonia.training.preprocessing import Preprocessor
 from expert_system.rules_engine.inference import ExpertSystem
+from app.core.config import settings, PROMPT_TEMPLATES
+from app.services.admission.gate import analysis_gate
+from app.services.emergency.screening import screen_emergency, triage_priority
+from app.services.inference.cache import ResultCache
+from app.services.inference.executor import inference_executor
+from app.services.inference.json_stream import JsonSchema, parse_json_object
+from app.services.inference.metrics import Histogram
+from app.services.inference.prefix_cache import template_prefix
+from app.services.inference.priority import ROUTINE_PRIORITY
+from app.services.inference.streaming import TokenStream
+from app.services.llm.base import MULTIMODAL, TEXT, build_llm_backend
 
 logger = logging.getLogger(__name__)
 
 class MedGemmaService:
+    # EDIT POINT 2: Customize for different imaging modalities
+    # Fixed instructions lead each prompt so their KV cache is computed once and reused;
+    # the patient-specific context follows them
+    IMAGE_ANALYSIS_PREFIX = """
+        <image>
+        Medical Image Analysis Request:
+        
+        Please analyze this medical image and provide:
+        1. Detailed imaging findings
+        2. Most likely diagnosis with confidence percentage
+        3. Differential diagnoses (top 3 alternatives)
+        4. Urgency level (1-5 scale, 5 being emergency)
+        5. Recommended follow-up imaging or tests
+        6. Clinical correlation with reported symptoms
+        
+        Respond in JSON format with fields: findings, primary_diagnosis, differential_diagnoses, urgency_level, recommendations, clinical_correlation
+        
+"""
+    IMAGE_ANALYSIS_SCHEMA: JsonSchema = {
+        'findings': (str, list, dict),
+        'primary_diagnosis': (str, dict),
+        'differential_diagnoses': list,
+        'urgency_level': (int, float, str),
+        'recommendations': (list, str),
+        'clinical_correlation': (str, dict)
+    }
+    
+    # EDIT POINT 3: Customize clinical reasoning prompts for your hospital protocols
+    CLINICAL_REASONING_PREFIX = """
+        Clinical Case Analysis:
+        
+        As an experienced physician, please provide:
+        1. Systematic review of symptoms and vital signs
+        2. Most likely primary diagnosis with confidence level
+        3. Complete differential diagnosis list (rank by probability)
+        4. Risk stratification (low/moderate/high risk)
+        5. Immediate management plan
+        6. Diagnostic workup recommendations
+        7. Follow-up timeline
+        8. Warning signs that would require emergency care
+        
+        Use evidence-based medicine principles and current clinical guidelines.
+        Respond in structured JSON format with fields: symptom_review, primary_diagnosis, differential_diagnoses, risk_stratification, management_plan, diagnostic_workup, follow_up, warning_signs
+        
+"""
+    CLINICAL_REASONING_SCHEMA: JsonSchema = {
+        'symptom_review': (str, list, dict),
+        'primary_diagnosis': (str, dict),
+        'differential_diagnoses': list,
+        'risk_stratification': (str, dict),
+        'management_plan': (str, list, dict),
+        'diagnostic_workup': (str, list, dict),
+        'follow_up': (str, list, dict),
+        'warning_signs': (str, list)
+    }
+    
     def __init__(self):
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         
-        # Load MedGemma models
-        logger.info("Loading MedGemma models...")
-        self.multimodal_model = AutoModelForCausalLM.from_pretrained(
-            "google/medgemma-4b-it",
-            torch_dtype=torch.float16,
-            device_map="auto"
-        )
-        self.text_model = AutoModelForCausalLM.from_pretrained(
-            "google/medgemma-27b-text-it",
-            torch_dtype=torch.float16,
-            device_map="auto"
-        )
-        self.tokenizer = AutoTokenizer.from_pretrained("google/medgemma-4b-it")
+        # Time to first streamed token per analysis type
+        self.ttft_ms = {'image_analysis': Histogram(), 'clinical_reasoning': Histogram()}
+        
+        # EDIT POINT 11 parameters, shared by every MedGemma generation (max_length is per model)
+        self.generation_params = {
+            'max_length': {MULTIMODAL: settings.MEDGEMMA_MAX_LENGTH, TEXT: settings.MEDGEMMA_TEXT_MAX_LENGTH},
+            'temperature': settings.MEDGEMMA_TEMPERATURE,
+            'top_p': settings.MEDGEMMA_TOP_P,
+            'do_sample': settings.MEDGEMMA_DO_SAMPLE
+        }
+        # Where prompts are generated: local weights, an LLM server or a fake (LLM_BACKEND)
+        self.backend = build_llm_backend(settings.LLM_BACKEND, self.generation_params)
+        # Clinical reasoning results for identical clinical data, shared by concurrent requests
+        self.response_cache = None
+        self.response_cache_bypasses = 0
+        if settings.LLM_RESPONSE_CACHE_ENABLED:
+            self.response_cache = ResultCache(
+                'medgemma_clinical_reasoning',
+                max_entries=settings.LLM_RESPONSE_CACHE_MAX_ENTRIES,
+                ttl_seconds=settings.LLM_RESPONSE_CACHE_TTL_SECONDS
+            )
         
         # Keep your existing models for validation/comparison
         self.legacy_pneumonia_model = None
+        self.preprocessor = Preprocessor(max_batch_size=1)
         self.expert_system = ExpertSystem()
         
         # EDIT POINT 1: Add more disease classifiers from your existing work
@@ -44,7 +121,20 @@ class MedGemmaService:
             'pneumonia': self._load_legacy_pneumonia_model(),
             # Add tuberculosis, COVID-19, brain tumor models here
         }
+        self.legacy_pneumonia_model = self.disease_models['pneumonia']
         
+    def get_status(self) -> Dict:
+        """LLM backend state (model load state and batching metrics for local weights) and response metrics"""
+        return {
+            'backend': self.backend.name,
+            **self.backend.get_status(),
+            'ttft_ms': {name: histogram.snapshot() for name, histogram in self.ttft_ms.items()},
+            'response_cache': {
+                **(self.response_cache.get_metrics() if self.response_cache is not None else {}),
+                'bypasses': self.response_cache_bypasses
+            }
+        }
+    
     def _load_legacy_pneumonia_model(self):
         """Load your existing pneumonia model for comparison"""
         try:
@@ -72,40 +162,151 @@ class MedGemmaService:
             'expert_system_analysis': {},
             'combined_diagnosis': {},
             'emergency_flags': [],
-            'recommendations': []
+            'recommendations': [],
+            'cascade': {
+                'enabled': settings.ENABLE_MODEL_CASCADE,
+                'stages_run': [],
+                'stages_skipped': {}
+            },
+            'stages': {},
+            # Cheap emergency pre-pass: all of this case's queued model work runs at this priority
+            'priority': triage_priority(symptoms, vital_signs)
         }
+        priority = results['priority']
         
-        # 1. MedGemma Multimodal Analysis (if image provided)
+        # Stage graph: legacy CNN and expert system run concurrently. The MedGemma stages
+        # start alongside them when the cascade is off; otherwise they wait for the cheap
+        # stages to decide whether they are needed, then run concurrently with each other.
+        expensive = {}
         if image is not None:
-            results['medgemma_analysis'] = await self._medgemma_image_analysis(
+            expensive['medgemma_image'] = lambda: self._medgemma_image_analysis(
                 image, symptoms, vital_signs, patient_history
             )
-        
-        # 2. MedGemma Text-based Clinical Reasoning
         if symptoms or vital_signs:
-            results['medgemma_analysis']['clinical_reasoning'] = await self._medgemma_clinical_reasoning(
+            expensive['medgemma_clinical'] = lambda: self._medgemma_clinical_reasoning(
                 symptoms, vital_signs, patient_history
             )
         
-        # 3. Legacy Model Comparison (your existing pneumonia model)
-        if image is not None and self.legacy_pneumonia_model:
-            results['legacy_comparison'] = self._legacy_model_analysis(image)
+        started = {}
+        if not settings.ENABLE_MODEL_CASCADE:
+            started = {name: asyncio.ensure_future(self._run_stage(results, name, factory))
+                       for name, factory in expensive.items()}
         
-        # 4. Expert System Analysis (your existing rule-based system)
+        # 1. Legacy Model Comparison (your existing pneumonia model) and
+        # 2. Expert System Analysis (your existing rule-based system)
+        cheap = {}
+        if image is not None and self.legacy_pneumonia_model:
+            cheap['legacy_cnn'] = lambda: inference_executor.run(
+                'vision', self._legacy_model_analysis, image, priority=priority
+            )
         if symptoms:
-            expert_analysis = self.expert_system.analyze_symptoms(
-                symptoms, vital_signs, patient_history
+            cheap['expert_system'] = lambda: inference_executor.run(
+                'preprocess', self.expert_system.analyze_symptoms,
+                self._symptom_map(symptoms), vital_signs, patient_history, priority=priority
             )
+        cheap_results = await self._run_stages(results, cheap)
+        
+        if cheap_results.get('legacy_cnn') is not None:
+            results['legacy_comparison'] = cheap_results['legacy_cnn']
+        if cheap_results.get('expert_system') is not None:
+            expert_analysis = cheap_results['expert_system']
             results['expert_system_analysis'] = expert_analysis
             results['emergency_flags'].extend(expert_analysis.get('emergency_flags', []))
         
+        results['emergency_flags'].extend(screen_emergency(symptoms, vital_signs))
+        
+        # 3. MedGemma Multimodal Analysis and 4. Text-based Clinical Reasoning,
+        # unless the cheap stages are already conclusive
+        pending = {}
+        for name, factory in expensive.items():
+            if name in started:
+                continue
+            skip_reason = self._cascade_skip_reason(results, name)
+            if skip_reason:
+                results['cascade']['stages_skipped'][name] = skip_reason
+            else:
+                pending[name] = factory
+        expensive_results = await self._run_stages(results, pending)
+        for name, task in started.items():
+            expensive_results[name] = await task
+        
+        if expensive_results.get('medgemma_image') is not None:
+            results['medgemma_analysis'] = expensive_results['medgemma_image']
+        if expensive_results.get('medgemma_clinical') is not None:
+            results['medgemma_analysis']['clinical_reasoning'] = expensive_results['medgemma_clinical']
+        
         # 5. Combined Analysis
         results['combined_diagnosis'] = self._combine_analyses(results)
         
         return results
     
+    async def _run_stages(self, results: Dict, stages: Dict[str, Callable[[], Awaitable]]) -> Dict[str, Any]:
+        """Run independent stages concurrently; failed or timed-out stages map to None"""
+        values = await asyncio.gather(*(
+            self._run_stage(results, name, factory) for name, factory in stages.items()
+        ))
+        return dict(zip(stages, values))
+    
+    async def _run_stage(self, results: Dict, name: str, factory: Callable[[], Awaitable]) -> Any:
+        """
+        Run one stage under its ANALYSIS_STAGE_TIMEOUTS budget and record its status and
+        duration. A slow or failing stage yields None so the others still return.
+        """
+        timeout = settings.ANALYSIS_STAGE_TIMEOUTS.get(name)
+        results['cascade']['stages_run'].append(name)
+        start = time.perf_counter()
+        value = None
+        try:
+            value = await asyncio.wait_for(factory(), timeout)
+            status = {'status': 'ok'}
+        except asyncio.TimeoutError:
+            logger.warning(f"Analysis stage {name} timed out after {timeout}s")
+            status = {'status': 'timeout'}
+        except Exception as e:
+            logger.error(f"Analysis stage {name} failed: {e}")
+            status = {'status': 'error', 'error': str(e)}
+        status['duration_ms'] = (time.perf_counter() - start) * 1000
+        results['stages'][name] = status
+        return value
+    
+    def _cascade_skip_reason(self, results: Dict, stage: str) -> Optional[str]:
+        """
+        Decide whether an expensive MedGemma stage can be skipped because the cheap
+        stages are already confident. Returns the reason, or None if it must run.
+        """
+        if not settings.ENABLE_MODEL_CASCADE:
+            return None
+        if results['emergency_flags']:
+            return None
+        
+        threshold = settings.CONSENSUS_THRESHOLD
+        if stage == 'medgemma_image':
+            legacy = results['legacy_comparison']
+            confidence = legacy.get('confidence')
+            if 'error' in legacy or confidence is None or confidence < threshold:
+                return None
+            return f"legacy CNN confidence {confidence:.2f} >= {threshold}"
+        
+        diagnoses = results['expert_system_analysis'].get('diagnoses', [])
+        if not diagnoses or diagnoses[0]['confidence'] < threshold:
+            return None
+        return f"expert system confidence {diagnoses[0]['confidence']:.2f} >= {threshold}"
+    
+    def _symptom_map(self, symptoms: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """ExpertSystem looks symptoms up by name"""
+        return {symptom.get('name', '').lower().replace(' ', '_'): symptom for symptom in symptoms}
+    
     async def _medgemma_image_analysis(self, image: Image.Image, symptoms=None, vital_signs=None, history=None) -> Dict:
-        """EDIT POINT 2: Customize for different imaging modalities"""
+        """MedGemma multimodal analysis of a medical image"""
+        prompt = self._image_analysis_prompt(symptoms, vital_signs)
+        response = await asyncio.wrap_future(self.backend.submit(
+            MULTIMODAL, prompt, self.IMAGE_ANALYSIS_PREFIX, self.IMAGE_ANALYSIS_SCHEMA,
+            priority=triage_priority(symptoms, vital_signs)
+        ))
+        return self._parse_medical_response(response)
+    
+    def _image_analysis_prompt(self, symptoms=None, vital_signs=None) -> str:
+        """IMAGE_ANALYSIS_PREFIX followed by the patient's clinical context"""
         symptom_context = ""
         if symptoms:
             symptom_context = f"Patient reports: {', '.join([s.get('name', '') for s in symptoms])}"
@@ -114,75 +315,162 @@ class MedGemmaService:
         if vital_signs:
             vital_context = f"Vital signs: BP {vital_signs.get('blood_pressure', 'N/A')}, HR {vital_signs.get('heart_rate', 'N/A')}, Temp {vital_signs.get('temperature', 'N/A')}°C"
         
-        prompt = f"""
-        <image>
-        Medical Image Analysis Request:
-        
-        Clinical Context:
+        return self.IMAGE_ANALYSIS_PREFIX + f"""        Clinical Context:
         {symptom_context}
         {vital_context}
-        
-        Please analyze this medical image and provide:
-        1. Detailed imaging findings
-        2. Most likely diagnosis with confidence percentage
-        3. Differential diagnoses (top 3 alternatives)
-        4. Urgency level (1-5 scale, 5 being emergency)
-        5. Recommended follow-up imaging or tests
-        6. Clinical correlation with reported symptoms
-        
-        Respond in JSON format with fields: findings, primary_diagnosis, differential_diagnoses, urgency_level, recommendations, clinical_correlation
         """
-        
-        inputs = self.tokenizer(prompt, return_tensors="pt")
-        with torch.no_grad():
-            outputs = self.multimodal_model.generate(
-                **inputs,
-                max_length=2048,
-                temperature=0.2,  # Conservative for medical accuracy
-                do_sample=True,
-                pad_token_id=self.tokenizer.eos_token_id
-            )
-        
-        response = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-        return self._parse_medical_response(response)
     
-    async def _medgemma_clinical_reasoning(self, symptoms=None, vital_signs=None, history=None) -> Dict:
-        """EDIT POINT 3: Customize clinical reasoning prompts for your hospital protocols"""
+    async def _medgemma_clinical_reasoning(self, symptoms=None, vital_signs=None, history=None,
+                                           cache_sampled: Optional[bool] = None) -> Dict:
+        """
+        MedGemma text-model clinical reasoning over symptoms, vitals and history.
         
-        # Format clinical data
+        Results are cached by clinical data, model and generation parameters. Sampled
+        output differs run to run, so it is only cached when ``cache_sampled`` (default
+        LLM_RESPONSE_CACHE_SAMPLED) opts in.
+        """
+        async def generate() -> Dict:
+            prompt = self._clinical_reasoning_prompt(symptoms, vital_signs, history)
+            response = await asyncio.wrap_future(self.backend.submit(
+                TEXT, prompt, self.CLINICAL_REASONING_PREFIX, self.CLINICAL_REASONING_SCHEMA,
+                priority=triage_priority(symptoms, vital_signs)
+            ))
+            return self._parse_clinical_response(response)
+        
+        if not self._caches_clinical_reasoning(cache_sampled):
+            self.response_cache_bypasses += 1
+            return await generate()
+        
+        return await self.response_cache.get_or_compute(
+            self._clinical_cache_key(symptoms, vital_signs, history),
+            generate,
+            # Unparsed output is not worth repeating to the next caller
+            cacheable=lambda result: 'raw_response' not in result
+        )
+    
+    def _caches_clinical_reasoning(self, cache_sampled: Optional[bool] = None) -> bool:
+        """Whether clinical reasoning results go through response_cache (see _medgemma_clinical_reasoning)"""
+        if cache_sampled is None:
+            cache_sampled = settings.LLM_RESPONSE_CACHE_SAMPLED
+        deterministic = not self.generation_params['do_sample'] or self.generation_params['temperature'] <= 0
+        return self.response_cache is not None and (deterministic or cache_sampled)
+    
+    def _clinical_cache_key(self, symptoms=None, vital_signs=None, history=None) -> str:
+        """Hash of the canonical clinical data, prompt, model and generation parameters"""
+        canonical_symptoms = sorted(
+            (symptoms or []), key=lambda s: json.dumps(s, sort_keys=True, default=str).lower()
+        )
+        canonical_vitals = dict(sorted((vital_signs or {}).items()))
+        if isinstance(history, dict):
+            history = dict(sorted(history.items()))
+        clinical_data = self._format_clinical_data(canonical_symptoms, canonical_vitals, history)
+        payload = json.dumps({
+            'clinical_data': ' '.join(clinical_data.lower().split()),
+            'prompt': self.CLINICAL_REASONING_PREFIX,
+            'model': self.backend.model_name(TEXT),
+            'generation': self.generation_params
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+    
+    def _clinical_reasoning_prompt(self, symptoms=None, vital_signs=None, history=None) -> str:
+        """CLINICAL_REASONING_PREFIX followed by the formatted clinical data"""
         clinical_summary = self._format_clinical_data(symptoms, vital_signs, history)
-        
-        prompt = f"""
-        Clinical Case Analysis:
-        
-        {clinical_summary}
-        
-        As an experienced physician, please provide:
-        1. Systematic review of symptoms and vital signs
-        2. Most likely primary diagnosis with confidence level
-        3. Complete differential diagnosis list (rank by probability)
-        4. Risk stratification (low/moderate/high risk)
-        5. Immediate management plan
-        6. Diagnostic workup recommendations
-        7. Follow-up timeline
-        8. Warning signs that would require emergency care
-        
-        Use evidence-based medicine principles and current clinical guidelines.
-        Respond in structured JSON format.
+        return self.CLINICAL_REASONING_PREFIX + f"""        {clinical_summary}
         """
+    
+    async def analyze_with_template(self, template: str, **fields) -> Dict:
+        """Run one of PROMPT_TEMPLATES on the text model; its instructions are served from the prefix cache"""
+        prompt = PROMPT_TEMPLATES[template].format(**fields)
+        response = await asyncio.wrap_future(self.backend.submit(
+            TEXT, prompt, template_prefix(PROMPT_TEMPLATES[template])
+        ))
+        return self._parse_json_response(response)
+    
+    async def stream_image_analysis(self, image: Image.Image, symptoms=None, vital_signs=None, history=None) -> AsyncIterator[Dict]:
+        """Streaming variant of _medgemma_image_analysis: token events followed by the parsed result"""
+        prompt = self._image_analysis_prompt(symptoms, vital_signs)
+        async for event in self._stream(
+            'image_analysis', MULTIMODAL, prompt, self.IMAGE_ANALYSIS_PREFIX, self.IMAGE_ANALYSIS_SCHEMA,
+            triage_priority(symptoms, vital_signs)
+        ):
+            yield event
+    
+    async def stream_clinical_reasoning(self, symptoms=None, vital_signs=None, history=None) -> AsyncIterator[Dict]:
+        """
+        Streaming variant of _medgemma_clinical_reasoning: token events followed by the
+        parsed result. A response_cache hit is sent as the result event alone, and a
+        streamed result is cached for the blocking path and later streams.
+        """
+        cache_key = None
+        if self._caches_clinical_reasoning():
+            cache_key = self._clinical_cache_key(symptoms, vital_signs, history)
+            cached = await self.response_cache.get_async(cache_key)
+            if cached is not None:
+                yield {'event': 'result', 'data': {'analysis': cached, 'ttft_ms': None, 'duration_ms': 0.0, 'cached': True}}
+                return
+        else:
+            self.response_cache_bypasses += 1
+        
+        prompt = self._clinical_reasoning_prompt(symptoms, vital_signs, history)
+        async for event in self._stream(
+            'clinical_reasoning', TEXT, prompt, self.CLINICAL_REASONING_PREFIX, self.CLINICAL_REASONING_SCHEMA,
+            triage_priority(symptoms, vital_signs)
+        ):
+            if cache_key is not None and event['event'] == 'result' and 'raw_response' not in event['data']['analysis']:
+                await self.response_cache.put_async(cache_key, event['data']['analysis'])
+            yield event
+    
+    async def _stream(self, kind: str, role: str, prompt: str, prefix: Optional[str],
+                      schema: JsonSchema, priority: int = ROUTINE_PRIORITY) -> AsyncIterator[Dict]:
+        """
+        Run one generation and yield {'event', 'data'} dicts: a 'token' event per text
+        delta, then a 'result' event with the parsed response, or an 'error' event.
+        """
+        start = time.perf_counter()
+        stream = TokenStream(self.backend.get_tokenizer, asyncio.get_running_loop())
+        future = self.backend.submit(role, prompt, prefix, schema, stream, priority)
+        future.add_done_callback(lambda f: self._close_stream(stream, f))
         
-        inputs = self.tokenizer(prompt, return_tensors="pt")
-        with torch.no_grad():
-            outputs = self.text_model.generate(
-                **inputs,
-                max_length=3072,
-                temperature=0.2,
-                do_sample=True,
-                pad_token_id=self.tokenizer.eos_token_id
-            )
-        
-        response = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-        return self._parse_clinical_response(response)
+        first = True
+        try:
+            async for delta in stream:
+                if first:
+                    self.ttft_ms[kind].observe(stream.ttft_ms)
+                    first = False
+                yield {'event': 'token', 'data': delta}
+        except Exception as e:
+            logger.error(f"Streaming {kind} failed: {e}")
+            yield {'event': 'error', 'data': {'error': str(e)}}
+            return
+        finally:
+            # Client went away: drop the request if it has not started yet
+            future.cancel()
+        
+        yield {
+            'event': 'result',
+            'data': {
+                'analysis': self._parse_json_response(stream.text, schema),
+                'ttft_ms': stream.ttft_ms,
+                'duration_ms': (time.perf_counter() - start) * 1000,
+                'cached': False
+            }
+        }
+    
+    @staticmethod
+    def _close_stream(stream: TokenStream, future):
+        if future.cancelled():
+            stream.fail(asyncio.CancelledError())
+        elif future.exception() is not None:
+            stream.fail(future.exception())
+        else:
+            stream.end()
+    
+    def warmup(self):
+        """Warm each model up on the backend with the static prompt prefixes it will serve"""
+        self.backend.warmup({
+            MULTIMODAL: [self.IMAGE_ANALYSIS_PREFIX],
+            TEXT: [self.CLINICAL_REASONING_PREFIX] + [template_prefix(t) for t in PROMPT_TEMPLATES.values()]
+        })
     
     def _legacy_model_analysis(self, image: Image.Image) -> Dict:
         """Compare with your existing pneumonia model"""
@@ -190,17 +478,8 @@ class MedGemmaService:
             return {'error': 'Legacy model not available'}
         
         try:
-            # Use your existing prediction logic
-            from ml_models.disease_classifiers.pneumonia.training.pneumonia_classifier import CONFIG
-            import torchvision.transforms as transforms
-            
-            transform = transforms.Compose([
-                transforms.Resize((224, 224)),
-                transforms.ToTensor(),
-                transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-            ])
-            
-            image_tensor = transform(image).unsqueeze(0).to(self.device)
+            # Same preprocessing as PneumoniaService and predict.py
+            image_tensor = self.preprocessor.batch([self.preprocessor.resize(image)]).to(self.device)
             
             with torch.no_grad():
                 outputs = self.legacy_pneumonia_model(image_tensor)
@@ -252,6 +531,15 @@ class MedGemmaService:
                 combined['confidence_score'] = 0.6
                 combined['consensus_level'] = 'low'
                 combined['recommendations'].append('Conflicting AI analyses - recommend specialist consultation')
+        elif legacy_diagnosis.get('prediction') and not medgemma_diagnosis:
+            # MedGemma was skipped by the cascade; the legacy model was confident enough
+            combined['final_diagnosis'] = legacy_diagnosis['prediction']
+            combined['confidence_score'] = legacy_diagnosis.get('confidence', 0.0)
+            combined['consensus_level'] = 'legacy_only'
+        elif expert_diagnosis and not medgemma_diagnosis:
+            combined['final_diagnosis'] = expert_diagnosis[0]['disease']
+            combined['confidence_score'] = expert_diagnosis[0]['confidence']
+            combined['consensus_level'] = 'expert_system_only'
         
         return combined
     
@@ -281,21 +569,26 @@ class MedGemmaService:
     
     def _parse_medical_response(self, response: str) -> Dict:
         """Parse MedGemma medical response"""
+        return self._parse_json_response(response, self.IMAGE_ANALYSIS_SCHEMA)
+    
+    def _parse_json_response(self, response: str, schema: Optional[JsonSchema] = None) -> Dict:
+        """Parse the first JSON object in a response; schema violations are reported, not fatal"""
+        source, tracker = parse_json_object(response, schema)
+        if source is None:
+            # Fallback parsing
+            return {'raw_response': response, 'parsed': False}
         try:
-            # Try to extract JSON from response
-            import re
-            json_match = re.search(r'\{.*\}', response, re.DOTALL)
-            if json_match:
-                return json.loads(json_match.group())
-            else:
-                # Fallback parsing
-                return {'raw_response': response, 'parsed': False}
-        except Exception as e:
+            parsed = json.loads(source)
+        except ValueError as e:
             return {'raw_response': response, 'parsing_error': str(e)}
+        errors = tracker.validate(parsed)
+        if errors:
+            parsed['schema_errors'] = errors
+        return parsed
     
     def _parse_clinical_response(self, response: str) -> Dict:
         """Parse MedGemma clinical reasoning response"""
-        return self._parse_medical_response(response)
+        return self._parse_json_response(response, self.CLINICAL_REASONING_SCHEMA)
 
 # EDIT POINT 6: Enhanced API endpoints that use your existing structure
 class EnhancedAIService:
@@ -308,16 +601,29 @@ class EnhancedAIService:
                                  image: Optional[Image.Image] = None,
                                  symptoms: Optional[List[Dict[str, Any]]] = None,
                                  vital_signs: Optional[Dict[str, Any]] = None,
-                                 risk_factors: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        """Drop-in replacement for your existing AI service"""
+                                 risk_factors: Optional[Dict[str, Any]] = None,
+                                 tenant: Optional[str] = None,
+                                 rate_limit: bool = True,
+                                 priority: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Drop-in replacement for your existing AI service.
         
+        With a ``tenant`` key (user or organisation) the analysis is admitted through
+        analysis_gate: ANALYSIS_RATE_LIMIT per key (RateLimitExceededError), then a
+        weighted fair share of analysis capacity. ``priority`` (default: triage of the
+        symptoms and vitals) is what the gate admits it at.
+        """
+        
+        if priority is None:
+            priority = triage_priority(symptoms, vital_signs)
         # Use enhanced MedGemma analysis
-        analysis = await self.medgemma_service.comprehensive_medical_analysis(
-            image=image,
-            symptoms=symptoms,
-            vital_signs=vital_signs,
-            patient_history=risk_factors
-        )
+        async with analysis_gate.admit(tenant, priority, rate_limit):
+            analysis = await self.medgemma_service.comprehensive_medical_analysis(
+                image=image,
+                symptoms=symptoms,
+                vital_signs=vital_signs,
+                patient_history=risk_factors
+            )
         
         # Format response to match your existing API structure
         return {
@@ -326,6 +632,9 @@ class EnhancedAIService:
             'emergency_flags': analysis.get('emergency_flags', []),
             'recommendations': analysis.get('recommendations', []),
             'legacy_comparison': analysis.get('legacy_comparison', {}),
+            'cascade': analysis.get('cascade', {}),
+            'stages': analysis.get('stages', {}),
+            'priority': analysis.get('priority'),
             'confidence_metrics': {
                 'medgemma_confidence': analysis.get('medgemma_analysis', {}).get('confidence', 0),
                 'consensus_level': analysis.get('combined_diagnosis', {}).get('consensus_level', 'unknown')
@@ -1,6 +1,7 @@
 from typing import Dict, List, Optional
 from loguru import logger
 from app.core.config import settings
+from app.services.emergency.screening import check_vital_signs
 
 class EmergencyDetectionService:
     """Service for detecting emergency conditions"""
@@ -58,47 +59,7 @@ class EmergencyDetectionService:
     
     def _check_vital_signs(self, vital_signs: Dict) -> List[str]:
         """Check vital signs for emergency conditions"""
-        flags = []
-        
-        # Blood pressure check
-        if vital_signs.get("blood_pressure"):
-            systolic, diastolic = map(int, vital_signs["blood_pressure"].split("/"))
-            if systolic > 180 or diastolic > 120:
-                flags.append("Severe hypertension")
-            elif systolic < 90 or diastolic < 60:
-                flags.append("Severe hypotension")
-        
-        # Heart rate check
-        heart_rate = vital_signs.get("heart_rate")
-        if heart_rate:
-            if heart_rate > 150:
-                flags.append("Severe tachycardia")
-            elif heart_rate < 40:
-                flags.append("Severe bradycardia")
-        
-        # Temperature check
-        temperature = vital_signs.get("temperature")
-        if temperature:
-            if temperature > 39.5:
-                flags.append("High fever")
-            elif temperature < 35:
-                flags.append("Hypothermia")
-        
-        # Respiratory rate check
-        resp_rate = vital_signs.get("respiratory_rate")
-        if resp_rate:
-            if resp_rate > 30:
-                flags.append("Severe tachypnea")
-            elif resp_rate < 8:
-                flags.append("Severe bradypnea")
-        
-        # Oxygen saturation check
-        o2_sat = vital_signs.get("oxygen_saturation")
-        if o2_sat:
-            if o2_sat < 90:
-                flags.append("Hypoxemia")
-        
-        return flags
+        return check_vital_signs(vital_signs or {})
     
     def _check_symptoms(self, symptoms: List[Dict]) -> List[str]:
         """Check symptoms for emergency conditions"""
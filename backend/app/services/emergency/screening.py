@@ -0,0 +1,80 @@
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+from app.services.inference.priority import EMERGENCY_PRIORITY, ROUTINE_PRIORITY
+
+# Scheduling tier of a case the screen did not flag, by its most severe symptom
+_SEVERITY_PRIORITY = {'critical': 4, 'severe': 3, 'moderate': 2}
+
+# Flag raised for a vital sign below / above its EMERGENCY_VITAL_SIGNS_THRESHOLDS limits
+_VITAL_SIGN_FLAGS = {
+    'heart_rate': ('Severe bradycardia', 'Severe tachycardia'),
+    'blood_pressure_systolic': ('Severe hypotension', 'Severe hypertension'),
+    'blood_pressure_diastolic': ('Severe hypotension', 'Severe hypertension'),
+    'temperature': ('Hypothermia', 'High fever'),
+    'respiratory_rate': ('Severe bradypnea', 'Severe tachypnea'),
+    'oxygen_saturation': ('Hypoxemia', 'Abnormal oxygen saturation')
+}
+
+def screen_emergency(
+    symptoms: Optional[List[Dict[str, Any]]] = None,
+    vital_signs: Optional[Dict[str, Any]] = None
+) -> List[str]:
+    """
+    Cheap synchronous emergency screen over EMERGENCY_KEYWORDS and
+    EMERGENCY_VITAL_SIGNS_THRESHOLDS, used to route work before any model runs.
+    """
+    flags = []
+
+    for symptom in symptoms or []:
+        text = f"{symptom.get('name', '')} {symptom.get('description', '')}".lower()
+        for keyword in settings.EMERGENCY_KEYWORDS:
+            if keyword in text:
+                flags.append(f"Emergency keyword: {keyword}")
+
+    flags.extend(check_vital_signs(vital_signs or {}))
+    return flags
+
+def check_vital_signs(vital_signs: Dict[str, Any]) -> List[str]:
+    """
+    Emergency flags for vital signs outside EMERGENCY_VITAL_SIGNS_THRESHOLDS;
+    shared by the triage screen and EmergencyDetectionService.
+    """
+    flags = []
+    for name, limits in settings.EMERGENCY_VITAL_SIGNS_THRESHOLDS.items():
+        value = _vital_value(vital_signs, name)
+        if value is None:
+            continue
+        low, high = _VITAL_SIGN_FLAGS.get(name, (f"Abnormal {name}", f"Abnormal {name}"))
+        flag = low if value < limits['min'] else high if value > limits['max'] else None
+        if flag is not None and flag not in flags:
+            flags.append(flag)
+    return flags
+
+def triage_priority(
+    symptoms: Optional[List[Dict[str, Any]]] = None,
+    vital_signs: Optional[Dict[str, Any]] = None
+) -> int:
+    """
+    Scheduling priority for a case's queued model work, from 1 (routine) to 5
+    (emergency). Any screen_emergency flag makes it an emergency; otherwise the
+    most severe reported symptom sets the tier.
+    """
+    if screen_emergency(symptoms, vital_signs):
+        return EMERGENCY_PRIORITY
+    return max(
+        (_SEVERITY_PRIORITY.get(str(s.get('severity', '')).lower(), ROUTINE_PRIORITY) for s in symptoms or []),
+        default=ROUTINE_PRIORITY
+    )
+
+def _vital_value(vital_signs: Dict[str, Any], name: str) -> Optional[float]:
+    """Read a vital sign as a number; blood pressure may come as a "120/80" string"""
+    value = vital_signs.get(name)
+    if value is None and name in ('blood_pressure_systolic', 'blood_pressure_diastolic'):
+        parts = str(vital_signs.get('blood_pressure') or '').split('/')
+        index = 0 if name == 'blood_pressure_systolic' else 1
+        if index < len(parts) and parts[index].strip():
+            value = parts[index]
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
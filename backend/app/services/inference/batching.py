@@ -0,0 +1,166 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+from .metrics import Histogram
+from .priority import ROUTINE_PRIORITY
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+class _Request:
+    __slots__ = ('item', 'priority', 'future', 'enqueued_at')
+
+    def __init__(self, item: Any, priority: int = ROUTINE_PRIORITY):
+        self.item = item
+        self.priority = priority
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class _Lane:
+    """Queue and worker thread serving a single batching key (e.g. model_type)"""
+
+    def __init__(self, batcher: 'MicroBatcher', key: Hashable):
+        self.batcher = batcher
+        self.key = key
+        self.queue: 'queue.Queue[_Request]' = queue.Queue()
+        self.thread = threading.Thread(
+            target=self._run,
+            name=f"{batcher.name}-{key}",
+            daemon=True
+        )
+        self.thread.start()
+
+    def _collect(self) -> List[_Request]:
+        """Block for the first request, then fill the batch until it is full or the window closes"""
+        first = self.queue.get()
+        if first is None:
+            return []
+        batch = [first]
+        deadline = first.enqueued_at + self.batcher.max_wait_s
+        while len(batch) < self.batcher.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                request = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                # Put the sentinel back so the loop exits after this batch
+                self.queue.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if not batch:
+                return
+            started = time.monotonic()
+            for request in batch:
+                self.batcher.queue_wait_ms.observe((started - request.enqueued_at) * 1000)
+            self.batcher.batch_size.observe(len(batch))
+            if self.batcher.dispatch is None:
+                self._execute(batch)
+                continue
+            try:
+                # Hand the batch to the executor and go straight back to collecting; it
+                # queues there at the priority of its most urgent request
+                self.batcher.dispatch(
+                    lambda batch=batch: self._execute(batch),
+                    max(request.priority for request in batch)
+                )
+            except Exception as e:
+                self._fail(batch, e)
+
+    def _execute(self, batch: List[_Request]):
+        try:
+            results = self.batcher.batch_fn(self.key, [r.item for r in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(
+                    f"Batch function returned {len(results)} results for {len(batch)} inputs"
+                )
+        except Exception as e:
+            self._fail(batch, e)
+            return
+        for request, result in zip(batch, results):
+            request.future.set_result(result)
+
+    def _fail(self, batch: List[_Request], error: Exception):
+        logger.error(f"Batch for {self.key} failed: {str(error)}")
+        for request in batch:
+            request.future.set_exception(error)
+
+
+class MicroBatcher:
+    """
+    Collects concurrent requests per key and runs them through one batched call.
+
+    A batch is dispatched as soon as it reaches ``max_batch_size`` or the oldest
+    request in it has waited ``max_wait_ms``. ``batch_fn(key, items)`` must return
+    one result per item, in order; each caller receives its own result through the
+    Future returned by ``submit``. When ``dispatch`` is given, batches are handed to
+    it (e.g. an executor pool) as ``dispatch(fn, priority)`` instead of running on the
+    lane's collector thread, where ``priority`` is the highest of the batched requests.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[Hashable, List[Any]], List[Any]],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 5.0,
+        name: str = "batcher",
+        dispatch: Optional[Callable[[Callable[[], None], int], Any]] = None
+    ):
+        self.batch_fn = batch_fn
+        self.dispatch = dispatch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_s = max(0.0, max_wait_ms) / 1000
+        self.name = name
+        self.batch_size = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait_ms = Histogram()
+        self._lanes: Dict[Hashable, _Lane] = {}
+        self._lock = threading.Lock()
+
+    def _lane(self, key: Hashable) -> _Lane:
+        lane = self._lanes.get(key)
+        if lane is None:
+            with self._lock:
+                lane = self._lanes.get(key)
+                if lane is None:
+                    lane = _Lane(self, key)
+                    self._lanes[key] = lane
+        return lane
+
+    def submit(self, key: Hashable, item: Any, priority: int = ROUTINE_PRIORITY) -> Future:
+        """Queue an item for batched processing under ``key``"""
+        request = _Request(item, priority)
+        self._lane(key).queue.put(request)
+        return request.future
+
+    def get_metrics(self) -> Dict:
+        """Batch size and queue wait distributions plus current queue depths"""
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait_s * 1000,
+            'batch_size': self.batch_size.snapshot(),
+            'queue_wait_ms': self.queue_wait_ms.snapshot(),
+            'queue_depth': {str(key): lane.queue.qsize() for key, lane in self._lanes.items()}
+        }
+
+    def shutdown(self, wait: bool = True):
+        """Stop all lanes once their queued requests have been processed"""
+        with self._lock:
+            lanes = list(self._lanes.values())
+            self._lanes = {}
+        for lane in lanes:
+            lane.queue.put(None)
+        if wait:
+            for lane in lanes:
+                lane.thread.join()
@@ -0,0 +1,225 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """
+    Size-bounded LRU cache with TTL expiry for JSON-serialisable results.
+
+    Values are stored serialised, so every hit returns a fresh copy. An optional
+    SQLite tier under ``disk_dir`` keeps entries across restarts; memory misses fall
+    through to it and hits are promoted back into memory. Keys should already encode
+    everything that affects the result (input hash, model, version). SQLite calls
+    block, so ``get_async`` and ``put_async`` run disk-tier reads, writes and pruning
+    on a dedicated thread; only the memory tier is touched on the event loop.
+
+    ``get_or_compute`` adds single-flight coalescing for async callers: concurrent
+    misses on one key share a single computation.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_entries: int = 1024,
+        ttl_seconds: float = 3600,
+        disk_dir: Optional[str] = None,
+        disk_max_entries: int = 0
+    ):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_max_entries = disk_max_entries or max_entries * 10
+        self._entries: 'OrderedDict[str, Tuple[float, str]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._db = None
+        self._disk_lock = threading.Lock()
+        self._disk_thread: Optional[ThreadPoolExecutor] = None
+        self._disk_writes = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            path = os.path.join(disk_dir, f"{name}.sqlite3")
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT, stored_at REAL)"
+            )
+            self._db.commit()
+            self._disk_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"cache-{name}")
+            logger.info(f"Cache {name} persisting to {path}")
+
+    def _expired(self, stored_at: float) -> bool:
+        return bool(self.ttl_seconds) and time.time() - stored_at > self.ttl_seconds
+
+    def get(self, key: str) -> Optional[Any]:
+        text = self._memory_get(key)
+        if text is None and self._db is not None:
+            text = self._disk_get(key)
+        return self._loaded(text)
+
+    async def get_async(self, key: str) -> Optional[Any]:
+        """``get`` for the event loop: memory hits are served inline, the disk tier on its thread"""
+        text = self._memory_get(key)
+        if text is None and self._db is not None:
+            text = await self._on_disk_thread(self._disk_get, key)
+        return self._loaded(text)
+
+    def _memory_get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, text = entry
+            if self._expired(stored_at):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return text
+
+    def _disk_get(self, key: str) -> Optional[str]:
+        with self._disk_lock:
+            row = self._db.execute("SELECT value, stored_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            text, stored_at = row
+            if self._expired(stored_at):
+                self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+        with self._lock:
+            self._store_memory(key, text, stored_at)
+            self.disk_hits += 1
+        return text
+
+    def _loaded(self, text: Optional[str]) -> Optional[Any]:
+        if text is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        return json.loads(text)
+
+    def put(self, key: str, value: Any):
+        text, stored_at = self._memory_put(key, value)
+        if self._db is not None:
+            self._disk_put(key, text, stored_at)
+
+    async def put_async(self, key: str, value: Any):
+        """``put`` for the event loop: the memory tier is updated inline, the disk tier on its thread"""
+        text, stored_at = self._memory_put(key, value)
+        if self._db is not None:
+            await self._on_disk_thread(self._disk_put, key, text, stored_at)
+
+    def _memory_put(self, key: str, value: Any) -> Tuple[str, float]:
+        text = json.dumps(value)
+        stored_at = time.time()
+        with self._lock:
+            self._store_memory(key, text, stored_at)
+        return text, stored_at
+
+    def _disk_put(self, key: str, text: str, stored_at: float):
+        with self._disk_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, value, stored_at) VALUES (?, ?, ?)",
+                (key, text, stored_at)
+            )
+            self._disk_writes += 1
+            if self._disk_writes % 100 == 0:
+                self._prune_disk()
+            self._db.commit()
+
+    async def _on_disk_thread(self, fn: Callable, *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._disk_thread, fn, *args)
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        cacheable: Callable[[Any], bool] = lambda value: True
+    ) -> Any:
+        """
+        Return the value for ``key``, computing it on a miss. Callers that miss while
+        a computation for the same key is running wait for it instead of starting
+        another. The computation runs as its own task, so a caller that is cancelled
+        or times out does not cancel it for the others. Only values passing
+        ``cacheable`` are stored; failures reach every waiter and are not cached.
+        """
+        value = await self.get_async(key)
+        if value is not None:
+            return value
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._compute(key, compute, cacheable))
+            self._pending[key] = task
+            task.add_done_callback(lambda t: self._settle(key, t))
+        else:
+            self.coalesced += 1
+        return json.loads(await asyncio.shield(task))
+
+    async def _compute(self, key: str, compute: Callable[[], Awaitable[Any]], cacheable: Callable[[Any], bool]) -> str:
+        value = await compute()
+        if cacheable(value):
+            await self.put_async(key, value)
+        return json.dumps(value)
+
+    def _settle(self, key: str, task: asyncio.Future):
+        self._pending.pop(key, None)
+        # Retrieve the outcome so a failure nobody waited for is not logged as unhandled
+        if not task.cancelled():
+            task.exception()
+
+    def _store_memory(self, key: str, text: str, stored_at: float):
+        self._entries[key] = (stored_at, text)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _prune_disk(self):
+        cutoff = time.time() - self.ttl_seconds if self.ttl_seconds else None
+        if cutoff is not None:
+            self._db.execute("DELETE FROM entries WHERE stored_at < ?", (cutoff,))
+        self._db.execute(
+            "DELETE FROM entries WHERE key NOT IN "
+            "(SELECT key FROM entries ORDER BY stored_at DESC LIMIT ?)",
+            (self.disk_max_entries,)
+        )
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self._db is not None:
+            with self._disk_lock:
+                self._db.execute("DELETE FROM entries")
+                self._db.commit()
+
+    def get_metrics(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'persistent': self._db is not None,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'coalesced': self.coalesced,
+                'in_flight': len(self._pending),
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0
+            }
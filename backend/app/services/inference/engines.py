@@ -0,0 +1,126 @@
+import logging
+import os
+from typing import Callable
+
+import torch
+
+from .registry import module_nbytes
+
+logger = logging.getLogger(__name__)
+
+# Exported artifacts live next to their checkpoint; keep in sync with
+# export_model.py and quantize_model.py in ml_models/disease_classifiers/pneumonia/training
+ARTIFACT_SUFFIXES = {
+    'torchscript': '.torchscript.pt',
+    'onnx': '.onnx',
+    'int8': '.int8.torchscript.pt'
+}
+
+
+def artifact_path(checkpoint_path: str, engine: str) -> str:
+    """Path of the exported artifact for a checkpoint and engine type"""
+    return os.path.splitext(checkpoint_path)[0] + ARTIFACT_SUFFIXES[engine]
+
+
+class EagerEngine:
+    """Serves an ``nn.Module`` directly"""
+
+    name = 'eager'
+
+    def __init__(self, model: torch.nn.Module, device: torch.device):
+        self.model = model.eval().to(device)
+        self.device = device
+        self.nbytes = module_nbytes(self.model)
+
+    def __call__(self, batch: torch.Tensor) -> torch.Tensor:
+        with torch.no_grad():
+            # Asynchronous when the batch sits in pinned host memory
+            return self.model(batch.to(self.device, non_blocking=True))
+
+
+class TorchScriptEngine:
+    """Serves a frozen TorchScript graph produced by export_model.py"""
+
+    name = 'torchscript'
+
+    def __init__(self, path: str, device: torch.device):
+        self.model = torch.jit.load(path, map_location=device).eval()
+        self.device = device
+        self.nbytes = module_nbytes(self.model)
+
+    def __call__(self, batch: torch.Tensor) -> torch.Tensor:
+        with torch.no_grad():
+            return self.model(batch.to(self.device, non_blocking=True))
+
+
+class QuantizedEngine(TorchScriptEngine):
+    """Serves an INT8 TorchScript graph produced by quantize_model.py (CPU only)"""
+
+    name = 'int8'
+
+    def __init__(self, path: str):
+        # Quantized kernels must match the backend used at calibration time
+        if 'x86' in torch.backends.quantized.supported_engines:
+            torch.backends.quantized.engine = 'x86'
+        super().__init__(path, torch.device('cpu'))
+
+
+class OnnxEngine:
+    """Serves an ONNX graph through ONNX Runtime's CPU execution provider"""
+
+    name = 'onnx'
+
+    def __init__(self, path: str, intra_op_threads: int = 0):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("The onnx engine requires the onnxruntime package") from e
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        # Weights are embedded in the graph, so the file size approximates resident memory
+        self.nbytes = os.path.getsize(path)
+
+    def __call__(self, batch: torch.Tensor) -> torch.Tensor:
+        inputs = batch.detach().cpu().numpy()
+        logits = self.session.run(None, {self.input_name: inputs})[0]
+        return torch.from_numpy(logits)
+
+
+def build_engine(
+    engine: str,
+    checkpoint_path: str,
+    load_eager: Callable[[], torch.nn.Module],
+    device: torch.device,
+    intra_op_threads: int = 0,
+    precision: str = 'fp32'
+):
+    """Create the configured engine (and precision) for a checkpoint"""
+    if precision == 'int8':
+        # The quantized artifact is a TorchScript graph regardless of the fp32 engine setting
+        engine = 'int8'
+    elif precision != 'fp32':
+        raise ValueError(f"Unsupported precision: {precision}")
+
+    if engine == 'eager':
+        return EagerEngine(load_eager(), device)
+    if engine not in ARTIFACT_SUFFIXES:
+        raise ValueError(f"Unsupported inference engine: {engine}")
+
+    path = artifact_path(checkpoint_path, engine)
+    if not os.path.exists(path):
+        script = 'quantize_model.py' if engine == 'int8' else 'export_model.py'
+        raise FileNotFoundError(
+            f"No {engine} artifact at {path}; run {script} for this checkpoint"
+        )
+    logger.info(f"Loading {engine} engine from {path}")
+    if engine == 'int8':
+        return QuantizedEngine(path)
+    if engine == 'torchscript':
+        return TorchScriptEngine(path, device)
+    return OnnxEngine(path, intra_op_threads)
+
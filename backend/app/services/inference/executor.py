@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.core.config import settings
+from app.services.inference.priority import ROUTINE_PRIORITY, PriorityQueue
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceQueueFullError(RuntimeError):
+    """Raised when a pool already has its maximum number of pending tasks"""
+
+
+class _Pool:
+    """
+    Bounded thread pool that tracks its own queue depth.
+
+    Tasks wait in a priority queue rather than the executor's FIFO: every submission
+    also queues one dispatch call on the executor, and each dispatch runs whichever
+    task is most urgent when a worker becomes free.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int, aging_s: float = 0.0):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix=f"inference-{name}"
+        )
+        self.pending: PriorityQueue = PriorityQueue(aging_s)
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable, *args, priority: int = ROUTINE_PRIORITY, **kwargs) -> Future:
+        future = Future()
+        with self._lock:
+            if self.max_queue and self.queued >= self.max_queue:
+                self.rejected += 1
+                raise InferenceQueueFullError(
+                    f"Inference pool '{self.name}' is full ({self.queued} tasks queued)"
+                )
+            task = (future, fn, args, kwargs)
+            self.pending.push(task, priority)
+            self.queued += 1
+        try:
+            self.executor.submit(self._dispatch)
+        except Exception:
+            with self._lock:
+                self.pending.pop(task)
+                self.queued -= 1
+            raise
+        return future
+
+    def _dispatch(self):
+        with self._lock:
+            future, fn, args, kwargs = self.pending.pop()
+            self.queued -= 1
+            if not future.set_running_or_notify_cancel():
+                return
+            self.active += 1
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.completed += 1
+
+    def get_metrics(self) -> Dict:
+        with self._lock:
+            return {
+                'workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'queue_depth': self.queued,
+                'active': self.active,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                **self.pending.get_metrics()
+            }
+
+
+class InferenceExecutor:
+    """
+    Named, bounded worker pools for blocking model work.
+
+    Torch forward passes, ``generate()`` calls and image decoding all release the
+    GIL for most of their runtime, so threads give real parallelism while keeping
+    the asyncio event loop free to serve other requests.
+    """
+
+    def __init__(self, pool_sizes: Dict[str, int], max_queue: int = 0, aging_s: float = 0.0):
+        self.max_queue = max_queue
+        self.aging_s = aging_s
+        self._pools: Dict[str, _Pool] = {
+            name: _Pool(name, size, max_queue, aging_s) for name, size in pool_sizes.items()
+        }
+        self._lock = threading.Lock()
+
+    def _pool(self, name: str) -> _Pool:
+        pool = self._pools.get(name)
+        if pool is None:
+            with self._lock:
+                pool = self._pools.get(name)
+                if pool is None:
+                    logger.warning(f"Inference pool '{name}' is not configured, creating it with 1 worker")
+                    pool = _Pool(name, 1, self.max_queue, self.aging_s)
+                    self._pools[name] = pool
+        return pool
+
+    def submit(self, pool: str, fn: Callable, *args, priority: int = ROUTINE_PRIORITY, **kwargs) -> Future:
+        """
+        Submit blocking work to a pool and return a concurrent Future. Queued work
+        runs most urgent ``priority`` first (see inference.priority).
+        """
+        return self._pool(pool).submit(fn, *args, priority=priority, **kwargs)
+
+    async def run(self, pool: str, fn: Callable, *args, priority: int = ROUTINE_PRIORITY, **kwargs) -> Any:
+        """Run blocking work on a pool and await its result"""
+        return await asyncio.wrap_future(self.submit(pool, fn, *args, priority=priority, **kwargs))
+
+    def get_metrics(self, pool: Optional[str] = None) -> Dict:
+        """Queue depth and utilisation per pool"""
+        if pool is not None:
+            return self._pool(pool).get_metrics()
+        return {name: p.get_metrics() for name, p in self._pools.items()}
+
+    def shutdown(self, wait: bool = True):
+        for pool in self._pools.values():
+            pool.executor.shutdown(wait=wait)
+
+
+inference_executor = InferenceExecutor(
+    settings.INFERENCE_POOL_SIZES,
+    max_queue=settings.INFERENCE_MAX_QUEUE_SIZE,
+    aging_s=settings.SCHEDULER_PRIORITY_AGING_SECONDS
+)
@@ -0,0 +1,409 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+import torch
+import torch.nn.functional as F
+
+from .batching import BATCH_SIZE_BUCKETS
+from .lazy import LazyModel
+from .metrics import Histogram
+from .prefix_cache import KVCache, PrefixCache, from_legacy_cache, legacy_cache
+from .priority import ROUTINE_PRIORITY, PriorityQueue
+
+logger = logging.getLogger(__name__)
+
+
+class _Sequence:
+    """One prompt being generated, from admission until it is retired"""
+
+    __slots__ = (
+        'prompt', 'prompt_ids', 'max_new_tokens', 'max_length', 'temperature', 'top_p',
+        'do_sample', 'on_token', 'stop', 'stopped', 'prefix', 'prefix_len', 'generated', 'future', 'enqueued_at'
+    )
+
+    def __init__(self, prompt, max_new_tokens, max_length, temperature, top_p, do_sample, on_token, stop, prefix):
+        self.prompt = prompt
+        self.prompt_ids: Optional[List[int]] = None
+        self.prefix = prefix
+        self.prefix_len = 0
+        self.max_new_tokens = max_new_tokens
+        self.max_length = max_length
+        self.temperature = temperature
+        self.top_p = top_p
+        self.do_sample = do_sample
+        self.on_token = on_token
+        self.stop = stop
+        self.stopped = False
+        self.generated: List[int] = []
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+    def tokenize(self, tokenizer, prefix_cache: Optional[PrefixCache] = None):
+        split = prefix_cache.split(tokenizer, self.prompt, self.prefix) if prefix_cache is not None else None
+        if split is not None:
+            prefix_ids, suffix_ids = split
+            self.prompt_ids = prefix_ids + suffix_ids
+            self.prefix_len = len(prefix_ids)
+        else:
+            self.prompt_ids = tokenizer(self.prompt)['input_ids']
+            self.prefix = None
+        if self.max_new_tokens is None:
+            # generate(max_length=...) semantics: the limit includes the prompt
+            self.max_new_tokens = max(1, self.max_length - len(self.prompt_ids))
+
+    def append(self, token: int):
+        self.generated.append(token)
+        if self.on_token is not None:
+            self.on_token(token)
+        if self.stop is not None and self.stop(token):
+            self.stopped = True
+
+    @property
+    def budget(self) -> int:
+        """Tokens this sequence may occupy in the KV cache"""
+        return len(self.prompt_ids) + self.max_new_tokens
+
+
+def _left_pad_cache(cache: KVCache, pad: int) -> KVCache:
+    return tuple((F.pad(k, (0, 0, pad, 0)), F.pad(v, (0, 0, pad, 0))) for k, v in cache)
+
+
+def _concat_cache(a: KVCache, b: KVCache) -> KVCache:
+    return tuple((torch.cat([ka, kb]), torch.cat([va, vb])) for (ka, va), (kb, vb) in zip(a, b))
+
+
+def _select_cache(cache: KVCache, rows: torch.Tensor) -> KVCache:
+    return tuple((k.index_select(0, rows), v.index_select(0, rows)) for k, v in cache)
+
+
+def _trim_cache(cache: KVCache, start: int) -> KVCache:
+    return tuple((k[:, :, start:], v[:, :, start:]) for k, v in cache)
+
+
+class GenerationScheduler:
+    """
+    Continuous batching for causal LM generation.
+
+    Prompts submitted from any thread are merged into one running batch that a single
+    scheduler thread advances one token per forward pass. New prompts are prefilled
+    and join between decode steps; finished sequences are retired immediately, so a
+    long generation never holds short ones back. Sequences are left-padded in a
+    shared KV cache, with the attention mask and explicit position ids keeping each
+    one equivalent to generating it alone.
+
+    Admission is bounded by ``max_batch_size`` and ``max_tokens_in_flight`` (prompt
+    plus maximum new tokens, summed over the batch; 0 = unbounded). A single prompt
+    larger than the token budget still runs, alone.
+
+    With a ``prefix_cache``, prompts submitted with a static ``prefix`` start from
+    its cached key/value state and only their suffix is prefilled.
+
+    Queued prompts are admitted by ``priority`` (aged by ``aging_s``, see
+    inference.priority), so an emergency joins the next step ahead of routine work.
+    """
+
+    def __init__(
+        self,
+        model: LazyModel,
+        tokenizer: Callable[[], Any],
+        max_batch_size: int = 4,
+        max_tokens_in_flight: int = 0,
+        name: str = "generation",
+        prefix_cache: Optional[PrefixCache] = None,
+        aging_s: float = 0.0
+    ):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_tokens_in_flight = max_tokens_in_flight
+        self.name = name
+        self.prefix_cache = prefix_cache
+        self._queue: 'PriorityQueue[_Sequence]' = PriorityQueue(aging_s)
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+        self._active: List[_Sequence] = []
+        self._cache: Optional[KVCache] = None
+        self._mask: Optional[torch.Tensor] = None
+        self._cache_cls = None
+        self.batch_size = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait_ms = Histogram()
+        self.prefill_ms = Histogram()
+        self.tokens_prefilled = 0
+        self.completed = 0
+        self.failed = 0
+        self.tokens_generated = 0
+        self.busy_seconds = 0.0
+
+    def submit(
+        self,
+        prompt: str,
+        max_new_tokens: Optional[int] = None,
+        max_length: int = 2048,
+        temperature: float = 1.0,
+        top_p: float = 1.0,
+        do_sample: bool = False,
+        on_token: Optional[Callable[[int], None]] = None,
+        stop: Optional[Callable[[int], bool]] = None,
+        prefix: Optional[str] = None,
+        priority: int = ROUTINE_PRIORITY
+    ) -> Future:
+        """
+        Queue a prompt; the Future resolves to the generated text (without the prompt).
+        ``on_token`` is called with each token id on the scheduler thread as it is sampled,
+        and the sequence finishes after the first token for which ``stop`` returns True.
+        ``prefix`` names the static start of ``prompt`` whose cache may be reused.
+        Higher ``priority`` prompts are admitted first.
+        """
+        sequence = _Sequence(
+            prompt, max_new_tokens, max_length, temperature, top_p, do_sample, on_token, stop, prefix
+        )
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError(f"Generation scheduler '{self.name}' is shut down")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+            self._queue.push(sequence, priority)
+            self._cond.notify()
+        return sequence.future
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._stopped:
+                    self._cond.wait()
+                if self._stopped and not self._queue:
+                    return
+            # Hold the model only while there is work, so it can be unloaded when idle
+            try:
+                with self.model.use() as model:
+                    self._serve(model)
+            except Exception as e:
+                logger.error(f"Could not load model for {self.name}: {str(e)}")
+                with self._cond:
+                    queued = self._queue.drain()
+                for sequence in queued:
+                    if sequence.future.set_running_or_notify_cancel():
+                        sequence.future.set_exception(e)
+
+    def _serve(self, model):
+        """Step the batch until no sequences are active or queued"""
+        while True:
+            start = time.perf_counter()
+            admitted = []
+            try:
+                admitted = self._admit()
+                if admitted:
+                    self._prefill(model, admitted)
+                if not self._active:
+                    return
+                self._decode(model)
+            except Exception as e:
+                logger.error(f"Generation batch failed: {str(e)}")
+                self._fail(self._active + [s for s in admitted if s not in self._active], e)
+            finally:
+                self.busy_seconds += time.perf_counter() - start
+
+    def _admit(self) -> List[_Sequence]:
+        """Move queued prompts into the batch while the size and token budgets allow"""
+        admitted = []
+        tokenizer = self.tokenizer()
+        in_flight = sum(s.budget for s in self._active)
+        with self._cond:
+            while self._queue and len(self._active) + len(admitted) < self.max_batch_size:
+                sequence = self._queue.peek()
+                if sequence.prompt_ids is None:
+                    try:
+                        sequence.tokenize(tokenizer, self.prefix_cache)
+                    except Exception as e:
+                        self._queue.pop(sequence)
+                        if sequence.future.set_running_or_notify_cancel():
+                            sequence.future.set_exception(e)
+                        continue
+                busy = self._active or admitted
+                if busy and self.max_tokens_in_flight and in_flight + sequence.budget > self.max_tokens_in_flight:
+                    break
+                self._queue.pop(sequence)
+                if not sequence.future.set_running_or_notify_cancel():
+                    continue
+                self.queue_wait_ms.observe((time.monotonic() - sequence.enqueued_at) * 1000)
+                in_flight += sequence.budget
+                admitted.append(sequence)
+        return admitted
+
+    def _prefill(self, model, sequences: List[_Sequence]):
+        """Run the new prompts, one forward pass per shared prefix, and merge them into the batch"""
+        start = time.perf_counter()
+        groups: Dict[Optional[str], List[_Sequence]] = {}
+        for sequence in sequences:
+            groups.setdefault(sequence.prefix, []).append(sequence)
+        for prefix, group in groups.items():
+            self._prefill_group(model, group, prefix)
+        self.prefill_ms.observe((time.perf_counter() - start) * 1000)
+
+    def _prefill_group(self, model, sequences: List[_Sequence], prefix: Optional[str]):
+        device = model.device
+        pad_id = self._pad_token_id()
+        past_key_values, offset = None, 0
+        if prefix is not None:
+            entry = self.prefix_cache.get(self.model.name, model, self.tokenizer(), prefix)
+            past_key_values, offset = entry.past_key_values(len(sequences)), len(entry.ids)
+        # Only the part after the cached prefix is run; padding sits between the two
+        suffixes = [s.prompt_ids[offset:] for s in sequences]
+        length = max(len(ids) for ids in suffixes)
+        input_ids = torch.tensor(
+            [[pad_id] * (length - len(ids)) + ids for ids in suffixes],
+            device=device
+        )
+        mask = torch.tensor(
+            [[1] * offset + [0] * (length - len(ids)) + [1] * len(ids) for ids in suffixes],
+            device=device
+        )
+        position_ids = (mask.cumsum(-1) - 1).clamp(min=0)[:, offset:]
+        self.tokens_prefilled += sum(len(ids) for ids in suffixes)
+
+        with torch.no_grad():
+            outputs = model(
+                input_ids=input_ids,
+                attention_mask=mask,
+                position_ids=position_ids,
+                past_key_values=past_key_values,
+                use_cache=True
+            )
+        self._cache_cls = type(outputs.past_key_values)
+        cache = legacy_cache(outputs.past_key_values)
+        length = mask.shape[1]
+
+        if self._active:
+            current = self._mask.shape[1]
+            if current > length:
+                cache = _left_pad_cache(cache, current - length)
+                mask = F.pad(mask, (current - length, 0))
+            elif length > current:
+                self._cache = _left_pad_cache(self._cache, length - current)
+                self._mask = F.pad(self._mask, (length - current, 0))
+            self._cache = _concat_cache(self._cache, cache)
+            self._mask = torch.cat([self._mask, mask])
+        else:
+            self._cache, self._mask = cache, mask
+        self._active.extend(sequences)
+
+        for sequence, token in zip(sequences, self._sample(outputs.logits[:, -1, :], sequences)):
+            sequence.append(token)
+        self._retire()
+
+    def _decode(self, model):
+        """Advance every active sequence by one token"""
+        self.batch_size.observe(len(self._active))
+        device = model.device
+        input_ids = torch.tensor([[s.generated[-1]] for s in self._active], device=device)
+        self._mask = torch.cat([self._mask, self._mask.new_ones((len(self._active), 1))], dim=1)
+        position_ids = self._mask.sum(-1, keepdim=True) - 1
+
+        past_key_values = from_legacy_cache(self._cache_cls, self._cache)
+        with torch.no_grad():
+            outputs = model(
+                input_ids=input_ids,
+                attention_mask=self._mask,
+                position_ids=position_ids,
+                past_key_values=past_key_values,
+                use_cache=True
+            )
+        self._cache = legacy_cache(outputs.past_key_values)
+
+        for sequence, token in zip(self._active, self._sample(outputs.logits[:, -1, :], self._active)):
+            sequence.append(token)
+        self._retire()
+
+    def _sample(self, logits: torch.Tensor, sequences: List[_Sequence]) -> List[int]:
+        greedy = logits.argmax(-1).tolist()
+        tokens = []
+        for i, sequence in enumerate(sequences):
+            if not sequence.do_sample or sequence.temperature <= 0:
+                tokens.append(greedy[i])
+                continue
+            probs = torch.softmax(logits[i].float() / sequence.temperature, dim=-1)
+            if sequence.top_p < 1.0:
+                sorted_probs, order = probs.sort(descending=True)
+                sorted_probs[sorted_probs.cumsum(0) - sorted_probs > sequence.top_p] = 0
+                probs = torch.zeros_like(probs).scatter_(0, order, sorted_probs)
+            tokens.append(int(torch.multinomial(probs, 1)))
+        return tokens
+
+    def _retire(self):
+        """Resolve finished sequences and drop their rows (and all-padding columns) from the cache"""
+        eos_id = self.tokenizer().eos_token_id
+        keep = []
+        for i, sequence in enumerate(self._active):
+            if sequence.stopped or sequence.generated[-1] == eos_id or len(sequence.generated) >= sequence.max_new_tokens:
+                self._finish(sequence)
+            else:
+                keep.append(i)
+        if len(keep) == len(self._active):
+            return
+        if not keep:
+            self._reset()
+            return
+
+        rows = torch.tensor(keep, device=self._mask.device)
+        self._active = [self._active[i] for i in keep]
+        self._cache = _select_cache(self._cache, rows)
+        self._mask = self._mask.index_select(0, rows)
+        leading = int((self._mask.sum(0) == 0).long().cumprod(0).sum())
+        if leading:
+            self._cache = _trim_cache(self._cache, leading)
+            self._mask = self._mask[:, leading:]
+
+    def _finish(self, sequence: _Sequence):
+        text = self.tokenizer().decode(sequence.generated, skip_special_tokens=True)
+        self.completed += 1
+        self.tokens_generated += len(sequence.generated)
+        sequence.future.set_result(text)
+
+    def _fail(self, sequences: List[_Sequence], error: Exception):
+        for sequence in sequences:
+            if not sequence.future.done():
+                self.failed += 1
+                sequence.future.set_exception(error)
+        self._reset()
+
+    def _reset(self):
+        self._active = []
+        self._cache = None
+        self._mask = None
+
+    def _pad_token_id(self) -> int:
+        tokenizer = self.tokenizer()
+        return tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+
+    def get_metrics(self) -> Dict:
+        with self._cond:
+            queue = self._queue.get_metrics()
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_tokens_in_flight': self.max_tokens_in_flight,
+            'queue_depth': len(self._queue),
+            'active': len(self._active),
+            'batch_size': self.batch_size.snapshot(),
+            'queue_wait_ms': self.queue_wait_ms.snapshot(),
+            **queue,
+            'prefill_ms': self.prefill_ms.snapshot(),
+            'tokens_prefilled': self.tokens_prefilled,
+            'completed': self.completed,
+            'failed': self.failed,
+            'tokens_generated': self.tokens_generated,
+            'tokens_per_second': self.tokens_generated / self.busy_seconds if self.busy_seconds else 0.0
+        }
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting prompts; queued and running ones are finished first"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+            thread = self._thread
+        if wait and thread is not None:
+            thread.join()
@@ -0,0 +1,95 @@
+from typing import Any, Dict, List, Optional, Tuple, Type, Union
+
+# Expected top-level fields of a structured response and the JSON types each may take
+JsonSchema = Dict[str, Union[Type, Tuple[Type, ...]]]
+
+
+class JsonObjectTracker:
+    """
+    Incremental scanner for the first top-level JSON object in a stream of text.
+
+    Text is fed in chunks as it is generated. The tracker follows string, escape and
+    nesting state one character at a time, so it knows the moment the object closes
+    without re-reading earlier output, and anything before the opening brace (prose,
+    a markdown fence) is skipped. Top-level keys are checked against ``schema`` as
+    soon as each one is complete.
+    """
+
+    def __init__(self, schema: Optional[JsonSchema] = None):
+        self.schema = schema
+        self.keys: List[str] = []
+        self.unexpected: List[str] = []
+        self.complete = False
+        self._chars: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._expect_key = False
+        self._key: Optional[List[str]] = None
+
+    @property
+    def text(self) -> str:
+        """The object's source text so far"""
+        return ''.join(self._chars)
+
+    def feed(self, text: str) -> bool:
+        """Consume more output; returns True once the top-level object has closed"""
+        for ch in text:
+            if self.complete:
+                break
+            if self._depth == 0:
+                if ch == '{':
+                    self._chars.append(ch)
+                    self._depth = 1
+                    self._expect_key = True
+                continue
+
+            self._chars.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._key is not None:
+                        self._add_key(''.join(self._key))
+                        self._key = None
+                    continue
+                if self._key is not None:
+                    self._key.append(ch)
+            elif ch == '"':
+                self._in_string = True
+                if self._depth == 1 and self._expect_key:
+                    self._key = []
+                    self._expect_key = False
+            elif ch in '{[':
+                self._depth += 1
+            elif ch in '}]':
+                self._depth -= 1
+                self.complete = self._depth == 0
+            elif ch == ',' and self._depth == 1:
+                self._expect_key = True
+        return self.complete
+
+    def _add_key(self, key: str):
+        self.keys.append(key)
+        if self.schema is not None and key not in self.schema:
+            self.unexpected.append(key)
+
+    def validate(self, obj: Dict[str, Any]) -> List[str]:
+        """Schema violations of the parsed object: missing fields, wrong types, unexpected keys"""
+        if self.schema is None:
+            return []
+        errors = [f"Missing field: {name}" for name in self.schema if name not in obj]
+        for name, types in self.schema.items():
+            if name in obj and obj[name] is not None and not isinstance(obj[name], types):
+                errors.append(f"Field {name} has type {type(obj[name]).__name__}")
+        errors.extend(f"Unexpected field: {key}" for key in self.unexpected)
+        return errors
+
+
+def parse_json_object(text: str, schema: Optional[JsonSchema] = None) -> Tuple[Optional[str], JsonObjectTracker]:
+    """Locate the first complete top-level JSON object in ``text``; returns its source (or None) and the tracker"""
+    tracker = JsonObjectTracker(schema)
+    return (tracker.text if tracker.feed(text) else None), tracker
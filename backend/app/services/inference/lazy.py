@@ -0,0 +1,121 @@
+import gc
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+class LazyModel:
+    """
+    Loads a model on first use and optionally releases it after a period of idleness.
+
+    Concurrent first callers share a single load (a failed load is retried by the
+    next caller). Use ``with lazy.use() as model:`` around each call so the idle
+    reaper never unloads a model while it is running; ``idle_unload_s=0`` keeps the
+    model resident once loaded. ``on_unload`` runs after each unload, to release
+    state derived from the model.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        loader: Callable[[], Any],
+        idle_unload_s: float = 0,
+        on_unload: Optional[Callable[[], None]] = None
+    ):
+        self.name = name
+        self.loader = loader
+        self.idle_unload_s = idle_unload_s
+        self.on_unload = on_unload
+        self._model: Optional[Any] = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._active = 0
+        self._last_used = 0.0
+        self._reaper: Optional[threading.Thread] = None
+        self.loads = 0
+        self.unloads = 0
+        self.load_seconds: Optional[float] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def get(self) -> Any:
+        """Return the model, loading it if needed (without marking it in use)"""
+        model = self._model
+        if model is not None:
+            self._last_used = time.monotonic()
+            return model
+        # Single flight: one thread loads, the rest wait on the lock and reuse its result
+        with self._load_lock:
+            if self._model is None:
+                logger.info(f"Loading {self.name}...")
+                start = time.perf_counter()
+                model = self.loader()
+                self.load_seconds = time.perf_counter() - start
+                with self._lock:
+                    self._model = model
+                    self._last_used = time.monotonic()
+                    self.loads += 1
+                logger.info(f"Loaded {self.name} in {self.load_seconds:.1f}s")
+                self._start_reaper()
+            return self._model
+
+    @contextmanager
+    def use(self) -> Iterator[Any]:
+        """Hold the model for the duration of a call so it cannot be unloaded underneath it"""
+        with self._lock:
+            self._active += 1
+        try:
+            yield self.get()
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._last_used = time.monotonic()
+
+    def unload(self) -> bool:
+        """Release the model if it is loaded and not in use"""
+        with self._lock:
+            if self._model is None or self._active:
+                return False
+            self._model = None
+            self.unloads += 1
+        if self.on_unload is not None:
+            self.on_unload()
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        logger.info(f"Unloaded {self.name}")
+        return True
+
+    def _start_reaper(self):
+        if not self.idle_unload_s or self._reaper is not None:
+            return
+        self._reaper = threading.Thread(target=self._reap, name=f"idle-unload-{self.name}", daemon=True)
+        self._reaper.start()
+
+    def _reap(self):
+        interval = min(60.0, max(1.0, self.idle_unload_s / 4))
+        while True:
+            time.sleep(interval)
+            idle = time.monotonic() - self._last_used
+            if self._model is not None and not self._active and idle >= self.idle_unload_s:
+                logger.info(f"{self.name} idle for {idle:.0f}s")
+                self.unload()
+
+    def get_status(self) -> Dict:
+        return {
+            'loaded': self.loaded,
+            'active': self._active,
+            'loads': self.loads,
+            'unloads': self.unloads,
+            'load_seconds': self.load_seconds,
+            'idle_seconds': time.monotonic() - self._last_used if self.loaded else None,
+            'idle_unload_s': self.idle_unload_s
+        }
@@ -0,0 +1,58 @@
+import bisect
+import threading
+from typing import Dict, Sequence
+
+# Bucket upper bounds in milliseconds, tuned for CPU inference latencies
+DEFAULT_LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+
+class Histogram:
+    """Thread-safe fixed-bucket histogram for in-process metrics"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS_MS):
+        self.buckets = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        """Record a single observation"""
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._count += 1
+            self._sum += value
+            self._max = max(self._max, value)
+
+    def quantile(self, q: float) -> float:
+        """Approximate quantile, reported as the upper bound of its bucket"""
+        with self._lock:
+            return self._quantile(q)
+
+    def _quantile(self, q: float) -> float:
+        if self._count == 0:
+            return 0.0
+        rank = q * self._count
+        seen = 0
+        for i, count in enumerate(self._counts):
+            seen += count
+            if seen >= rank and count:
+                return self.buckets[i] if i < len(self.buckets) else self._max
+        return self._max
+
+    def snapshot(self) -> Dict:
+        """Summary of the recorded observations"""
+        with self._lock:
+            return {
+                'count': self._count,
+                'mean': self._sum / self._count if self._count else 0.0,
+                'max': self._max,
+                'p50': self._quantile(0.50),
+                'p95': self._quantile(0.95),
+                'p99': self._quantile(0.99),
+                'buckets': {
+                    **{f"le_{b}": c for b, c in zip(self.buckets, self._counts)},
+                    'inf': self._counts[-1]
+                }
+            }
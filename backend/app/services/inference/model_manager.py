@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _Component:
+    """A lazily constructed model or service plus its optional warmup routine"""
+
+    def __init__(self, name: str, factory: Callable[[], Any], warmup: Optional[Callable[[Any], None]] = None):
+        self.name = name
+        self.factory = factory
+        self.warmup = warmup
+        self.instance = None
+        self.state = 'registered'
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.warmup_seconds: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def load(self, warmup: bool = False) -> Any:
+        """Construct the component once; concurrent callers wait for the first load"""
+        with self._lock:
+            if self.instance is None:
+                self.state = 'loading'
+                started = time.monotonic()
+                try:
+                    self.instance = self.factory()
+                except Exception as e:
+                    self.state = 'failed'
+                    self.error = str(e)
+                    raise
+                self.load_seconds = time.monotonic() - started
+                self.state = 'loaded'
+                logger.info(f"Loaded {self.name} in {self.load_seconds:.2f}s")
+
+            if warmup and self.warmup is not None and self.state != 'ready':
+                self.state = 'warming'
+                started = time.monotonic()
+                try:
+                    self.warmup(self.instance)
+                except Exception as e:
+                    self.state = 'failed'
+                    self.error = str(e)
+                    raise
+                self.warmup_seconds = time.monotonic() - started
+                logger.info(f"Warmed up {self.name} in {self.warmup_seconds:.2f}s")
+
+            if warmup or self.warmup is None:
+                self.state = 'ready'
+            return self.instance
+
+    def get_status(self) -> Dict:
+        return {
+            'state': self.state,
+            'error': self.error,
+            'load_seconds': self.load_seconds,
+            'warmup_seconds': self.warmup_seconds
+        }
+
+
+class ModelManager:
+    """
+    Owns the lifecycle of heavyweight models and services.
+
+    Components are registered cheaply at import time and constructed either by
+    ``start()`` during application startup (preload + warmup) or on first use via
+    ``get()``. The application reports ready only after every preloaded component
+    has finished warming up.
+    """
+
+    def __init__(self):
+        self._components: Dict[str, _Component] = {}
+        self._preload: List[str] = []
+        self._task: Optional[asyncio.Task] = None
+        self._ready = False
+
+    def register(self, name: str, factory: Callable[[], Any], warmup: Optional[Callable[[Any], None]] = None):
+        """Register a component; nothing is loaded until it is preloaded or requested"""
+        if name in self._components:
+            logger.warning(f"Component {name} is already registered, replacing it")
+        self._components[name] = _Component(name, factory, warmup)
+
+    async def get(self, name: str) -> Any:
+        """Return a component, loading it off the event loop if it is not resident yet"""
+        component = self._component(name)
+        if component.instance is not None:
+            return component.instance
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, component.load)
+
+    def _component(self, name: str) -> _Component:
+        component = self._components.get(name)
+        if component is None:
+            raise KeyError(f"Unknown model component: {name}")
+        return component
+
+    def start(self, names: Iterable[str]):
+        """Begin preloading and warming up ``names`` in the background"""
+        self._preload = list(names)
+        self._ready = False
+        self._task = asyncio.create_task(self._run_preload())
+
+    async def _run_preload(self):
+        loop = asyncio.get_running_loop()
+        failed = []
+        for name in self._preload:
+            component = self._components.get(name)
+            if component is None:
+                logger.error(f"Cannot preload unknown model component: {name}")
+                failed.append(name)
+                continue
+            try:
+                await loop.run_in_executor(None, component.load, True)
+            except Exception as e:
+                logger.error(f"Preloading {name} failed: {str(e)}")
+                failed.append(name)
+
+        self._ready = not failed
+        if failed:
+            logger.error(f"Model preloading finished with failures: {failed}")
+        else:
+            logger.info(f"Model preloading finished: {self._preload}")
+
+    async def stop(self):
+        """Cancel an in-flight preload"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    def get_status(self) -> Dict:
+        return {
+            'ready': self._ready,
+            'preload': self._preload,
+            'components': {name: c.get_status() for name, c in self._components.items()}
+        }
+
+
+model_manager = ModelManager()
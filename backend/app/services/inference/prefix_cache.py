@@ -0,0 +1,187 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+
+from .metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+# Legacy key/value cache layout: one (key, value) pair of [batch, heads, seq, head_dim] per layer
+KVCache = Tuple[Tuple[torch.Tensor, torch.Tensor], ...]
+
+
+def legacy_cache(cache) -> KVCache:
+    if hasattr(cache, 'to_legacy_cache'):
+        return cache.to_legacy_cache()
+    if hasattr(cache, 'layers'):
+        # transformers 5 dropped the legacy conversions; cache layers still hold keys and values
+        return tuple((layer.keys, layer.values) for layer in cache.layers)
+    return cache
+
+
+def from_legacy_cache(cache_cls, cache: KVCache):
+    """A past_key_values of the type the model returned (``cache_cls``) holding ``cache``"""
+    if hasattr(cache_cls, 'from_legacy_cache'):
+        return cache_cls.from_legacy_cache(cache)
+    if hasattr(cache_cls, 'get_seq_length'):
+        return cache_cls(cache)
+    return cache
+
+
+def template_prefix(template: str) -> str:
+    """The static part of a str.format template: every line before the one holding its first field"""
+    head = template.split('{', 1)[0]
+    return head[:head.rfind('\n') + 1]
+
+
+class PrefixEntry:
+    """Key/value state of one prompt prefix on one model"""
+
+    __slots__ = ('ids', 'cache', 'cache_cls', 'nbytes')
+
+    def __init__(self, ids: List[int], cache: KVCache, cache_cls):
+        self.ids = ids
+        self.cache = cache
+        self.cache_cls = cache_cls
+        self.nbytes = sum(k.numel() * k.element_size() + v.numel() * v.element_size() for k, v in cache)
+
+    def past_key_values(self, batch_size: int = 1):
+        """A fresh past_key_values for ``batch_size`` rows; the stored tensors are never modified"""
+        cache = tuple((k.expand(batch_size, -1, -1, -1), v.expand(batch_size, -1, -1, -1)) for k, v in self.cache)
+        return from_legacy_cache(self.cache_cls, cache)
+
+
+class PrefixCache:
+    """
+    Reuses the key/value state of static prompt prefixes across requests.
+
+    Prompts that begin with a fixed instruction preamble only need their
+    request-specific suffix prefilled: the preamble is run through the model once,
+    its cache is stored under (model name, prefix text), and later prompts start
+    decoding from it. Entries are evicted least-recently-used once their tensors
+    exceed ``max_bytes``; call ``invalidate`` when a model is unloaded so its
+    entries do not keep device memory alive.
+
+    A prompt is tokenized as prefix and suffix separately, so prefixes should end
+    on a line boundary where that split matches how the whole prompt tokenizes.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: 'OrderedDict[Tuple[str, str], PrefixEntry]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+        self.tokens_reused = 0
+        self._pending: 'Dict[Tuple[str, str], Future]' = {}
+        self.prefill_ms = Histogram()
+
+    def split(self, tokenizer, prompt: str, prefix: Optional[str]) -> Optional[Tuple[List[int], List[int]]]:
+        """Prefix and suffix token ids, or None if ``prompt`` does not extend ``prefix``"""
+        if not prefix or len(prompt) <= len(prefix) or not prompt.startswith(prefix):
+            return None
+        return (
+            tokenizer(prefix)['input_ids'],
+            tokenizer(prompt[len(prefix):], add_special_tokens=False)['input_ids']
+        )
+
+    def get(self, name: str, model, tokenizer, prefix: str) -> PrefixEntry:
+        """
+        Return the cached state of ``prefix`` on ``model``, computing it on a miss.
+        The lock only guards the dicts: concurrent misses on one key wait for a single
+        prefill, while lookups and prefills of other keys proceed alongside it.
+        """
+        key = (name, prefix)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self.tokens_reused += len(entry.ids)
+                return entry
+            self.misses += 1
+            pending = self._pending.get(key)
+            if pending is None:
+                pending = self._pending[key] = Future()
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            entry = pending.result()
+            with self._lock:
+                self.tokens_reused += len(entry.ids)
+            return entry
+
+        try:
+            entry = self._prefill(model, tokenizer, prefix)
+        except BaseException as e:
+            with self._lock:
+                if self._pending.get(key) is pending:
+                    del self._pending[key]
+            pending.set_exception(e)
+            raise
+        with self._lock:
+            # Not stored if the model was invalidated while its prefix was prefilling
+            if self._pending.get(key) is pending:
+                del self._pending[key]
+                self._store(key, entry)
+        pending.set_result(entry)
+        return entry
+
+    def _prefill(self, model, tokenizer, prefix: str) -> PrefixEntry:
+        start = time.perf_counter()
+        ids = tokenizer(prefix)['input_ids']
+        with torch.no_grad():
+            outputs = model(input_ids=torch.tensor([ids], device=model.device), use_cache=True)
+        entry = PrefixEntry(ids, legacy_cache(outputs.past_key_values), type(outputs.past_key_values))
+        self.prefill_ms.observe((time.perf_counter() - start) * 1000)
+        return entry
+
+    def _store(self, key: Tuple[str, str], entry: PrefixEntry):
+        if entry.nbytes > self.max_bytes:
+            logger.warning(f"Prompt prefix of {len(entry.ids)} tokens exceeds the prefix cache budget; not cached")
+            return
+        self._entries[key] = entry
+        self.bytes += entry.nbytes
+        while self.bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.bytes -= evicted.nbytes
+            self.evictions += 1
+
+    def invalidate(self, name: str):
+        """Drop every entry computed on the model ``name``"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == name]:
+                self.bytes -= self._entries.pop(key).nbytes
+            for key in [key for key in self._pending if key[0] == name]:
+                del self._pending[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def get_metrics(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'coalesced': self.coalesced,
+            'tokens_reused': self.tokens_reused,
+            'prefill_ms': self.prefill_ms.snapshot()
+        }
@@ -0,0 +1,107 @@
+import time
+from itertools import count
+from typing import Any, Dict, Generic, List, Optional, TypeVar
+
+from .metrics import Histogram
+
+# Scheduling priorities, from routine work to cases the emergency pre-pass flagged
+ROUTINE_PRIORITY = 1
+EMERGENCY_PRIORITY = 5
+PRIORITY_LEVELS = range(ROUTINE_PRIORITY, EMERGENCY_PRIORITY + 1)
+
+T = TypeVar('T')
+
+
+def clamp_priority(priority: int) -> int:
+    return min(max(int(priority), ROUTINE_PRIORITY), EMERGENCY_PRIORITY)
+
+
+def effective_priority(priority: int, waited_s: float, aging_s: float) -> float:
+    """
+    Priority of work that has waited ``waited_s``: one tier higher per ``aging_s``
+    seconds (0 = no aging). Aging stops one tier short of emergency, so emergencies
+    always go first while lower tiers cannot be starved by the ones above them.
+    """
+    if priority >= EMERGENCY_PRIORITY or not aging_s:
+        return priority
+    return min(priority + waited_s / aging_s, EMERGENCY_PRIORITY - 1)
+
+
+class _Entry(Generic[T]):
+    __slots__ = ('item', 'priority', 'enqueued_at', 'seq')
+
+    def __init__(self, item: T, priority: int, enqueued_at: float, seq: int):
+        self.item = item
+        self.priority = priority
+        self.enqueued_at = enqueued_at
+        self.seq = seq
+
+
+class PriorityQueue(Generic[T]):
+    """
+    Queue that hands out the highest effective priority first, oldest first within a tier.
+
+    Effective priorities change as work waits, so the next item is chosen by a scan
+    at pop time; queues are bounded by their owners and stay short. Time from push
+    to pop is recorded per priority. Not thread-safe: callers hold their own lock.
+    """
+
+    def __init__(self, aging_s: float = 0.0):
+        self.aging_s = aging_s
+        self._entries: List[_Entry[T]] = []
+        self._seq = count()
+        self.queue_wait_ms: Dict[int, Histogram] = {priority: Histogram() for priority in PRIORITY_LEVELS}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def push(self, item: T, priority: int = ROUTINE_PRIORITY):
+        self._entries.append(_Entry(item, clamp_priority(priority), time.monotonic(), next(self._seq)))
+
+    def peek(self) -> T:
+        """The item ``pop`` would return now"""
+        return self._entries[self._next()].item
+
+    def pop(self, item: Optional[T] = None) -> T:
+        """Remove and return the next item, or ``item`` if given (e.g. the one just peeked)"""
+        if item is None:
+            index = self._next()
+        else:
+            index = next(i for i, entry in enumerate(self._entries) if entry.item is item)
+        entry = self._entries.pop(index)
+        self.queue_wait_ms[entry.priority].observe((time.monotonic() - entry.enqueued_at) * 1000)
+        return entry.item
+
+    def drain(self) -> List[T]:
+        """Remove and return every item, without recording waits"""
+        items = [entry.item for entry in self._entries]
+        self._entries = []
+        return items
+
+    def _next(self) -> int:
+        if not self._entries:
+            raise IndexError("pop from an empty priority queue")
+        now = time.monotonic()
+        return max(
+            range(len(self._entries)),
+            key=lambda i: (
+                effective_priority(self._entries[i].priority, now - self._entries[i].enqueued_at, self.aging_s),
+                -self._entries[i].seq
+            )
+        )
+
+    def depth(self) -> Dict[str, int]:
+        """Queued items per priority"""
+        counts = {priority: 0 for priority in PRIORITY_LEVELS}
+        for entry in self._entries:
+            counts[entry.priority] += 1
+        return {str(priority): n for priority, n in counts.items()}
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            'aging_seconds': self.aging_s,
+            'queued_by_priority': self.depth(),
+            'queue_wait_ms_by_priority': {
+                str(priority): histogram.snapshot() for priority, histogram in self.queue_wait_ms.items()
+            }
+        }
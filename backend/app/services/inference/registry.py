@@ -0,0 +1,157 @@
+import itertools
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ModelKey(NamedTuple):
+    disease: str
+    architecture: str
+    version: str
+
+    def __str__(self) -> str:
+        return f"{self.disease}/{self.architecture}/{self.version}"
+
+    @classmethod
+    def parse(cls, value: str) -> 'ModelKey':
+        disease, architecture, version = value.split('/')
+        return cls(disease, architecture, version)
+
+
+def module_nbytes(model: Any) -> int:
+    """Resident size of a torch module's parameters and buffers"""
+    tensors = itertools.chain(model.parameters(), model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+class ModelRegistry:
+    """
+    Maps (disease, architecture, version) to a checkpoint and keeps loaded models
+    within a memory budget.
+
+    Models are evicted least-recently-used first once the resident total exceeds
+    ``memory_budget_mb``; the most recently loaded model is always kept even if it
+    alone exceeds the budget. Evicted models are reloaded on demand, and concurrent
+    requests for a model that is not resident share a single load.
+    """
+
+    def __init__(
+        self,
+        checkpoints: Dict[str, str],
+        loader: Callable[[ModelKey, str], Any],
+        memory_budget_mb: float = 0,
+        root: str = '',
+        sizeof: Callable[[Any], int] = module_nbytes
+    ):
+        # Dict order matters: the last version listed for an architecture is its default
+        self.checkpoints: Dict[ModelKey, str] = {
+            ModelKey.parse(key): path for key, path in checkpoints.items()
+        }
+        self.loader = loader
+        self.memory_budget_bytes = int(memory_budget_mb * 1024 * 1024)
+        self.root = root
+        self.sizeof = sizeof
+        self._resident: 'OrderedDict[ModelKey, Any]' = OrderedDict()
+        self._sizes: Dict[ModelKey, int] = {}
+        self._loading: Dict[ModelKey, Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def resolve(self, disease: str, architecture: str, version: Optional[str] = None) -> ModelKey:
+        """Find the registered key for an architecture, defaulting to its latest version"""
+        if version is not None:
+            key = ModelKey(disease, architecture, version)
+            if key not in self.checkpoints:
+                raise ValueError(f"No checkpoint registered for {key}")
+            return key
+        candidates = [
+            key for key in self.checkpoints
+            if key.disease == disease and key.architecture == architecture
+        ]
+        if not candidates:
+            raise ValueError(f"No checkpoint registered for {disease}/{architecture}")
+        return candidates[-1]
+
+    def checkpoint_path(self, key: ModelKey) -> str:
+        return os.path.join(self.root, self.checkpoints[key])
+
+    def get(self, key: ModelKey) -> Any:
+        """Return a resident model, loading it (once) if necessary"""
+        with self._lock:
+            model = self._resident.get(key)
+            if model is not None:
+                self._resident.move_to_end(key)
+                self.hits += 1
+                return model
+            future = self._loading.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._loading[key] = future
+
+        if not owner:
+            return future.result()
+
+        try:
+            model = self.loader(key, self.checkpoint_path(key))
+            size = self.sizeof(model)
+        except Exception as e:
+            with self._lock:
+                del self._loading[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._resident[key] = model
+            self._sizes[key] = size
+            self.loads += 1
+            del self._loading[key]
+            self._evict_over_budget()
+        logger.info(f"Loaded {key} ({size / 1024 / 1024:.1f} MB, {self.resident_bytes / 1024 / 1024:.1f} MB resident)")
+        future.set_result(model)
+        return model
+
+    def _evict_over_budget(self):
+        if not self.memory_budget_bytes:
+            return
+        while len(self._resident) > 1 and self.resident_bytes > self.memory_budget_bytes:
+            key, _ = self._resident.popitem(last=False)
+            size = self._sizes.pop(key)
+            self.evictions += 1
+            logger.info(f"Evicted {key} ({size / 1024 / 1024:.1f} MB) to stay within the memory budget")
+
+    def evict(self, key: ModelKey) -> bool:
+        """Drop a model from memory; it is reloaded on next use"""
+        with self._lock:
+            if self._resident.pop(key, None) is None:
+                return False
+            self._sizes.pop(key, None)
+            self.evictions += 1
+            return True
+
+    def is_resident(self, key: ModelKey) -> bool:
+        return key in self._resident
+
+    @property
+    def resident_bytes(self) -> int:
+        return sum(self._sizes.values())
+
+    def get_metrics(self) -> Dict:
+        with self._lock:
+            return {
+                'memory_budget_mb': self.memory_budget_bytes / 1024 / 1024,
+                'resident_mb': self.resident_bytes / 1024 / 1024,
+                'resident': {
+                    str(key): self._sizes[key] / 1024 / 1024 for key in self._resident
+                },
+                'hits': self.hits,
+                'loads': self.loads,
+                'evictions': self.evictions
+            }
@@ -0,0 +1,205 @@
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import torch
+
+from .metrics import Histogram
+
+
+def _forward(model, ids: List[int], past) -> Tuple[torch.Tensor, Any]:
+    """Run ``ids`` on top of ``past``; returns the logits of every position and the extended cache"""
+    outputs = model(input_ids=torch.tensor([ids], device=model.device), past_key_values=past, use_cache=True)
+    return outputs.logits[0], outputs.past_key_values
+
+
+def _crop(cache, length: int):
+    """Drop cached positions from ``length`` on (rejected draft tokens)"""
+    if hasattr(cache, 'crop'):
+        cache.crop(length)
+        return cache
+    return tuple((k[:, :, :length], v[:, :, :length]) for k, v in cache)
+
+
+def _warp(logits: torch.Tensor, temperature: float, top_p: float) -> torch.Tensor:
+    """Sampling distribution after temperature and nucleus filtering, as GenerationScheduler samples"""
+    probs = torch.softmax(logits.float() / temperature, dim=-1)
+    if top_p < 1.0:
+        sorted_probs, order = probs.sort(descending=True)
+        sorted_probs[sorted_probs.cumsum(0) - sorted_probs > top_p] = 0
+        probs = torch.zeros_like(probs).scatter_(0, order, sorted_probs)
+        probs = probs / probs.sum()
+    return probs
+
+
+class SpeculativeDecoder:
+    """
+    Speculative (assisted) decoding of one sequence with a small draft model.
+
+    The draft model proposes ``num_draft_tokens`` tokens one at a time; the target
+    model then scores all of them in a single forward pass and keeps the longest
+    run it agrees with, plus one token of its own, so every target pass yields at
+    least one token and up to ``num_draft_tokens + 1``. Greedy output is exactly
+    the target model's; sampled drafts are accepted by rejection sampling, so the
+    output follows the target's distribution. Rejected positions are cropped from
+    both key/value caches.
+
+    Both models must share a tokenizer; logits are compared over the vocabulary
+    they have in common.
+    """
+
+    def __init__(self, num_draft_tokens: int = 4):
+        self.num_draft_tokens = max(1, num_draft_tokens)
+        self._lock = threading.Lock()
+        self.sequences = 0
+        self.drafted = 0
+        self.accepted = 0
+        self.target_passes = 0
+        self.tokens_generated = 0
+        self.seconds = 0.0
+        self.verify_ms = Histogram()
+        self.accepted_per_pass = Histogram(range(self.num_draft_tokens + 1))
+
+    def generate(
+        self,
+        target,
+        draft,
+        input_ids: List[int],
+        max_new_tokens: int,
+        eos_token_id: Optional[int] = None,
+        temperature: float = 1.0,
+        top_p: float = 1.0,
+        do_sample: bool = False,
+        on_token: Optional[Callable[[int], None]] = None,
+        stop: Optional[Callable[[int], bool]] = None,
+        target_past=None,
+        draft_past=None,
+        past_length: int = 0
+    ) -> List[int]:
+        """
+        Generate up to ``max_new_tokens`` after ``input_ids`` and return them.
+
+        ``target_past`` and ``draft_past`` may hold cached state for the first
+        ``past_length`` input ids (e.g. a prompt prefix). ``on_token`` and ``stop``
+        behave as in GenerationScheduler.submit.
+        """
+        sample = do_sample and temperature > 0
+        start = time.perf_counter()
+        drafted = accepted_total = passes = 0
+        sequence = list(input_ids)
+        generated: List[int] = []
+
+        def commit(token: int) -> bool:
+            """Append a token; True once the sequence is finished"""
+            sequence.append(token)
+            generated.append(token)
+            if on_token is not None:
+                on_token(token)
+            stopped = stop is not None and stop(token)
+            return stopped or token == eos_token_id or len(generated) >= max_new_tokens
+
+        def pick(logits: torch.Tensor) -> int:
+            if not sample:
+                return int(logits.argmax())
+            return int(torch.multinomial(_warp(logits, temperature, top_p), 1))
+
+        # Prefill both models; the target chooses the first token
+        target_logits, target_past = _forward(target, sequence[past_length:], target_past)
+        draft_logits, draft_past = _forward(draft, sequence[past_length:], draft_past)
+        passes += 1
+        vocab = min(target_logits.shape[-1], draft_logits.shape[-1])
+        target_len = draft_len = len(sequence)
+        done = commit(pick(target_logits[-1, :vocab]))
+
+        while not done:
+            k = min(self.num_draft_tokens, max_new_tokens - len(generated))
+            # Draft k tokens, first catching the draft cache up with the committed sequence
+            drafts: List[int] = []
+            draft_probs: List[torch.Tensor] = []
+            pending = sequence[draft_len:]
+            for _ in range(k):
+                logits, draft_past = _forward(draft, pending, draft_past)
+                draft_len += len(pending)
+                logits = logits[-1, :vocab]
+                if sample:
+                    probs = _warp(logits, temperature, top_p)
+                    token = int(torch.multinomial(probs, 1))
+                    draft_probs.append(probs)
+                else:
+                    token = int(logits.argmax())
+                drafts.append(token)
+                pending = [token]
+
+            # Verify all drafts in one target pass: row i scores drafts[i], the last row is a bonus token
+            verify = sequence[target_len:] + drafts
+            verify_start = time.perf_counter()
+            logits, target_past = _forward(target, verify, target_past)
+            logits = logits[-(k + 1):, :vocab]
+            passes += 1
+            self.verify_ms.observe((time.perf_counter() - verify_start) * 1000)
+
+            accepted, correction = 0, None
+            for i, token in enumerate(drafts):
+                if sample:
+                    p = _warp(logits[i], temperature, top_p)
+                    q = draft_probs[i]
+                    if torch.rand(()) * q[token] < p[token]:
+                        accepted += 1
+                        continue
+                    residual = (p - q).clamp(min=0)
+                    dist = residual / residual.sum() if residual.sum() > 0 else p
+                    correction = int(torch.multinomial(dist, 1))
+                else:
+                    best = int(logits[i].argmax())
+                    if best == token:
+                        accepted += 1
+                        continue
+                    correction = best
+                break
+            if correction is None:
+                correction = pick(logits[k])
+            drafted += k
+            accepted_total += accepted
+            self.accepted_per_pass.observe(accepted)
+
+            # Keep the cached positions of the sequence plus the accepted drafts
+            target_len = len(sequence) + accepted
+            target_past = _crop(target_past, target_len)
+            if draft_len > target_len:
+                draft_len = target_len
+                draft_past = _crop(draft_past, draft_len)
+
+            for token in drafts[:accepted] + [correction]:
+                done = commit(token)
+                if done:
+                    break
+
+        with self._lock:
+            self.sequences += 1
+            self.drafted += drafted
+            self.accepted += accepted_total
+            self.target_passes += passes
+            self.tokens_generated += len(generated)
+            self.seconds += time.perf_counter() - start
+        return generated
+
+    def get_metrics(self) -> Dict[str, Any]:
+        verify_ms = self.verify_ms.snapshot()
+        with self._lock:
+            tokens_per_second = self.tokens_generated / self.seconds if self.seconds else 0.0
+            return {
+                'num_draft_tokens': self.num_draft_tokens,
+                'sequences': self.sequences,
+                'drafted': self.drafted,
+                'accepted': self.accepted,
+                'acceptance_rate': self.accepted / self.drafted if self.drafted else 0.0,
+                # Upper bound on the speedup over one target pass per token
+                'tokens_per_target_pass': self.tokens_generated / self.target_passes if self.target_passes else 0.0,
+                'accepted_per_pass': self.accepted_per_pass.snapshot(),
+                'tokens_generated': self.tokens_generated,
+                'tokens_per_second': tokens_per_second,
+                'verify_ms': verify_ms,
+                # A verification pass costs at least one plain decode step, so this
+                # understates plain decoding's time per token and the speedup is conservative
+                'estimated_speedup': tokens_per_second * verify_ms['mean'] / 1000 if verify_ms['count'] else None
+            }
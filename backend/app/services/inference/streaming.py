@@ -0,0 +1,98 @@
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+_END = object()
+
+
+class TokenStream:
+    """
+    Carries tokens generated on a worker thread to an async iterator of text deltas.
+
+    Works both as a ``transformers`` streamer (``generate(streamer=...)`` calls
+    ``put``/``end``) and as a per-token callback (``push_token``) for the generation
+    scheduler. Tokens are decoded incrementally; partial multi-byte characters are
+    held back until complete. Backends that receive text rather than token ids
+    (an HTTP server) feed it through ``push_text``.
+    """
+
+    def __init__(self, tokenizer: Callable[[], Any], loop: asyncio.AbstractEventLoop, skip_prompt: bool = True):
+        self.tokenizer = tokenizer
+        self._loop = loop
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._skip_prompt = skip_prompt
+        self._tokens: List[int] = []
+        self._emitted = 0
+        self._parts: List[str] = []
+        self.started_at = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+
+    @property
+    def text(self) -> str:
+        """Everything emitted so far"""
+        return ''.join(self._parts)
+
+    @property
+    def ttft_ms(self) -> Optional[float]:
+        if self.first_token_at is None:
+            return None
+        return (self.first_token_at - self.started_at) * 1000
+
+    def put(self, value):
+        """transformers streamer hook; the first call carries the prompt"""
+        if self._skip_prompt:
+            self._skip_prompt = False
+            return
+        self._push(value.reshape(-1).tolist())
+
+    def push_token(self, token_id: int):
+        self._push([token_id])
+
+    def push_text(self, delta: str):
+        self._emit(delta)
+
+    def _push(self, token_ids: List[int]):
+        self._tokens.extend(token_ids)
+        text = self.tokenizer().decode(self._tokens, skip_special_tokens=True)
+        if text.endswith('�'):
+            return
+        delta = text[self._emitted:]
+        if text.endswith('\n'):
+            # Start a fresh decode window so decoding stays cheap for long outputs
+            self._tokens = []
+            self._emitted = 0
+        else:
+            self._emitted = len(text)
+        self._emit(delta)
+
+    def _emit(self, delta: str):
+        if not delta:
+            return
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self._parts.append(delta)
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, delta)
+
+    def end(self):
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, _END)
+
+    def fail(self, error: BaseException):
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, error)
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        while True:
+            item = await self._queue.get()
+            if item is _END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+
+def sse_frame(event: Dict[str, Any]) -> str:
+    """
+    One server-sent event for an {'event', 'data'} dict. ``data`` is sent as JSON,
+    which escapes newlines, so a token delta can never end the frame early.
+    """
+    return f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
@@ -0,0 +1,264 @@
+import itertools
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+
+logger = logging.getLogger(__name__)
+
+# Weights-only copy of a training checkpoint (no optimizer state), written next to it
+SLIM_SUFFIX = '.weights.pt'
+
+
+def slim_checkpoint_path(checkpoint_path: str, architecture: str) -> str:
+    # The architecture is part of the name, so a fresh copy never stands in for another one
+    return f"{os.path.splitext(checkpoint_path)[0]}.{architecture}{SLIM_SUFFIX}"
+
+
+def write_slim_checkpoint(checkpoint_path: str, architecture: str) -> str:
+    """
+    Write (or refresh) the weights-only checkpoint that workers mmap.
+
+    Training checkpoints carry optimizer state and are pickled with storages that
+    cannot be mapped lazily; the slim copy holds contiguous tensors only, so every
+    worker maps the same file pages instead of holding its own copy.
+    """
+    if not os.path.exists(checkpoint_path):
+        raise FileNotFoundError(f"Model not found at {checkpoint_path}")
+    slim_path = slim_checkpoint_path(checkpoint_path, architecture)
+    if os.path.exists(slim_path) and os.path.getmtime(slim_path) >= os.path.getmtime(checkpoint_path):
+        return slim_path
+
+    checkpoint = torch.load(checkpoint_path, map_location='cpu')
+    trained_as = checkpoint.get('model_type')
+    if trained_as is not None and trained_as != architecture:
+        raise ValueError(f"Checkpoint {checkpoint_path} holds a {trained_as} model, not {architecture}")
+    state = {name: tensor.contiguous() for name, tensor in checkpoint['model_state_dict'].items()}
+
+    tmp_path = f"{slim_path}.{os.getpid()}.tmp"
+    torch.save({'model_type': architecture, 'model_state_dict': state}, tmp_path)
+    os.replace(tmp_path, slim_path)
+    logger.info(f"Wrote slim checkpoint {slim_path}")
+    return slim_path
+
+
+def _load_mmap_model(architecture: str, slim_path: str) -> torch.nn.Module:
+    """Build the architecture without allocating weights and point it at the mapped file"""
+    from ml_models.disease_classifiers.pneumonia.training.pneumonia_classifier import get_model
+
+    # ImageNet weights would only be overwritten; skip the download and allocation
+    with torch.device('meta'):
+        model = get_model(architecture, num_classes=2, pretrained=False)
+    checkpoint = torch.load(slim_path, map_location='cpu', mmap=True, weights_only=True)
+    model.load_state_dict(checkpoint['model_state_dict'], assign=True)
+    return model.eval()
+
+
+def _worker_main(worker_id: int, num_threads: int, engine: str, precision: str, requests, results):
+    """Worker process loop: run batches for any model, loading each one on first use; replies go to ``results``"""
+    from app.services.inference.engines import build_engine
+    from ml_models.disease_classifiers.pneumonia.training.preprocessing import Preprocessor
+
+    # Size intra-op parallelism to this worker's share of the cores
+    torch.set_num_threads(num_threads)
+    torch.set_num_interop_threads(1)
+    preprocessor = Preprocessor(pin_memory=False)
+    engines = {}
+
+    while True:
+        task = requests.get()
+        if task is None:
+            return
+        task_id, model_key, architecture, checkpoint_path, slim_path, images = task
+        try:
+            version = os.stat(slim_path).st_mtime_ns
+            cached = engines.get(model_key)
+            if cached is None or cached[0] != version:
+                model = build_engine(
+                    engine,
+                    checkpoint_path,
+                    lambda: _load_mmap_model(architecture, slim_path),
+                    torch.device('cpu'),
+                    intra_op_threads=num_threads,
+                    precision=precision
+                )
+                cached = engines[model_key] = (version, model)
+            with torch.no_grad():
+                probabilities = torch.softmax(cached[1](preprocessor.batch(images)), dim=1)
+            results.send((task_id, probabilities.numpy(), None))
+        except Exception as e:
+            # Only send exception types that are known to pickle cleanly
+            if not isinstance(e, (ValueError, FileNotFoundError, RuntimeError)):
+                e = RuntimeError(f"{type(e).__name__}: {e}")
+            results.send((task_id, None, e))
+
+
+class InferenceWorkerPool:
+    """
+    Pool of inference processes, each fed from its own queue and replying on its own pipe.
+
+    Each worker maps the slim checkpoint written by ``write_slim_checkpoint`` with
+    ``torch.load(mmap=True)``, so weights live once in the page cache however many
+    workers run, and sizes torch's intra-op pool to its share of the cores so the
+    processes do not oversubscribe them. A batch goes to the live worker with the
+    fewest batches in flight; if a worker dies, only its own batches fail and it is
+    replaced. Nothing is shared between workers that a killed one could leave locked. TorchScript, ONNX and INT8 artifacts are loaded per worker.
+    """
+
+    def __init__(
+        self,
+        num_workers: int,
+        threads_per_worker: int = 0,
+        engine: str = 'eager',
+        precision: str = 'fp32'
+    ):
+        self.num_workers = max(1, num_workers)
+        cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+        self.threads_per_worker = threads_per_worker or max(1, cores // self.num_workers)
+        self.engine = engine
+        self.precision = precision
+        # spawn: forking a process that already runs torch and server threads is unsafe
+        self._context = multiprocessing.get_context('spawn')
+        self._requests: List = []
+        # Read end of each worker's result pipe
+        self._results: List = []
+        self._processes: List = []
+        # task id -> (worker id, future)
+        self._pending: Dict[int, Tuple[int, Future]] = {}
+        self._in_flight: List[int] = []
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._slim_lock = threading.Lock()
+        self._collector = None
+        self._stopped = False
+        self.completed = 0
+        self.failed = 0
+        self.restarts = 0
+
+    def _start(self):
+        with self._lock:
+            if self._collector is not None:
+                return
+            self._requests = [None] * self.num_workers
+            self._results = [None] * self.num_workers
+            self._processes = [self._spawn(i) for i in range(self.num_workers)]
+            self._in_flight = [0] * self.num_workers
+            self._collector = threading.Thread(target=self._collect, name="inference-workers", daemon=True)
+            self._collector.start()
+        logger.info(
+            f"Started {self.num_workers} inference workers with "
+            f"{self.threads_per_worker} threads each"
+        )
+
+    def _spawn(self, worker_id: int):
+        # A fresh queue and pipe: anything left in a dead worker's has already been failed
+        self._requests[worker_id] = self._context.Queue()
+        if self._results[worker_id] is not None:
+            self._results[worker_id].close()
+        reader, writer = self._context.Pipe(duplex=False)
+        self._results[worker_id] = reader
+        process = self._context.Process(
+            target=_worker_main,
+            args=(
+                worker_id, self.threads_per_worker, self.engine, self.precision,
+                self._requests[worker_id], writer
+            ),
+            name=f"inference-worker-{worker_id}",
+            daemon=True
+        )
+        process.start()
+        # Only the worker holds the write end, so its exit shows up as end of file
+        writer.close()
+        return process
+
+    def submit(self, model_key: str, architecture: str, checkpoint_path: str, images: List[np.ndarray]) -> Future:
+        """Queue a batch of uint8 [224,224,3] images; resolves to an [N, num_classes] probability array"""
+        self._start()
+        with self._slim_lock:
+            slim_path = write_slim_checkpoint(checkpoint_path, architecture)
+        future = Future()
+        task_id = next(self._ids)
+        with self._lock:
+            worker_id = min(range(self.num_workers), key=self._in_flight.__getitem__)
+            self._pending[task_id] = (worker_id, future)
+            self._in_flight[worker_id] += 1
+            requests = self._requests[worker_id]
+        requests.put((task_id, model_key, architecture, checkpoint_path, slim_path, list(images)))
+        return future
+
+    def _collect(self):
+        while not self._stopped:
+            # Checked on every pass so a dead worker's batches fail promptly, even under load
+            self._check_workers()
+            for reader in multiprocessing.connection.wait(list(self._results), timeout=0.1):
+                try:
+                    self._resolve(*reader.recv())
+                except (EOFError, OSError):
+                    # The worker exited (perhaps mid-reply); wait for it so the next check replaces it
+                    worker_id = self._results.index(reader)
+                    self._processes[worker_id].join(1.0)
+
+    def _resolve(self, task_id: int, probabilities: Optional[np.ndarray], error: Optional[Exception]):
+        with self._lock:
+            entry = self._pending.pop(task_id, None)
+            if entry is not None:
+                self._in_flight[entry[0]] -= 1
+            if error is None:
+                self.completed += 1
+            else:
+                self.failed += 1
+        if entry is None:
+            return
+        if error is None:
+            entry[1].set_result(probabilities)
+        else:
+            entry[1].set_exception(error)
+
+    def _check_workers(self):
+        """Replace dead workers, failing only the batches that were sent to them"""
+        for worker_id, process in enumerate(self._processes):
+            if process.is_alive() or self._stopped:
+                continue
+            logger.error(f"Inference worker {worker_id} exited with code {process.exitcode}, restarting")
+            with self._lock:
+                lost = [task_id for task_id, (owner, _) in self._pending.items() if owner == worker_id]
+                futures = [self._pending.pop(task_id)[1] for task_id in lost]
+                self._in_flight[worker_id] = 0
+                self.failed += len(futures)
+                self.restarts += 1
+                self._processes[worker_id] = self._spawn(worker_id)
+            for future in futures:
+                future.set_exception(RuntimeError(f"Inference worker {worker_id} exited"))
+
+    def get_metrics(self) -> Dict:
+        with self._lock:
+            return {
+                'workers': self.num_workers,
+                'threads_per_worker': self.threads_per_worker,
+                'alive': sum(1 for p in self._processes if p.is_alive()),
+                'in_flight': len(self._pending),
+                'in_flight_by_worker': list(self._in_flight),
+                'completed': self.completed,
+                'failed': self.failed,
+                'restarts': self.restarts
+            }
+
+    def shutdown(self, timeout: Optional[float] = 5.0):
+        if self._collector is None:
+            return
+        self._stopped = True
+        for requests in self._requests:
+            requests.put(None)
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._collector.join(timeout)
+        for reader in self._results:
+            reader.close()
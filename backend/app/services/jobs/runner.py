@@ -0,0 +1,286 @@
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.services.inference.metrics import Histogram
+from app.services.inference.priority import PRIORITY_LEVELS, ROUTINE_PRIORITY, clamp_priority
+from app.services.jobs.store import QUEUED, TERMINAL_STATES, JobStore
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+# Backoff after a queue error (e.g. "database is locked"), doubled per consecutive error
+STORE_RETRY_SECONDS = 1.0
+STORE_RETRY_MAX_SECONDS = 30.0
+# How often finished jobs past their retention are deleted
+PRUNE_INTERVAL_SECONDS = 3600.0
+
+
+class JobRunner:
+    """
+    Drains the durable job queue with a pool of asyncio worker tasks.
+
+    Handlers are registered per job kind and called with the job's payload; their
+    return value becomes the job result. A failed or timed-out run is retried with
+    exponential backoff until the job's attempts are used up. Clients poll ``get``
+    or ``await wait(job_id)`` for a job to finish. Jobs interrupted by a shutdown
+    are picked up again on the next ``start``. Jobs are claimed by priority, aged
+    by ``aging_s`` so routine work is not starved. SQLite calls block, so every
+    JobStore call runs on a dedicated thread rather than the event loop.
+
+    Several runners (e.g. uvicorn workers) may share one queue. A maintenance task
+    renews the leases of running jobs every ``lease_s / 3`` seconds, requeues jobs
+    whose lease expired because their runner died, and prunes finished jobs.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        workers: int = 1,
+        max_attempts: int = 1,
+        retry_backoff_s: float = 5.0,
+        timeout_s: Optional[float] = None,
+        retention_s: float = 0,
+        aging_s: float = 0.0,
+        lease_s: float = 60.0
+    ):
+        self.path = path
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_backoff_s = retry_backoff_s
+        self.timeout_s = timeout_s or None
+        self.retention_s = retention_s
+        self.aging_s = aging_s
+        self.lease_s = lease_s
+        self._handlers: Dict[str, JobHandler] = {}
+        self._store: Optional[JobStore] = None
+        self._store_thread: Optional[ThreadPoolExecutor] = None
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+        self._running: Set[str] = set()
+        self.queue_wait_ms = Histogram()
+        self.queue_wait_ms_by_priority = {priority: Histogram() for priority in PRIORITY_LEVELS}
+        self.run_ms = Histogram()
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self.recovered = 0
+        self.leases_lost = 0
+
+    def register(self, kind: str, handler: JobHandler):
+        """Register the coroutine that runs jobs of ``kind``"""
+        if kind in self._handlers:
+            logger.warning(f"Job handler for {kind} is already registered, replacing it")
+        self._handlers[kind] = handler
+
+    @property
+    def store(self) -> JobStore:
+        if self._store is None:
+            raise RuntimeError("Job runner is not started")
+        return self._store
+
+    async def _call(self, method: Callable, *args, **kwargs) -> Any:
+        """Run a blocking JobStore call on the store thread"""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._store_thread, functools.partial(method, *args, **kwargs)
+        )
+
+    async def start(self):
+        """Open the queue, requeue jobs with expired leases and start the workers"""
+        # One thread: SQLite serializes writers anyway, and calls stay in submission order
+        self._store_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-store")
+        self._store = await self._call(JobStore, self.path, aging_s=self.aging_s, lease_s=self.lease_s)
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._maintain()))
+
+    async def stop(self):
+        """Cancel the workers; jobs they were running stay queued for the next start"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._store is not None:
+            for job_id in self._running:
+                await self._call(self._store.release, job_id)
+            self._running.clear()
+            await self._call(self._store.close)
+            self._store = None
+            self._store_thread.shutdown(wait=False)
+            self._store_thread = None
+
+    async def submit(
+        self,
+        kind: str,
+        payload: Dict[str, Any],
+        priority: int = ROUTINE_PRIORITY,
+        owner: Optional[str] = None,
+        idempotency_key: Optional[str] = None
+    ) -> Tuple[Dict[str, Any], bool]:
+        """Queue a job; returns it and whether it is new (False: an idempotent resubmission)"""
+        if kind not in self._handlers:
+            raise KeyError(f"No handler registered for job kind: {kind}")
+        job, created = await self._call(
+            self.store.enqueue,
+            kind,
+            payload,
+            priority=clamp_priority(priority),
+            max_attempts=self.max_attempts,
+            owner=owner,
+            idempotency_key=idempotency_key
+        )
+        if created:
+            self._wakeup.set()
+        return job, created
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self._call(self.store.get, job_id)
+
+    async def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Return the job once it has finished, or as it stands after ``timeout`` seconds"""
+        job = await self.get(job_id)
+        if job is None or job['status'] in TERMINAL_STATES:
+            return job
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(job_id, []).append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            waiters = self._waiters.get(job_id, [])
+            if waiter in waiters:
+                waiters.remove(waiter)
+            if not waiters:
+                self._waiters.pop(job_id, None)
+        return await self.get(job_id)
+
+    async def _worker(self):
+        errors = 0
+        while True:
+            self._wakeup.clear()
+            try:
+                job = await self._call(self.store.claim, list(self._handlers))
+            except Exception as e:
+                # Keep the worker alive: a locked or briefly unavailable database must not shrink the pool
+                delay = min(STORE_RETRY_SECONDS * 2 ** errors, STORE_RETRY_MAX_SECONDS)
+                errors += 1
+                logger.error(f"Claiming a job failed, retrying in {delay:.0f}s: {e}")
+                await asyncio.sleep(delay)
+                continue
+            errors = 0
+            if job is None:
+                # Also wakes periodically for retries whose backoff has elapsed
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Recording the outcome failed; stop renewing the lease so the job is requeued once it expires
+                self._running.discard(job['id'])
+                logger.error(f"Recording the outcome of job {job['id']} failed: {e}")
+
+    async def _maintain(self):
+        """Renew held leases, requeue expired ones and prune old jobs until cancelled"""
+        last_prune = None
+        while True:
+            try:
+                if self._running:
+                    running = list(self._running)
+                    held = await self._call(self.store.heartbeat, running)
+                    if held < len(running):
+                        logger.warning(f"Lost the lease on {len(running) - held} running jobs")
+                recovered = await self._call(self.store.requeue_expired)
+                if recovered:
+                    self.recovered += recovered
+                    logger.info(f"Requeued {recovered} jobs whose lease expired")
+                    self._wakeup.set()
+                if self.retention_s and (last_prune is None or time.monotonic() - last_prune >= PRUNE_INTERVAL_SECONDS):
+                    pruned = await self._call(self.store.prune, self.retention_s)
+                    last_prune = time.monotonic()
+                    if pruned:
+                        logger.info(f"Pruned {pruned} finished jobs")
+            except Exception as e:
+                logger.error(f"Job queue maintenance failed: {e}")
+            await asyncio.sleep(self.lease_s / 3)
+
+    async def _run(self, job: Dict[str, Any]):
+        wait_ms = (job['started_at'] - job['available_at']) * 1000
+        self.queue_wait_ms.observe(wait_ms)
+        self.queue_wait_ms_by_priority[clamp_priority(job['priority'])].observe(wait_ms)
+        self._running.add(job['id'])
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(self._handlers[job['kind']](job['payload']), self.timeout_s)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            delay = self.retry_backoff_s * 2 ** (job['attempts'] - 1)
+            status = await self._call(self.store.fail, job['id'], error, retry_delay=delay)
+            if status is None:
+                self._lease_lost(job['id'])
+            elif status == QUEUED:
+                self.retried += 1
+                logger.warning(f"Job {job['id']} attempt {job['attempts']} failed, retrying in {delay:.0f}s: {error}")
+            else:
+                self.failed += 1
+                logger.error(f"Job {job['id']} failed after {job['attempts']} attempts: {error}")
+                self._notify(job['id'])
+        else:
+            if await self._call(self.store.complete, job['id'], result):
+                self.completed += 1
+                self._notify(job['id'])
+            else:
+                self._lease_lost(job['id'])
+        self._running.discard(job['id'])
+        self.run_ms.observe((time.perf_counter() - start) * 1000)
+
+    def _lease_lost(self, job_id: str):
+        # The lease expired mid-run and the job was requeued; its next run records the outcome
+        self.leases_lost += 1
+        logger.warning(f"Job {job_id} outlived its lease, discarding this run's outcome")
+
+    def _notify(self, job_id: str):
+        for waiter in self._waiters.pop(job_id, []):
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def get_metrics(self) -> Dict[str, Any]:
+        return {
+            'workers': self.workers,
+            'queue': await self._call(self._store.depth) if self._store is not None else {},
+            'completed': self.completed,
+            'failed': self.failed,
+            'retried': self.retried,
+            'recovered': self.recovered,
+            'leases_lost': self.leases_lost,
+            'queue_wait_ms': self.queue_wait_ms.snapshot(),
+            'queue_wait_ms_by_priority': {
+                str(priority): histogram.snapshot() for priority, histogram in self.queue_wait_ms_by_priority.items()
+            },
+            'run_ms': self.run_ms.snapshot()
+        }
+
+
+job_runner = JobRunner(
+    settings.JOB_QUEUE_PATH,
+    workers=settings.JOB_WORKERS,
+    max_attempts=settings.JOB_MAX_ATTEMPTS,
+    retry_backoff_s=settings.JOB_RETRY_BACKOFF_SECONDS,
+    timeout_s=settings.JOB_TIMEOUT_SECONDS,
+    retention_s=settings.JOB_RETENTION_SECONDS,
+    aging_s=settings.SCHEDULER_PRIORITY_AGING_SECONDS,
+    lease_s=settings.JOB_LEASE_SECONDS
+)
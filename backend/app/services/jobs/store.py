@@ -0,0 +1,250 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from app.services.inference.priority import EMERGENCY_PRIORITY, ROUTINE_PRIORITY
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+TERMINAL_STATES = (SUCCEEDED, FAILED)
+
+_COLUMNS = (
+    'id', 'kind', 'owner', 'payload', 'status', 'priority', 'attempts', 'max_attempts',
+    'idempotency_key', 'result', 'error', 'created_at', 'available_at', 'started_at', 'finished_at',
+    'lease_owner', 'lease_expires_at'
+)
+
+
+class JobStore:
+    """
+    Durable job queue in a single SQLite file.
+
+    Jobs are claimed highest priority first, then in order of availability, with a
+    conditional status update so each run belongs to exactly one worker. Waiting
+    jobs age one tier per ``aging_s`` seconds, up to one below emergency (see
+    inference.priority). Several processes may share the file: a claim takes a
+    lease for ``worker_id`` that lasts ``lease_s`` seconds and is extended with
+    ``heartbeat`` while the job runs. ``requeue_expired`` puts back only jobs whose
+    lease ran out, i.e. whose worker crashed or stalled, and outcomes are recorded
+    only while the lease is still held. An idempotency key (scoped to kind and
+    owner) maps repeated submissions of the same work onto the job created first.
+    """
+
+    def __init__(self, path: str, aging_s: float = 0.0, lease_s: float = 60.0, worker_id: Optional[str] = None):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.aging_s = aging_s
+        self.lease_s = lease_s
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, owner TEXT, payload TEXT NOT NULL, "
+            "status TEXT NOT NULL, priority INTEGER NOT NULL DEFAULT 0, "
+            "attempts INTEGER NOT NULL DEFAULT 0, max_attempts INTEGER NOT NULL DEFAULT 1, "
+            "idempotency_key TEXT, result TEXT, error TEXT, "
+            "created_at REAL NOT NULL, available_at REAL NOT NULL, started_at REAL, finished_at REAL, "
+            "lease_owner TEXT, lease_expires_at REAL)"
+        )
+        # Queues created before leases existed
+        existing = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (('lease_owner', 'TEXT'), ('lease_expires_at', 'REAL')):
+            if column not in existing:
+                self._db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        self._db.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS jobs_idempotency ON jobs (kind, owner, idempotency_key)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority, available_at)")
+        self._db.commit()
+        logger.info(f"Job queue at {path}")
+
+    def enqueue(
+        self,
+        kind: str,
+        payload: Dict[str, Any],
+        priority: int = ROUTINE_PRIORITY,
+        max_attempts: int = 1,
+        owner: Optional[str] = None,
+        idempotency_key: Optional[str] = None
+    ) -> Tuple[Dict[str, Any], bool]:
+        """Add a job; returns it and whether it was created (False: idempotency key already used)"""
+        with self._lock:
+            if idempotency_key is not None:
+                existing = self._fetch(
+                    "kind = ? AND owner IS ? AND idempotency_key = ?", (kind, owner, idempotency_key)
+                )
+                if existing is not None:
+                    return existing, False
+            job_id = uuid.uuid4().hex
+            now = time.time()
+            self._db.execute(
+                "INSERT INTO jobs (id, kind, owner, payload, status, priority, max_attempts, "
+                "idempotency_key, created_at, available_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, owner, json.dumps(payload), QUEUED, priority, max_attempts,
+                 idempotency_key, now, now)
+            )
+            self._db.commit()
+            return self._fetch("id = ?", (job_id,)), True
+
+    def claim(self, kinds: Iterable[str]) -> Optional[Dict[str, Any]]:
+        """Mark the next runnable job of one of ``kinds`` running under this worker's lease and return it"""
+        kinds = list(kinds)
+        if not kinds:
+            return None
+        placeholders = ', '.join('?' * len(kinds))
+        order, aging = "priority", ()
+        if self.aging_s:
+            order = (
+                f"CASE WHEN priority >= {EMERGENCY_PRIORITY} THEN priority "
+                f"ELSE MIN(priority + (? - available_at) / ?, {EMERGENCY_PRIORITY - 1}) END"
+            )
+        with self._lock:
+            now = time.time()
+            if self.aging_s:
+                aging = (now, self.aging_s)
+            while True:
+                row = self._db.execute(
+                    f"SELECT id FROM jobs WHERE status = ? AND available_at <= ? AND kind IN ({placeholders}) "
+                    f"ORDER BY {order} DESC, available_at LIMIT 1",
+                    (QUEUED, now, *kinds, *aging)
+                ).fetchone()
+                if row is None:
+                    return None
+                claimed = self._db.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, started_at = ?, "
+                    "lease_owner = ?, lease_expires_at = ? WHERE id = ? AND status = ?",
+                    (RUNNING, now, self.worker_id, now + self.lease_s, row[0], QUEUED)
+                ).rowcount
+                self._db.commit()
+                if claimed:
+                    return self._fetch("id = ?", (row[0],))
+                # Another process claimed it first; try the next one
+
+    def complete(self, job_id: str, result: Any) -> bool:
+        """Record a successful run; False if this worker no longer holds the job's lease"""
+        with self._lock:
+            recorded = self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = NULL, finished_at = ?, lease_owner = NULL "
+                "WHERE id = ? AND status = ? AND lease_owner = ?",
+                (SUCCEEDED, json.dumps(result, default=str), time.time(), job_id, RUNNING, self.worker_id)
+            ).rowcount
+            self._db.commit()
+            return bool(recorded)
+
+    def fail(self, job_id: str, error: str, retry_delay: Optional[float] = None) -> Optional[str]:
+        """
+        Record a failed run; the job is requeued after ``retry_delay`` if attempts
+        remain. Returns the new status, or None if this worker no longer holds the lease.
+        """
+        with self._lock:
+            now = time.time()
+            row = self._db.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE id = ? AND status = ? AND lease_owner = ?",
+                (job_id, RUNNING, self.worker_id)
+            ).fetchone()
+            if row is None:
+                return None
+            if retry_delay is not None and row[0] < row[1]:
+                status = QUEUED
+                self._db.execute(
+                    "UPDATE jobs SET status = ?, error = ?, available_at = ?, lease_owner = NULL WHERE id = ?",
+                    (QUEUED, error, now + retry_delay, job_id)
+                )
+            else:
+                status = FAILED
+                self._db.execute(
+                    "UPDATE jobs SET status = ?, error = ?, finished_at = ?, lease_owner = NULL WHERE id = ?",
+                    (FAILED, error, now, job_id)
+                )
+            self._db.commit()
+            return status
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._fetch("id = ?", (job_id,))
+
+    def release(self, job_id: str):
+        """Return a job whose run was interrupted (not failed) to the queue without using up an attempt"""
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts - 1, lease_owner = NULL "
+                "WHERE id = ? AND status = ? AND lease_owner = ?",
+                (QUEUED, job_id, RUNNING, self.worker_id)
+            )
+            self._db.commit()
+
+    def heartbeat(self, job_ids: Iterable[str]) -> int:
+        """Extend this worker's leases on ``job_ids``; returns how many it still holds"""
+        job_ids = list(job_ids)
+        if not job_ids:
+            return 0
+        placeholders = ', '.join('?' * len(job_ids))
+        with self._lock:
+            count = self._db.execute(
+                f"UPDATE jobs SET lease_expires_at = ? WHERE status = ? AND lease_owner = ? AND id IN ({placeholders})",
+                (time.time() + self.lease_s, RUNNING, self.worker_id, *job_ids)
+            ).rowcount
+            self._db.commit()
+            return count
+
+    def requeue_expired(self) -> int:
+        """Return running jobs whose lease ran out (their worker crashed or stalled) to the queue"""
+        with self._lock:
+            now = time.time()
+            count = self._db.execute(
+                "UPDATE jobs SET status = ?, available_at = ?, lease_owner = NULL "
+                "WHERE status = ? AND (lease_expires_at IS NULL OR lease_expires_at < ?)",
+                (QUEUED, now, RUNNING, now)
+            ).rowcount
+            self._db.commit()
+            return count
+
+    def prune(self, older_than_s: float) -> int:
+        """Delete finished jobs older than ``older_than_s``"""
+        with self._lock:
+            count = self._db.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                (*TERMINAL_STATES, time.time() - older_than_s)
+            ).rowcount
+            self._db.commit()
+            return count
+
+    def depth(self) -> Dict[str, Any]:
+        """Job counts by status, and queued jobs by priority"""
+        with self._lock:
+            by_status = dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            by_priority = dict(self._db.execute(
+                "SELECT priority, COUNT(*) FROM jobs WHERE status = ? GROUP BY priority", (QUEUED,)
+            ).fetchall())
+        return {
+            'by_status': {status: by_status.get(status, 0) for status in (QUEUED, RUNNING, SUCCEEDED, FAILED)},
+            'queued_by_priority': {str(priority): count for priority, count in sorted(by_priority.items())}
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _fetch(self, where: str, params: Tuple) -> Optional[Dict[str, Any]]:
+        row = self._db.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE {where}", params).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(_COLUMNS, row))
+        job['payload'] = json.loads(job['payload'])
+        if job['result'] is not None:
+            job['result'] = json.loads(job['result'])
+        return job
@@ -0,0 +1,89 @@
+from abc import ABC, abstractmethod
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.services.inference.json_stream import JsonSchema
+from app.services.inference.priority import ROUTINE_PRIORITY
+from app.services.inference.streaming import TokenStream
+
+# Model roles: the 4B multimodal model analyses images, the 27B text model reasons clinically
+MULTIMODAL = 'multimodal'
+TEXT = 'text'
+
+
+class LLMBackend(ABC):
+    """
+    Generates MedGemmaService's prompts on whatever serves the MedGemma models.
+
+    ``submit`` starts one generation on the model behind ``role`` with the shared
+    ``generation_params`` and returns a Future of the completion (prompt excluded).
+    Their ``max_length`` maps each role to its limit on prompt plus completion tokens.
+    With a ``schema`` the response is expected to be JSON and generation stops as
+    soon as the object closes; a ``stream`` receives the output as it is generated;
+    queued work is served most urgent ``priority`` first. ``prefix`` is the static
+    start of ``prompt``, which a backend may serve from cache.
+    """
+
+    name = 'base'
+
+    def __init__(self, generation_params: Dict[str, Any], models: Dict[str, str]):
+        self.generation_params = generation_params
+        self.models = models
+
+    @abstractmethod
+    def submit(
+        self,
+        role: str,
+        prompt: str,
+        prefix: Optional[str] = None,
+        schema: Optional[JsonSchema] = None,
+        stream: Optional[TokenStream] = None,
+        priority: int = ROUTINE_PRIORITY
+    ) -> Future:
+        ...
+
+    def generation_kwargs(self, role: str) -> Dict[str, Any]:
+        """``generation_params`` for the model behind ``role``, with its own ``max_length``"""
+        return {**self.generation_params, 'max_length': self.generation_params['max_length'][role]}
+
+    def model_name(self, role: str) -> str:
+        """Model serving ``role``; part of response cache keys"""
+        return self.models[role]
+
+    def get_tokenizer(self):
+        """Tokenizer for streams fed token ids; backends that stream text return None"""
+        return None
+
+    def warmup(self, prefixes: Dict[str, List[str]]):
+        """Get each role's model ready to serve; ``prefixes`` are the static prompt starts it will see"""
+
+    def get_status(self) -> Dict[str, Any]:
+        return {}
+
+
+def build_llm_backend(backend: str, generation_params: Dict[str, Any]) -> LLMBackend:
+    """Create the backend named by LLM_BACKEND"""
+    models = {MULTIMODAL: settings.MEDGEMMA_MULTIMODAL_MODEL, TEXT: settings.MEDGEMMA_TEXT_MODEL}
+    if backend == 'transformers':
+        from .local import TransformersBackend
+        return TransformersBackend(generation_params, models)
+    if backend == 'openai':
+        from .openai_compat import OpenAICompatibleBackend
+        return OpenAICompatibleBackend(
+            generation_params,
+            {role: settings.LLM_API_MODELS.get(role, name) for role, name in models.items()},
+            base_url=settings.LLM_API_BASE_URL,
+            api_key=settings.LLM_API_KEY,
+            timeout_s=settings.LLM_API_TIMEOUT_SECONDS
+        )
+    if backend == 'fake':
+        from .fake import FakeBackend
+        return FakeBackend(
+            generation_params,
+            {role: f"fake/{name}" for role, name in models.items()},
+            latency_ms=settings.FAKE_LLM_LATENCY_MS,
+            tokens_per_second=settings.FAKE_LLM_TOKENS_PER_SECOND,
+            response_tokens=settings.FAKE_LLM_RESPONSE_TOKENS
+        )
+    raise ValueError(f"Unsupported LLM backend: {backend}")
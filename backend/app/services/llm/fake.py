@@ -0,0 +1,131 @@
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional
+
+from app.services.inference.executor import inference_executor
+from app.services.inference.json_stream import JsonSchema
+from app.services.inference.priority import ROUTINE_PRIORITY
+from app.services.inference.streaming import TokenStream
+
+from .base import LLMBackend
+
+_WORDS = (
+    "patient presents with mild moderate severe acute chronic bilateral focal diffuse "
+    "opacity consolidation effusion infiltrate fever cough dyspnea tachycardia hypoxia "
+    "pneumonia bronchitis infection inflammation findings consistent suggest recommend "
+    "follow up imaging laboratory culture monitoring oxygen saturation antibiotic therapy"
+).split()
+
+_DISEASES = ('Pneumonia', 'Normal', 'Bronchitis', 'Tuberculosis')
+
+# Whitespace-delimited pieces stand in for tokens when pacing and streaming
+_TOKEN = re.compile(r'\S+\s*')
+
+
+class FakeBackend(LLMBackend):
+    """
+    Deterministic stand-in for the MedGemma models, for benchmarks and load tests.
+
+    Every prompt gets a JSON response that satisfies the requested schema, built
+    from a hash of the role and prompt, so the same prompt always yields the same
+    text whatever the sampling settings. Generation waits ``latency_ms`` before the
+    first token and then produces ``tokens_per_second`` (0 = all at once), and runs on
+    the llm pool like local generation, so queueing, priority, streaming, caching and
+    consensus behave as in production without any model weights.
+    """
+
+    name = 'fake'
+
+    def __init__(
+        self,
+        generation_params: Dict[str, Any],
+        models: Dict[str, str],
+        latency_ms: float = 0.0,
+        tokens_per_second: float = 0.0,
+        response_tokens: int = 256
+    ):
+        super().__init__(generation_params, models)
+        self.latency_ms = latency_ms
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.tokens_generated = 0
+
+    def submit(
+        self,
+        role: str,
+        prompt: str,
+        prefix: Optional[str] = None,
+        schema: Optional[JsonSchema] = None,
+        stream: Optional[TokenStream] = None,
+        priority: int = ROUTINE_PRIORITY
+    ) -> Future:
+        return inference_executor.submit('llm', self._generate, role, prompt, schema, stream, priority=priority)
+
+    def response(self, role: str, prompt: str, schema: Optional[JsonSchema] = None) -> str:
+        """The completion for a prompt, without the simulated latency"""
+        seed = hashlib.sha256(f"{self.models[role]}\n{prompt}".encode()).digest()
+        rng = random.Random(seed)
+        fields = list(schema) if schema else ['analysis']
+        words_per_field = max(1, self.response_tokens // len(fields))
+
+        def sentence() -> str:
+            return ' '.join(rng.choice(_WORDS) for _ in range(words_per_field))
+
+        obj = {}
+        for field in fields:
+            types = schema[field] if schema else str
+            types = types if isinstance(types, tuple) else (types,)
+            # Structured values where allowed, so consensus sees a disease and confidence
+            if dict in types:
+                obj[field] = {
+                    'disease': rng.choice(_DISEASES),
+                    'confidence': round(rng.uniform(0.5, 0.99), 2),
+                    'summary': sentence()
+                }
+            elif list in types:
+                obj[field] = sentence().split(' ', 1)
+            elif str in types:
+                obj[field] = sentence()
+            else:
+                obj[field] = rng.randint(1, 5)
+        return json.dumps(obj, indent=2)
+
+    def _generate(self, role: str, prompt: str, schema: Optional[JsonSchema] = None,
+                  stream: Optional[TokenStream] = None) -> str:
+        """Blocking generation on the llm pool, paced as a real model would be"""
+        tokens: List[str] = _TOKEN.findall(self.response(role, prompt, schema))
+        # max_length counts the prompt, as in generate()
+        max_length = self.generation_params['max_length'][role]
+        tokens = tokens[:max(1, max_length - len(_TOKEN.findall(prompt)))]
+        start = time.perf_counter() + self.latency_ms / 1000
+        interval = 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+        if stream is None:
+            time.sleep(max(0.0, start + interval * len(tokens) - time.perf_counter()))
+        else:
+            for i, token in enumerate(tokens):
+                time.sleep(max(0.0, start + interval * i - time.perf_counter()))
+                stream.push_text(token)
+
+        with self._lock:
+            self.requests += 1
+            self.tokens_generated += len(tokens)
+        return ''.join(tokens)
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'models': dict(self.models),
+                'latency_ms': self.latency_ms,
+                'tokens_per_second': self.tokens_per_second,
+                'requests': self.requests,
+                'tokens_generated': self.tokens_generated,
+                'llm_pool': inference_executor.get_metrics('llm')
+            }
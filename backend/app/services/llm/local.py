@@ -0,0 +1,247 @@
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional
+
+import torch
+from transformers import AutoTokenizer, AutoModelForCausalLM, StoppingCriteria, StoppingCriteriaList
+
+from app.core.config import settings
+from app.services.inference.executor import inference_executor
+from app.services.inference.generation import GenerationScheduler
+from app.services.inference.json_stream import JsonObjectTracker, JsonSchema
+from app.services.inference.lazy import LazyModel
+from app.services.inference.prefix_cache import PrefixCache
+from app.services.inference.priority import ROUTINE_PRIORITY
+from app.services.inference.speculative import SpeculativeDecoder
+from app.services.inference.streaming import TokenStream
+
+from .base import LLMBackend, MULTIMODAL, TEXT
+
+
+class JsonObjectStoppingCriteria(StoppingCriteria):
+    """
+    Ends generation as soon as the first top-level JSON object in the output closes.
+
+    Use it as a ``generate(stopping_criteria=...)`` entry for a single sequence
+    (``prompt_length`` tokens are skipped), or pass ``push`` as the per-token stop
+    hook of the generation scheduler.
+    """
+
+    def __init__(self, tokenizer, prompt_length: int = 0, schema: Optional[JsonSchema] = None):
+        self.tokenizer = tokenizer
+        self.tracker = JsonObjectTracker(schema)
+        self._seen = prompt_length
+
+    def push(self, token_id: int) -> bool:
+        return self.tracker.feed(self.tokenizer.decode([token_id], skip_special_tokens=True))
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        for token_id in input_ids[0, self._seen:].tolist():
+            self.push(token_id)
+        self._seen = input_ids.shape[1]
+        return torch.full((input_ids.shape[0],), self.tracker.complete, dtype=torch.bool, device=input_ids.device)
+
+
+class TransformersBackend(LLMBackend):
+    """
+    Serves the MedGemma checkpoints in-process with ``transformers``.
+
+    Models load on first use and are released again after MEDGEMMA_IDLE_UNLOAD_SECONDS.
+    Text model prompts decode speculatively or join the continuous batch when either
+    is enabled; everything else runs on the inference executor's llm pool. Static
+    prompt prefixes are served from the prefix cache.
+    """
+
+    name = 'transformers'
+
+    def __init__(self, generation_params: Dict[str, Any], models: Dict[str, str]):
+        super().__init__(generation_params, models)
+        # Key/value state of the static prompt prefixes, dropped when its model unloads
+        self.prefix_cache = None
+        if settings.PREFIX_CACHE_ENABLED:
+            self.prefix_cache = PrefixCache(settings.PREFIX_CACHE_MAX_MB * 1024 * 1024)
+
+        self.lazy_models = {role: self._lazy_model(name) for role, name in models.items()}
+        self._tokenizer = LazyModel(
+            f"{models[MULTIMODAL]} tokenizer",
+            lambda: AutoTokenizer.from_pretrained(models[MULTIMODAL], cache_dir=settings.MEDGEMMA_CACHE_DIR)
+        )
+        # Speculative decoding drafts with the 4B model (already resident for image analysis) by default
+        self.speculative = None
+        self.draft_model = None
+        if settings.SPECULATIVE_DECODING_ENABLED:
+            self.speculative = SpeculativeDecoder(settings.SPECULATIVE_NUM_DRAFT_TOKENS)
+            draft_name = settings.SPECULATIVE_DRAFT_MODEL or models[MULTIMODAL]
+            if draft_name == models[MULTIMODAL]:
+                self.draft_model = self.lazy_models[MULTIMODAL]
+            else:
+                self.draft_model = self._lazy_model(draft_name)
+        # Concurrent clinical reasoning prompts share decode steps on the text model
+        self.text_scheduler = None
+        if settings.TEXT_CONTINUOUS_BATCHING and self.speculative is None:
+            self.text_scheduler = GenerationScheduler(
+                self.lazy_models[TEXT],
+                self.get_tokenizer,
+                max_batch_size=settings.BATCH_SIZE_TEXT,
+                max_tokens_in_flight=settings.TEXT_MAX_TOKENS_IN_FLIGHT,
+                name="medgemma-text",
+                prefix_cache=self.prefix_cache,
+                aging_s=settings.SCHEDULER_PRIORITY_AGING_SECONDS
+            )
+
+    def _lazy_model(self, model_name: str) -> LazyModel:
+        return LazyModel(
+            model_name,
+            lambda: self._load_medgemma(model_name),
+            idle_unload_s=settings.MEDGEMMA_IDLE_UNLOAD_SECONDS,
+            on_unload=lambda: self._invalidate_prefixes(model_name)
+        )
+
+    def _load_medgemma(self, model_name: str):
+        """Load fp16 weights from MEDGEMMA_CACHE_DIR; safetensors shards are memory-mapped, not copied"""
+        return AutoModelForCausalLM.from_pretrained(
+            model_name,
+            torch_dtype=torch.float16,
+            device_map="auto",
+            cache_dir=settings.MEDGEMMA_CACHE_DIR,
+            use_safetensors=True,
+            low_cpu_mem_usage=True
+        )
+
+    def _invalidate_prefixes(self, model_name: str):
+        if self.prefix_cache is not None:
+            self.prefix_cache.invalidate(model_name)
+
+    def get_tokenizer(self):
+        return self._tokenizer.get()
+
+    def submit(
+        self,
+        role: str,
+        prompt: str,
+        prefix: Optional[str] = None,
+        schema: Optional[JsonSchema] = None,
+        stream: Optional[TokenStream] = None,
+        priority: int = ROUTINE_PRIORITY
+    ) -> Future:
+        if role == TEXT and self.speculative is not None:
+            return inference_executor.submit(
+                'llm', self._generate_speculative, prompt, prefix, schema, stream, priority=priority
+            )
+        if role == TEXT and self.text_scheduler is not None:
+            stop = None
+            if schema is not None:
+                stop = JsonObjectStoppingCriteria(self.get_tokenizer(), schema=schema).push
+            return self.text_scheduler.submit(
+                prompt,
+                **self.generation_kwargs(TEXT),
+                on_token=stream.push_token if stream is not None else None,
+                stop=stop,
+                prefix=prefix,
+                priority=priority
+            )
+        return inference_executor.submit(
+            'llm', self._generate, role, prompt, prefix, schema, stream, priority=priority
+        )
+
+    def warmup(self, prefixes: Dict[str, List[str]]):
+        """Run a one-token generation on each model to warm allocator and kernel paths, and cache the prompt prefixes"""
+        tokenizer = self.get_tokenizer()
+        inputs = tokenizer("Warmup", return_tensors="pt")
+        by_model = {self.lazy_models[role]: list(role_prefixes) for role, role_prefixes in prefixes.items()}
+        if self.draft_model is not None:
+            # The draft model starts speculative text generations from the same prefixes
+            by_model[self.draft_model] = by_model.get(self.draft_model, []) + list(prefixes.get(TEXT, []))
+        with torch.no_grad():
+            for lazy_model, model_prefixes in by_model.items():
+                with lazy_model.use() as model:
+                    model.generate(**inputs, max_new_tokens=1, pad_token_id=tokenizer.eos_token_id)
+                    if self.prefix_cache is not None:
+                        for prefix in model_prefixes:
+                            self.prefix_cache.get(lazy_model.name, model, tokenizer, prefix)
+
+    def _generate(self, role: str, prompt: str, prefix: Optional[str] = None,
+                  schema: Optional[JsonSchema] = None, streamer=None) -> str:
+        """
+        Blocking tokenize/generate/decode of the completion; run on the inference executor's llm pool.
+        When ``prompt`` starts with ``prefix``, generation resumes from the prefix's cached state.
+        """
+        lazy_model = self.lazy_models[role]
+        tokenizer = self.get_tokenizer()
+        split = self.prefix_cache.split(tokenizer, prompt, prefix) if self.prefix_cache is not None else None
+        with lazy_model.use() as model, torch.no_grad():
+            if split is not None:
+                entry = self.prefix_cache.get(lazy_model.name, model, tokenizer, prefix)
+                input_ids = torch.tensor([split[0] + split[1]], device=model.device)
+                inputs = {
+                    'input_ids': input_ids,
+                    'attention_mask': torch.ones_like(input_ids),
+                    'past_key_values': entry.past_key_values()
+                }
+            else:
+                inputs = tokenizer(prompt, return_tensors="pt")
+            prompt_length = inputs['input_ids'].shape[1]
+            stopping_criteria = None
+            if schema is not None:
+                stopping_criteria = StoppingCriteriaList([
+                    JsonObjectStoppingCriteria(tokenizer, prompt_length, schema)
+                ])
+            outputs = model.generate(
+                **inputs,
+                **self.generation_kwargs(role),
+                pad_token_id=tokenizer.eos_token_id,
+                streamer=streamer,
+                stopping_criteria=stopping_criteria
+            )
+
+        return tokenizer.decode(outputs[0, prompt_length:], skip_special_tokens=True)
+
+    def _generate_speculative(self, prompt: str, prefix: Optional[str] = None,
+                              schema: Optional[JsonSchema] = None, stream: Optional[TokenStream] = None) -> str:
+        """
+        Text model generation with the draft model proposing tokens; run on the llm pool.
+        Both models start from their cached ``prefix`` state when the prompt has one.
+        """
+        tokenizer = self.get_tokenizer()
+        text_model = self.lazy_models[TEXT]
+        split = self.prefix_cache.split(tokenizer, prompt, prefix) if self.prefix_cache is not None else None
+        with text_model.use() as target, self.draft_model.use() as draft, torch.no_grad():
+            target_past = draft_past = None
+            past_length = 0
+            if split is not None:
+                input_ids = split[0] + split[1]
+                target_past = self.prefix_cache.get(text_model.name, target, tokenizer, prefix).past_key_values()
+                draft_past = self.prefix_cache.get(self.draft_model.name, draft, tokenizer, prefix).past_key_values()
+                past_length = len(split[0])
+            else:
+                input_ids = tokenizer(prompt)['input_ids']
+            # max_length counts the prompt, as in generate()
+            max_length = self.generation_params['max_length'][TEXT]
+            tokens = self.speculative.generate(
+                target,
+                draft,
+                input_ids,
+                max_new_tokens=max(1, max_length - len(input_ids)),
+                eos_token_id=tokenizer.eos_token_id,
+                temperature=self.generation_params['temperature'],
+                top_p=self.generation_params['top_p'],
+                do_sample=self.generation_params['do_sample'],
+                on_token=stream.push_token if stream is not None else None,
+                stop=JsonObjectStoppingCriteria(tokenizer, schema=schema).push if schema is not None else None,
+                target_past=target_past,
+                draft_past=draft_past,
+                past_length=past_length
+            )
+        return tokenizer.decode(tokens, skip_special_tokens=True)
+
+    def get_status(self) -> Dict[str, Any]:
+        """Load state of each lazily loaded MedGemma model, text batching and prefix cache metrics"""
+        return {
+            'multimodal_model': self.lazy_models[MULTIMODAL].get_status(),
+            'text_model': self.lazy_models[TEXT].get_status(),
+            'text_scheduler': self.text_scheduler.get_metrics() if self.text_scheduler is not None else {},
+            'llm_pool': inference_executor.get_metrics('llm'),
+            'speculative': {
+                'draft_model': self.draft_model.name, **self.speculative.get_metrics()
+            } if self.speculative is not None else {},
+            'prefix_cache': self.prefix_cache.get_metrics() if self.prefix_cache is not None else {}
+        }
@@ -0,0 +1,127 @@
+import json
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from app.services.inference.executor import inference_executor
+from app.services.inference.json_stream import JsonObjectTracker, JsonSchema
+from app.services.inference.metrics import Histogram
+from app.services.inference.priority import ROUTINE_PRIORITY
+from app.services.inference.streaming import TokenStream
+
+from .base import LLMBackend
+
+logger = logging.getLogger(__name__)
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    """
+    Sends prompts to a server speaking the OpenAI chat completions API (vLLM, TGI, llama.cpp, ...).
+
+    Each generation is one streamed request, run on the inference executor's
+    llm_http pool, whose size bounds the requests in flight. Deltas are forwarded to
+    the caller's stream as they arrive, and with a ``schema`` the connection is
+    closed as soon as the JSON object is complete. Prefix reuse is left to the
+    server (e.g. vLLM automatic prefix caching).
+    """
+
+    name = 'openai'
+
+    def __init__(
+        self,
+        generation_params: Dict[str, Any],
+        models: Dict[str, str],
+        base_url: str,
+        api_key: str = "",
+        timeout_s: float = 120.0
+    ):
+        super().__init__(generation_params, models)
+        self.url = base_url.rstrip('/') + '/chat/completions'
+        self.timeout_s = timeout_s
+        self._session = requests.Session()
+        if api_key:
+            self._session.headers['Authorization'] = f"Bearer {api_key}"
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+        self.ttft_ms = Histogram()
+
+    def submit(
+        self,
+        role: str,
+        prompt: str,
+        prefix: Optional[str] = None,
+        schema: Optional[JsonSchema] = None,
+        stream: Optional[TokenStream] = None,
+        priority: int = ROUTINE_PRIORITY
+    ) -> Future:
+        return inference_executor.submit(
+            'llm_http', self._generate, role, prompt, schema, stream, priority=priority
+        )
+
+    def _payload(self, role: str, prompt: str) -> Dict[str, Any]:
+        params = self.generation_params
+        sample = params['do_sample'] and params['temperature'] > 0
+        return {
+            'model': self.models[role],
+            'messages': [{'role': 'user', 'content': prompt}],
+            # The API limits completion tokens only; the total length bounds them
+            'max_tokens': params['max_length'][role],
+            # Greedy decoding is temperature 0 in this API
+            'temperature': params['temperature'] if sample else 0.0,
+            'top_p': params['top_p'] if sample else 1.0,
+            'stream': True
+        }
+
+    def _generate(self, role: str, prompt: str, schema: Optional[JsonSchema] = None,
+                  stream: Optional[TokenStream] = None) -> str:
+        """Blocking streamed request on the llm_http pool; returns the completion text"""
+        tracker = JsonObjectTracker(schema) if schema is not None else None
+        parts: List[str] = []
+        start = time.perf_counter()
+        try:
+            with self._session.post(
+                self.url, json=self._payload(role, prompt), stream=True, timeout=self.timeout_s
+            ) as response:
+                response.raise_for_status()
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith('data:'):
+                        continue
+                    data = line[len('data:'):].strip()
+                    if data == '[DONE]':
+                        break
+                    choices = json.loads(data).get('choices') or [{}]
+                    delta = (choices[0].get('delta') or {}).get('content')
+                    if not delta:
+                        continue
+                    if not parts:
+                        self.ttft_ms.observe((time.perf_counter() - start) * 1000)
+                    parts.append(delta)
+                    if stream is not None:
+                        stream.push_text(delta)
+                    if tracker is not None and tracker.feed(delta):
+                        # Leaving the block closes the connection; the server stops generating
+                        break
+        except requests.RequestException as e:
+            with self._lock:
+                self.failures += 1
+            logger.error(f"LLM server request to {self.url} failed: {e}")
+            raise
+        with self._lock:
+            self.requests += 1
+        return ''.join(parts)
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'url': self.url,
+                'models': dict(self.models),
+                'requests': self.requests,
+                'failures': self.failures,
+                'ttft_ms': self.ttft_ms.snapshot(),
+                'llm_http_pool': inference_executor.get_metrics('llm_http')
+            }
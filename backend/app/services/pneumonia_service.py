@@ -1,10 +1,19 @@
+import asyncio
+import hashlib
+import io
 import os
+import numpy as np
 import torch
-from torchvision import transforms
 from PIL import Image
 import sys
 import logging
+import tarfile
+import threading
+import time
+import zipfile
 from pathlib import Path
+from concurrent.futures import Future
+from typing import BinaryIO, Dict, Iterator, List, Optional, Sequence, Tuple, Union
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -15,94 +24,443 @@ project_root = str(Path(__file__).parent.parent.parent.parent)
 sys.path.append(project_root)
 
 from ml_models.disease_classifiers.pneumonia.training.pneumonia_classifier import get_model
+from ml_models.disease_classifiers.pneumonia.training.preprocessing import Preprocessor
+from app.core.config import settings
+from app.services.admission.gate import classification_gate
+from app.services.inference.batching import MicroBatcher
+from app.services.inference.cache import ResultCache
+from app.services.inference.engines import artifact_path, build_engine
+from app.services.inference.executor import inference_executor
+from app.services.inference.priority import ROUTINE_PRIORITY
+from app.services.inference.registry import ModelKey, ModelRegistry
+from app.services.inference.workers import InferenceWorkerPool, write_slim_checkpoint
+
+# model_type that scores every architecture in PNEUMONIA_ENSEMBLE_WEIGHTS and combines them
+ENSEMBLE = 'ensemble'
 
 class PneumoniaService:
-    def __init__(self):
+    def __init__(self, precision: Optional[str] = None):
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-        self.models = {}
-        self.transform = transforms.Compose([
-            transforms.Resize((224, 224)),
-            transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-        ])
+        # 'fp32' or 'int8'; int8 serves the artifact written by quantize_model.py on CPU
+        self.precision = precision or settings.PNEUMONIA_PRECISION
+        self.registry = ModelRegistry(
+            settings.MODEL_CHECKPOINTS,
+            self._load_checkpoint,
+            memory_budget_mb=settings.MODEL_MEMORY_BUDGET_MB,
+            root=project_root,
+            sizeof=lambda engine: engine.nbytes
+        )
+        # Images are decoded to uint8 on the preprocess pool and normalized per batch
+        self.preprocessor = Preprocessor(
+            max_batch_size=settings.PNEUMONIA_MAX_BATCH_SIZE,
+            pin_memory=self.device.type == 'cuda'
+        )
         self.class_names = ['NORMAL', 'PNEUMONIA']
-        logger.info(f"Initialized PneumoniaService with device: {self.device}")
+        self.cache = None
+        if settings.PREDICTION_CACHE_ENABLED:
+            self.cache = ResultCache(
+                'pneumonia_predictions',
+                max_entries=settings.PREDICTION_CACHE_MAX_ENTRIES,
+                ttl_seconds=settings.PREDICTION_CACHE_TTL_SECONDS,
+                disk_dir=settings.PREDICTION_CACHE_DIR or None
+            )
+        # model key -> (checkpoint fingerprint, monotonic time it was checked)
+        self._fingerprints: Dict[ModelKey, Tuple[str, float]] = {}
+        self._fingerprint_lock = threading.Lock()
+        # Forward passes run in worker processes when configured, otherwise in this process
+        self.workers = None
+        if settings.PNEUMONIA_WORKER_PROCESSES > 0:
+            self.workers = InferenceWorkerPool(
+                settings.PNEUMONIA_WORKER_PROCESSES,
+                threads_per_worker=settings.PNEUMONIA_WORKER_THREADS,
+                engine=settings.PNEUMONIA_ENGINE,
+                precision=self.precision
+            )
+        self.batcher = None
+        if settings.PNEUMONIA_BATCHING_ENABLED:
+            self.batcher = MicroBatcher(
+                self._predict_batch,
+                max_batch_size=settings.PNEUMONIA_MAX_BATCH_SIZE,
+                max_wait_ms=settings.PNEUMONIA_BATCH_MAX_WAIT_MS,
+                name="pneumonia",
+                dispatch=lambda fn, priority: inference_executor.submit('vision', fn, priority=priority)
+            )
+        logger.info(f"Initialized PneumoniaService with device: {self.device}, precision: {self.precision}")
         
-    def load_model(self, model_type: str = 'resnet50'):
-        """Load a specific model type if not already loaded"""
+    def load_model(self, model_type: str = 'resnet50', version: Optional[str] = None):
+        """Load the inference engine for a model type (and version) if not already resident"""
         try:
-            if model_type not in self.models:
-                model_path = os.path.join(
-                    project_root,
-                    'ml_models/disease_classifiers/pneumonia/models',
-                    'best_model.pth'
-                )
-                
-                if not os.path.exists(model_path):
-                    logger.error(f"Model not found at {model_path}")
-                    raise FileNotFoundError(f"Model not found at {model_path}")
-                
-                logger.info(f"Loading model from {model_path}")
-                # Initialize and load model
-                model = get_model(model_type, num_classes=2)
-                checkpoint = torch.load(model_path, map_location=self.device)
-                model.load_state_dict(checkpoint['model_state_dict'])
-                model.eval()
-                model = model.to(self.device)
-                
-                self.models[model_type] = model
-                logger.info(f"Model {model_type} loaded successfully")
-                
-            return self.models[model_type]
+            model_key = self._model_key(model_type, version)
+            if self.workers is not None:
+                # Workers map the slim checkpoint themselves; only make sure it exists
+                return write_slim_checkpoint(self.registry.checkpoint_path(model_key), model_key.architecture)
+            return self.registry.get(model_key)
             
         except Exception as e:
             logger.error(f"Error loading model: {str(e)}")
             raise
     
+    def _model_key(self, model_type: str, version: Optional[str] = None) -> ModelKey:
+        return self.registry.resolve('pneumonia', model_type, version)
+    
+    def _load_checkpoint(self, key: ModelKey, model_path: str):
+        """Registry loader: build the configured engine (eager, torchscript or onnx) for a checkpoint"""
+        return build_engine(
+            settings.PNEUMONIA_ENGINE,
+            model_path,
+            lambda: self._load_eager_model(key, model_path),
+            self.device,
+            intra_op_threads=settings.ONNX_INTRA_OP_THREADS,
+            precision=self.precision
+        )
+    
+    def _load_eager_model(self, key: ModelKey, model_path: str) -> torch.nn.Module:
+        """Build the architecture and load its own checkpoint"""
+        if not os.path.exists(model_path):
+            logger.error(f"Model not found at {model_path}")
+            raise FileNotFoundError(f"Model not found at {model_path}")
+        
+        logger.info(f"Loading {key} from {model_path}")
+        # Initialize and load model
+        model = get_model(key.architecture, num_classes=2)
+        checkpoint = torch.load(model_path, map_location=self.device)
+        trained_as = checkpoint.get('model_type')
+        if trained_as is not None and trained_as != key.architecture:
+            raise ValueError(f"Checkpoint {model_path} holds a {trained_as} model, not {key.architecture}")
+        model.load_state_dict(checkpoint['model_state_dict'])
+        model.eval()
+        
+        logger.info(f"Model {key} loaded successfully")
+        return model
+    
+    def warmup(self, model_type: str = 'resnet50', batch_sizes: Sequence[int] = (1,), iterations: int = 1):
+        """Load a model and run synthetic batches through it to warm allocator and kernel paths"""
+        model_key = self._model_key(model_type)
+        for batch_size in batch_sizes:
+            dummy = [np.zeros((224, 224, 3), dtype=np.uint8) for _ in range(batch_size)]
+            for _ in range(iterations):
+                self._predict_batch(model_key, dummy)
+        logger.info(f"Model {model_key} warmed up with batch sizes {list(batch_sizes)}")
+    
+    def _predict_batch(self, model_key: ModelKey, images: List[np.ndarray]) -> List[dict]:
+        """Normalize a batch of uint8 [224,224,3] images and run one forward pass over it"""
+        if self.workers is not None:
+            future = self.workers.submit(
+                str(model_key),
+                model_key.architecture,
+                self.registry.checkpoint_path(model_key),
+                images
+            )
+            probabilities = torch.from_numpy(future.result())
+            return [self._format_prediction(row) for row in probabilities]
+        
+        engine = self.registry.get(model_key)
+        batch = self.preprocessor.batch(images)
+        
+        with torch.no_grad():
+            outputs = engine(batch)
+            probabilities = torch.softmax(outputs, dim=1).cpu()
+        
+        return [self._format_prediction(row) for row in probabilities]
+    
+    def _format_prediction(self, probabilities: torch.Tensor) -> dict:
+        """Format one row of class probabilities as a prediction result"""
+        predicted_class = torch.argmax(probabilities).item()
+        return {
+            'prediction': self.class_names[predicted_class],
+            'confidence': probabilities[predicted_class].item(),
+            'probabilities': {
+                self.class_names[i]: float(prob)
+                for i, prob in enumerate(probabilities.numpy())
+            }
+        }
+    
     def predict(self, image_path: str, model_type: str = 'resnet50') -> dict:
         """Make prediction for a given image"""
         try:
-            # Convert to Path object and resolve
-            image_path = Path(image_path).resolve()
-            logger.info(f"Processing image: {image_path}")
-            
-            if not image_path.exists():
-                logger.error(f"Image file not found: {image_path}")
-                raise FileNotFoundError(f"Image file not found: {image_path}")
-            
-            # Load model
-            model = self.load_model(model_type)
-            
-            # Load and preprocess image
-            try:
-                image = Image.open(image_path).convert('RGB')
-                image_tensor = self.transform(image).unsqueeze(0).to(self.device)
-            except Exception as e:
-                logger.error(f"Error processing image: {str(e)}")
-                raise ValueError(f"Error processing image: {str(e)}")
+            image_path = self._resolve_image_path(image_path)
+            return self._predict_raw(image_path.read_bytes(), model_type)
             
-            # Make prediction
-            with torch.no_grad():
-                outputs = model(image_tensor)
-                probabilities = torch.softmax(outputs, dim=1)
-                predicted_class = torch.argmax(probabilities, dim=1).item()
-                confidence = probabilities[0][predicted_class].item()
-            
-            # Format probabilities
-            prob_dict = {
-                self.class_names[i]: float(prob)
-                for i, prob in enumerate(probabilities[0].cpu().numpy())
-            }
-            
-            result = {
-                'prediction': self.class_names[predicted_class],
-                'confidence': confidence,
-                'probabilities': prob_dict
-            }
+        except Exception as e:
+            logger.error(f"Error in prediction: {str(e)}")
+            raise
+    
+    def predict_bytes(self, data: Union[bytes, BinaryIO], model_type: str = 'resnet50') -> dict:
+        """Make prediction for an encoded image held in memory or in a (spooled) file object"""
+        return self._predict_raw(self._read_bytes(data), model_type)
+    
+    def _predict_raw(self, raw: bytes, model_type: str) -> dict:
+        cache_key, cached = self._cache_lookup(raw, model_type)
+        if cached is not None:
+            return cached
+        
+        result = self._predict_array(self._load_array(io.BytesIO(raw)), model_type)
+        if cache_key is not None and not result.get('failed'):
+            self.cache.put(cache_key, result)
+        return result
+    
+    def predict_image(self, image: Image.Image, model_type: str = 'resnet50') -> dict:
+        """Make prediction for an already decoded image"""
+        return self._predict_array(self._preprocess(image), model_type)
+    
+    def _predict_array(self, image_array: np.ndarray, model_type: str) -> dict:
+        try:
+            result = self._infer(image_array, model_type).result()
             
             logger.info(f"Prediction result: {result}")
             return result
             
         except Exception as e:
             logger.error(f"Error in prediction: {str(e)}")
-            raise 
\ No newline at end of file
+            raise
+    
+    async def predict_async(self, image_path: str, model_type: str = 'resnet50',
+                            tenant: Optional[str] = None, rate_limit: bool = True,
+                            priority: int = ROUTINE_PRIORITY) -> dict:
+        """
+        Awaitable predict(); decoding and inference run on the inference executor,
+        queued at ``priority``. With a ``tenant`` key the request is admitted through
+        classification_gate: RATE_LIMIT_PER_MINUTE per key, then a weighted fair share
+        of capacity.
+        """
+        async with classification_gate.admit(tenant, priority, rate_limit):
+            image_path = self._resolve_image_path(image_path)
+            raw = await inference_executor.run('preprocess', image_path.read_bytes, priority=priority)
+            return await self._predict_raw_async(raw, model_type, priority)
+    
+    async def predict_bytes_async(self, data: Union[bytes, BinaryIO], model_type: str = 'resnet50',
+                                  tenant: Optional[str] = None, rate_limit: bool = True,
+                                  priority: int = ROUTINE_PRIORITY) -> dict:
+        """Awaitable predict_bytes(), admitted and queued like predict_async()"""
+        async with classification_gate.admit(tenant, priority, rate_limit):
+            raw = await inference_executor.run('preprocess', self._read_bytes, data, priority=priority)
+            return await self._predict_raw_async(raw, model_type, priority)
+    
+    async def _predict_raw_async(self, raw: bytes, model_type: str, priority: int = ROUTINE_PRIORITY) -> dict:
+        cache_key, cached = await inference_executor.run(
+            'preprocess', self._cache_lookup, raw, model_type, priority=priority
+        )
+        if cached is not None:
+            return cached
+        
+        image_array = await inference_executor.run(
+            'preprocess', self._load_array, io.BytesIO(raw), priority=priority
+        )
+        result = await self._infer_async(image_array, model_type, priority)
+        # An ensemble missing a member that failed this time is not worth repeating
+        if cache_key is not None and not result.get('failed'):
+            await self.cache.put_async(cache_key, result)
+        return result
+    
+    def _cache_lookup(self, raw: bytes, model_type: str) -> Tuple[Optional[str], Optional[dict]]:
+        """Content-addressed key (image hash, model, engine, checkpoint fingerprint) and any cached result"""
+        if self.cache is None:
+            return None, None
+        if model_type == ENSEMBLE:
+            weights, _ = self._ensemble_weights()
+            model_keys = [self._model_key(architecture) for architecture in weights]
+            variant = ENSEMBLE + ','.join(f"{a}={w}" for a, w in sorted(weights.items()))
+        else:
+            model_keys = [self._model_key(model_type)]
+            variant = model_type
+        models = ','.join(f"{key}@{self._model_fingerprint(key)}" for key in model_keys)
+        digest = hashlib.sha256(raw).hexdigest()
+        cache_key = f"{digest}:{variant}:{models}:{self._engine_name}"
+        return cache_key, self.cache.get(cache_key)
+    
+    @property
+    def _engine_name(self) -> str:
+        return 'int8' if self.precision == 'int8' else settings.PNEUMONIA_ENGINE
+    
+    def _model_fingerprint(self, model_key: ModelKey) -> str:
+        """
+        Identify the file currently backing a model; a change drops the resident copy.
+        The file is checked at most every CHECKPOINT_CHECK_INTERVAL_SECONDS.
+        """
+        now = time.monotonic()
+        with self._fingerprint_lock:
+            previous = self._fingerprints.get(model_key)
+            if previous is not None and now - previous[1] < settings.CHECKPOINT_CHECK_INTERVAL_SECONDS:
+                return previous[0]
+            
+            path = self.registry.checkpoint_path(model_key)
+            if self._engine_name != 'eager':
+                path = artifact_path(path, self._engine_name)
+            try:
+                stat = os.stat(path)
+                fingerprint = f"{stat.st_mtime_ns}-{stat.st_size}"
+            except OSError:
+                fingerprint = 'missing'
+            
+            if previous is not None and previous[0] != fingerprint:
+                logger.info(f"Checkpoint for {model_key} changed, reloading on next use")
+                self.registry.evict(model_key)
+            self._fingerprints[model_key] = (fingerprint, now)
+            return fingerprint
+    
+    async def _infer_async(self, image_array: np.ndarray, model_type: str, priority: int = ROUTINE_PRIORITY) -> dict:
+        try:
+            result = await asyncio.wrap_future(self._infer(image_array, model_type, priority))
+        except Exception as e:
+            logger.error(f"Error in prediction: {str(e)}")
+            raise
+        
+        logger.info(f"Prediction result: {result}")
+        return result
+    
+    def _infer(self, image_array: np.ndarray, model_type: str, priority: int = ROUTINE_PRIORITY) -> Future:
+        """Queue a decoded image for inference, sharing a forward pass with concurrent requests"""
+        if model_type == ENSEMBLE:
+            return self._infer_ensemble(image_array, priority)
+        model_key = self._model_key(model_type)
+        if self.batcher is not None:
+            return self.batcher.submit(model_key, image_array, priority)
+        return inference_executor.submit(
+            'vision',
+            lambda: self._predict_batch(model_key, [image_array])[0],
+            priority=priority
+        )
+    
+    def _ensemble_weights(self) -> Tuple[Dict[str, float], Dict[str, str]]:
+        """PNEUMONIA_ENSEMBLE_WEIGHTS members with a registered checkpoint, and why the others are skipped"""
+        weights, skipped = {}, {}
+        for architecture, weight in settings.PNEUMONIA_ENSEMBLE_WEIGHTS.items():
+            try:
+                self._model_key(architecture)
+            except ValueError as e:
+                skipped[architecture] = str(e)
+                continue
+            weights[architecture] = weight
+        if not weights:
+            raise ValueError("No PNEUMONIA_ENSEMBLE_WEIGHTS member has a registered checkpoint")
+        return weights, skipped
+    
+    def _infer_ensemble(self, image_array: np.ndarray, priority: int = ROUTINE_PRIORITY) -> Future:
+        """
+        Queue one decoded image for every ensemble member at once; each architecture
+        has its own batching lane, so the members run in parallel on the vision pool.
+        Unregistered members and members that fail are left out and the remaining
+        weights renormalized; the result lists them under 'skipped' and 'failed'.
+        """
+        weights, skipped = self._ensemble_weights()
+        futures = {architecture: self._infer(image_array, architecture, priority) for architecture in weights}
+        combined = Future()
+        remaining = [len(futures)]
+        lock = threading.Lock()
+        
+        def member_done(_):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            results, failed = {}, {}
+            for architecture, future in futures.items():
+                error = future.exception()
+                if error is None:
+                    results[architecture] = future.result()
+                else:
+                    logger.warning(f"Ensemble member {architecture} failed, combining without it: {error}")
+                    failed[architecture] = str(error)
+            if not results:
+                combined.set_exception(next(iter(futures.values())).exception())
+                return
+            try:
+                result = self._combine_predictions(results, {a: weights[a] for a in results})
+                result['skipped'] = skipped
+                result['failed'] = failed
+                combined.set_result(result)
+            except Exception as e:
+                combined.set_exception(e)
+        
+        for future in futures.values():
+            future.add_done_callback(member_done)
+        return combined
+    
+    def _combine_predictions(self, results: Dict[str, dict], weights: Dict[str, float]) -> dict:
+        """Weighted average of member probabilities, with each member's own result attached"""
+        total = sum(weights.values())
+        if total <= 0:
+            raise ValueError("PNEUMONIA_ENSEMBLE_WEIGHTS must sum to a positive value")
+        probabilities = torch.zeros(len(self.class_names))
+        for architecture, result in results.items():
+            member = torch.tensor([result['probabilities'][name] for name in self.class_names])
+            probabilities += member * (weights[architecture] / total)
+        
+        combined = self._format_prediction(probabilities)
+        combined['models'] = results
+        combined['weights'] = {architecture: weight / total for architecture, weight in weights.items()}
+        return combined
+    
+    def _resolve_image_path(self, image_path: str) -> Path:
+        # Convert to Path object and resolve
+        image_path = Path(image_path).resolve()
+        logger.info(f"Processing image: {image_path}")
+        
+        if not image_path.exists():
+            logger.error(f"Image file not found: {image_path}")
+            raise FileNotFoundError(f"Image file not found: {image_path}")
+        
+        return image_path
+    
+    def iter_upload(self, source: BinaryIO, filename: str) -> Iterator[Tuple[str, bytes]]:
+        """
+        Yield (name, encoded bytes) for an uploaded image, or for each image in a
+        zip/tar archive, reading one member at a time
+        """
+        name = filename.lower()
+        if source.seekable():
+            source.seek(0)
+        
+        if name.endswith('.zip'):
+            with zipfile.ZipFile(source) as archive:
+                for info in archive.infolist():
+                    if not info.is_dir() and self._is_image_name(info.filename):
+                        yield info.filename, archive.read(info)
+        elif name.endswith(('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')):
+            # Streaming mode: members are decompressed in order without seeking back
+            with tarfile.open(fileobj=source, mode='r|*') as archive:
+                for member in archive:
+                    if member.isfile() and self._is_image_name(member.name):
+                        yield member.name, archive.extractfile(member).read()
+        else:
+            yield filename, source.read()
+    
+    def _is_image_name(self, name: str) -> bool:
+        basename = os.path.basename(name)
+        # Skip hidden files and macOS resource forks shipped inside archives
+        return not basename.startswith('.') and os.path.splitext(basename)[1].lower() in settings.PNEUMONIA_BULK_IMAGE_EXTENSIONS
+    
+    def _read_bytes(self, data: Union[bytes, BinaryIO]) -> bytes:
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            return bytes(data)
+        if data.seekable():
+            data.seek(0)
+        return data.read()
+    
+    def _load_array(self, source: Union[Path, BinaryIO]) -> np.ndarray:
+        """Decode an image (reduced-scale for large JPEGs) to uint8 [224,224,3], raising ValueError on bad input"""
+        try:
+            return self.preprocessor.decode(source)
+        except Exception as e:
+            logger.error(f"Error processing image: {str(e)}")
+            raise ValueError(f"Error processing image: {str(e)}")
+    
+    def _preprocess(self, image: Image.Image) -> np.ndarray:
+        """Resize an already decoded image to uint8 [224,224,3]"""
+        try:
+            return self.preprocessor.resize(image)
+        except Exception as e:
+            logger.error(f"Error processing image: {str(e)}")
+            raise ValueError(f"Error processing image: {str(e)}")
+    
+    def get_metrics(self) -> dict:
+        """Batching and executor pool metrics for tuning the batching window"""
+        return {
+            'batching_enabled': self.batcher is not None,
+            'batching': self.batcher.get_metrics() if self.batcher is not None else {},
+            'models': self.registry.get_metrics(),
+            'workers': self.workers.get_metrics() if self.workers is not None else {},
+            'cache': self.cache.get_metrics() if self.cache is not None else {},
+            'admission': classification_gate.get_metrics(),
+            'executor': inference_executor.get_metrics()
+        }
\ No newline at end of file
@@ -0,0 +1,80 @@
+"""CPU throughput benchmark: sequential generate() vs the continuous-batching scheduler"""
+import os
+import sys
+import time
+from concurrent.futures import wait
+from pathlib import Path
+
+import torch
+import transformers
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.inference.generation import GenerationScheduler
+from app.services.inference.lazy import LazyModel
+from app.services.inference.prefix_cache import PrefixCache
+
+# Any small causal LM works; override to benchmark with something closer to production
+MODEL_NAME = os.environ.get("GENERATION_TEST_MODEL", "sshleifer/tiny-gpt2")
+
+PROMPTS = [
+    "Patient presents with fever and cough for three days.",
+    "Chest pain.",
+    "A 64 year old with shortness of breath, oxygen saturation 91 percent, history of COPD and smoking.",
+    "Headache",
+    "Rash on both arms after starting a new antibiotic last week, no fever.",
+]
+PREFIX = "Clinical case analysis. List the most likely diagnoses and the next tests to order.\n"
+
+def make_scheduler(tokenizer, model, **kwargs):
+    return GenerationScheduler(LazyModel(MODEL_NAME, lambda: model), lambda: tokenizer, **kwargs)
+
+def generate_alone(tokenizer, model, prompt, max_new_tokens):
+    inputs = tokenizer(prompt, return_tensors="pt")
+    with torch.no_grad():
+        model.generate(
+            **inputs,
+            max_new_tokens=max_new_tokens,
+            do_sample=False,
+            pad_token_id=tokenizer.eos_token_id
+        )
+
+def main():
+    tokenizer = transformers.AutoTokenizer.from_pretrained(MODEL_NAME)
+    model = transformers.AutoModelForCausalLM.from_pretrained(MODEL_NAME).eval()
+    prompts = PROMPTS * 8
+    max_new_tokens = 64
+
+    start = time.perf_counter()
+    for prompt in prompts:
+        generate_alone(tokenizer, model, prompt, max_new_tokens)
+    sequential = time.perf_counter() - start
+    print(f"Sequential generate(): {len(prompts)} prompts in {sequential:.2f}s")
+
+    for batch_size in (2, 4, 8):
+        scheduler = make_scheduler(tokenizer, model, max_batch_size=batch_size)
+        start = time.perf_counter()
+        wait([scheduler.submit(p, max_new_tokens=max_new_tokens) for p in prompts])
+        elapsed = time.perf_counter() - start
+        scheduler.shutdown()
+        metrics = scheduler.get_metrics()
+        print(
+            f"Scheduler batch {batch_size}: {elapsed:.2f}s "
+            f"({sequential / elapsed:.2f}x, {metrics['tokens_per_second']:.0f} tokens/s, "
+            f"mean batch {metrics['batch_size']['mean']:.1f})"
+        )
+
+    # Prefill time per prompt behind a long shared preamble, with and without its cached state
+    prompts = [PREFIX * 8 + p for p in PROMPTS]
+    for prefix_cache in (None, PrefixCache(max_bytes=256 * 1024 * 1024)):
+        scheduler = make_scheduler(tokenizer, model, max_batch_size=1, prefix_cache=prefix_cache)
+        wait([scheduler.submit(p, max_new_tokens=1, prefix=PREFIX * 8) for p in prompts])
+        scheduler.shutdown()
+        metrics = scheduler.get_metrics()
+        print(
+            f"Prefill {'with' if prefix_cache else 'without'} prefix cache: "
+            f"{metrics['prefill_ms']['mean']:.1f} ms mean, {metrics['tokens_prefilled']} tokens prefilled"
+        )
+
+if __name__ == "__main__":
+    main()
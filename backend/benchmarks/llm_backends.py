@@ -0,0 +1,38 @@
+"""Orchestration overhead: concurrent generations on the fake backend vs their simulated cost"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.llm.base import MULTIMODAL, TEXT
+from app.services.llm.fake import FakeBackend
+
+SCHEMA = {
+    'primary_diagnosis': (str, dict),
+    'differential_diagnoses': list,
+    'urgency_level': (int, float, str),
+    'warning_signs': (str, list)
+}
+GENERATION = {'max_length': {MULTIMODAL: 2048, TEXT: 3072}, 'temperature': 0.2, 'top_p': 0.9, 'do_sample': True}
+MODELS = {MULTIMODAL: 'fake/multimodal', TEXT: 'fake/text'}
+
+def main():
+    backend = FakeBackend(GENERATION, MODELS, latency_ms=50, tokens_per_second=1000, response_tokens=100)
+    tokens = len(backend.response(TEXT, "warmup", SCHEMA).split())
+    ideal = 0.05 + tokens / 1000
+    for concurrency in (1, 4, 16):
+        start = time.perf_counter()
+        futures = [backend.submit(TEXT, f"Case {i}", schema=SCHEMA) for i in range(concurrency)]
+        for future in futures:
+            future.result()
+        elapsed = time.perf_counter() - start
+        workers = backend.get_status()['llm_pool']['workers']
+        expected = ideal * -(-concurrency // workers)
+        print(
+            f"{concurrency} concurrent: {elapsed * 1000:.0f} ms "
+            f"(simulated model time {expected * 1000:.0f} ms on {workers} llm worker(s))"
+        )
+
+if __name__ == "__main__":
+    main()
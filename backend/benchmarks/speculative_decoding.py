@@ -0,0 +1,66 @@
+"""CPU benchmark: plain greedy generate() on the target vs speculative decoding with the draft"""
+import os
+import sys
+import time
+from pathlib import Path
+
+import torch
+import transformers
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.inference.speculative import SpeculativeDecoder
+
+# Two small causal LMs sharing a tokenizer stand in for MedGemma 27B (target) and 4B (draft)
+TARGET_MODEL = os.environ.get("SPECULATIVE_TEST_TARGET", "distilgpt2")
+DRAFT_MODEL = os.environ.get("SPECULATIVE_TEST_DRAFT", "sshleifer/tiny-gpt2")
+
+PROMPTS = [
+    "Patient presents with fever and cough for three days.",
+    "Chest pain radiating to the left arm, sweating and nausea.",
+    "A 64 year old with shortness of breath, oxygen saturation 91 percent, history of COPD and smoking.",
+]
+
+def generate_alone(tokenizer, model, prompt, max_new_tokens):
+    inputs = tokenizer(prompt, return_tensors="pt")
+    with torch.no_grad():
+        outputs = model.generate(
+            **inputs,
+            max_new_tokens=max_new_tokens,
+            do_sample=False,
+            pad_token_id=tokenizer.eos_token_id
+        )
+    return outputs[0, inputs['input_ids'].shape[1]:].tolist()
+
+def speculate(decoder, tokenizer, target, draft, prompt, max_new_tokens):
+    with torch.no_grad():
+        return decoder.generate(
+            target, draft, tokenizer(prompt)['input_ids'], max_new_tokens,
+            eos_token_id=tokenizer.eos_token_id
+        )
+
+def main():
+    tokenizer = transformers.AutoTokenizer.from_pretrained(TARGET_MODEL)
+    target = transformers.AutoModelForCausalLM.from_pretrained(TARGET_MODEL).eval()
+    draft = transformers.AutoModelForCausalLM.from_pretrained(DRAFT_MODEL).eval()
+    max_new_tokens = 64
+
+    start = time.perf_counter()
+    baseline_tokens = sum(len(generate_alone(tokenizer, target, p, max_new_tokens)) for p in PROMPTS)
+    baseline = baseline_tokens / (time.perf_counter() - start)
+    print(f"Target generate(): {baseline:.1f} tokens/s")
+
+    for k in (2, 4, 8):
+        decoder = SpeculativeDecoder(num_draft_tokens=k)
+        start = time.perf_counter()
+        tokens = sum(len(speculate(decoder, tokenizer, target, draft, p, max_new_tokens)) for p in PROMPTS)
+        rate = tokens / (time.perf_counter() - start)
+        metrics = decoder.get_metrics()
+        print(
+            f"Speculative k={k}: {rate:.1f} tokens/s ({rate / baseline:.2f}x), "
+            f"acceptance {metrics['acceptance_rate']:.0%}, "
+            f"{metrics['tokens_per_target_pass']:.2f} tokens per target pass"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import asyncio
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.admission.fair import FairScheduler
+from app.services.admission.gate import AdmissionGate
+from app.services.admission.limiter import RateLimiter, RateLimitExceededError
+from app.services.admission.store import LocalBucketStore, SQLiteBucketStore
+from app.services.inference.executor import InferenceQueueFullError
+from app.services.inference.priority import EMERGENCY_PRIORITY
+
+@pytest.fixture(params=['local', 'sqlite'])
+def bucket_store(request, tmp_path):
+    store = LocalBucketStore() if request.param == 'local' else SQLiteBucketStore(str(tmp_path / "buckets.sqlite3"))
+    yield store
+    store.close()
+
+def test_bucket_allows_a_burst_then_reports_the_wait(bucket_store):
+    # 60/minute is one token a second
+    assert [bucket_store.take('user:1', 1, 1.0, 3) for _ in range(3)] == [0, 0, 0]
+    assert 0.9 < bucket_store.take('user:1', 1, 1.0, 3) <= 1.0
+    assert bucket_store.take('user:2', 1, 1.0, 3) == 0
+
+def test_rate_limiter_raises_with_retry_after(bucket_store):
+    limiter = RateLimiter('analysis', bucket_store, per_minute=60, burst=2)
+    limiter.check('user:1')
+    limiter.check('user:1')
+    with pytest.raises(RateLimitExceededError) as excinfo:
+        limiter.check('user:1')
+    assert 0 < excinfo.value.retry_after <= 1.0
+    assert limiter.get_metrics()['allowed'] == 2 and limiter.get_metrics()['limited'] == 1
+
+def test_sqlite_buckets_are_shared_between_instances(tmp_path):
+    path = str(tmp_path / "buckets.sqlite3")
+    first, second = SQLiteBucketStore(path), SQLiteBucketStore(path)
+    assert first.take('api:user:1', 1, 1.0, 1) == 0
+    assert second.take('api:user:1', 1, 1.0, 1) > 0
+    first.close()
+    second.close()
+
+async def run_contended(scheduler, requests):
+    """Hold every slot, queue ``requests`` as (key, priority), free the slots; returns the order keys got a slot"""
+    release = asyncio.Event()
+    granted = []
+
+    async def hold():
+        async with scheduler.slot('holder'):
+            await release.wait()
+
+    async def request(key, priority):
+        async with scheduler.slot(key, priority=priority):
+            granted.append(key)
+            await asyncio.sleep(0)
+
+    holders = [asyncio.create_task(hold()) for _ in range(scheduler.capacity)]
+    await asyncio.sleep(0)
+    waiters = []
+    for key, priority in requests:
+        waiters.append(asyncio.create_task(request(key, priority)))
+        await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(*holders, *waiters)
+    return granted
+
+def test_heavy_key_does_not_starve_others():
+    scheduler = FairScheduler('analysis', capacity=1)
+    requests = [('bulk', 1)] * 4 + [('clinic', 1)]
+    granted = asyncio.run(run_contended(scheduler, requests))
+    # Both keys' first requests tie on start tag; the clinic then goes before the bulk backlog
+    assert granted == ['bulk', 'clinic', 'bulk', 'bulk', 'bulk']
+    assert scheduler.get_metrics()['admitted'] == 6
+
+def test_weighted_key_gets_a_larger_share():
+    scheduler = FairScheduler('analysis', capacity=1, weights={'icu': 2.0})
+    requests = [('ward', 1)] * 3 + [('icu', 1)] * 3
+    granted = asyncio.run(run_contended(scheduler, requests))
+    assert granted[:3].count('icu') == 2
+
+def test_emergencies_go_ahead_of_the_fair_queue():
+    scheduler = FairScheduler('analysis', capacity=1)
+    requests = [('clinic', 1), ('ward', 1), ('ward', EMERGENCY_PRIORITY)]
+    granted = asyncio.run(run_contended(scheduler, requests))
+    assert granted == ['ward', 'clinic', 'ward']
+
+def test_full_queue_rejects_new_requests():
+    async def overfill():
+        scheduler = FairScheduler('analysis', capacity=1, max_queue=1)
+        release = asyncio.Event()
+
+        async def hold(key):
+            async with scheduler.slot(key):
+                await release.wait()
+
+        tasks = [asyncio.create_task(hold('a')), asyncio.create_task(hold('b'))]
+        await asyncio.sleep(0)
+        with pytest.raises(InferenceQueueFullError):
+            async with scheduler.slot('c'):
+                pass
+        release.set()
+        await asyncio.gather(*tasks)
+        return scheduler.get_metrics()
+
+    metrics = asyncio.run(overfill())
+    assert metrics['rejected'] == 1 and metrics['active'] == 0 and metrics['queue_depth'] == 0
+
+def make_gate(emergency_per_minute=0):
+    store = LocalBucketStore()
+    emergency_limiter = RateLimiter('emergency', store, emergency_per_minute) if emergency_per_minute else None
+    return AdmissionGate(RateLimiter('analysis', store, per_minute=1), FairScheduler('analysis', 1), emergency_limiter)
+
+def test_emergencies_within_their_quota_skip_the_rate_limit():
+    gate = make_gate(emergency_per_minute=2)
+    assert asyncio.run(gate.charge('user:1')) == 1
+    with pytest.raises(RateLimitExceededError):
+        asyncio.run(gate.charge('user:1'))
+    assert asyncio.run(gate.charge('user:1', EMERGENCY_PRIORITY)) == EMERGENCY_PRIORITY
+    assert asyncio.run(gate.charge('user:1', EMERGENCY_PRIORITY)) == EMERGENCY_PRIORITY
+    # Past the emergency quota they are charged like routine work, and the regular bucket is empty
+    with pytest.raises(RateLimitExceededError):
+        asyncio.run(gate.charge('user:1', EMERGENCY_PRIORITY))
+    metrics = gate.get_metrics()
+    assert metrics['emergencies_admitted'] == 2 and metrics['emergencies_demoted'] == 1
+
+def test_demoted_emergencies_queue_fairly():
+    gate = make_gate(emergency_per_minute=1)
+    assert asyncio.run(gate.charge('bulk', EMERGENCY_PRIORITY)) == EMERGENCY_PRIORITY
+    demoted = asyncio.run(gate.charge('bulk', EMERGENCY_PRIORITY))
+    granted = asyncio.run(run_contended(gate.scheduler, [('clinic', 1), ('bulk', demoted)]))
+    assert granted == ['clinic', 'bulk']
+
+def test_without_an_emergency_quota_emergencies_are_rate_limited():
+    gate = make_gate()
+
+    async def admit(key, priority):
+        async with gate.admit(key, priority=priority):
+            pass
+
+    asyncio.run(admit('user:1', EMERGENCY_PRIORITY))
+    with pytest.raises(RateLimitExceededError):
+        asyncio.run(admit('user:1', EMERGENCY_PRIORITY))
+    assert gate.get_metrics()['emergencies_demoted'] == 2
+    asyncio.run(admit(None, EMERGENCY_PRIORITY))
+
+def test_sqlite_buckets_are_taken_off_the_event_loop(tmp_path):
+    store = SQLiteBucketStore(str(tmp_path / "buckets.sqlite3"))
+    limiter = RateLimiter('analysis', store, per_minute=60, burst=1)
+    threads = []
+    real_take = store.take
+
+    def take(*args):
+        threads.append(threading.current_thread().name)
+        return real_take(*args)
+
+    store.take = take
+
+    async def charge_twice():
+        await limiter.check_async('user:1')
+        with pytest.raises(RateLimitExceededError):
+            await limiter.check_async('user:1')
+
+    asyncio.run(charge_twice())
+    store.close()
+    assert len(threads) == 2
+    assert all(name.startswith('rate-limit-store') for name in threads)
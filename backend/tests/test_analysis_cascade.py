@@ -0,0 +1,123 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent))
+# ai_service imports the legacy classifiers from the repository's ml_models package
+sys.path.append(str(Path(__file__).parent.parent.parent / 'ml_models'))
+
+pytest.importorskip("torch")
+Image = pytest.importorskip("PIL.Image")
+
+from app.core.config import settings
+from app.services.ai_service import MedGemmaService
+from app.services.inference.priority import EMERGENCY_PRIORITY
+
+SYMPTOMS = [{'name': 'cough', 'severity': 'moderate'}, {'name': 'fever', 'severity': 'mild'}]
+
+class FakeExpertSystem:
+    def __init__(self, confidence):
+        self.confidence = confidence
+
+    def analyze_symptoms(self, symptoms, vital_signs=None, history=None):
+        return {'diagnoses': [{'disease': 'Pneumonia', 'confidence': self.confidence}], 'emergency_flags': []}
+
+def make_service(legacy_confidence=0.95, expert_confidence=0.9, delay_s=0.0):
+    """MedGemmaService with its models replaced by stand-ins; ``calls`` records the MedGemma stages that ran"""
+    service = MedGemmaService.__new__(MedGemmaService)
+    service.calls = []
+    service.legacy_pneumonia_model = object()
+    service.expert_system = FakeExpertSystem(expert_confidence)
+    service._legacy_model_analysis = lambda image: {
+        'prediction': 'PNEUMONIA',
+        'confidence': legacy_confidence,
+        'probabilities': {'NORMAL': 1 - legacy_confidence, 'PNEUMONIA': legacy_confidence}
+    }
+
+    async def image_analysis(image, symptoms=None, vital_signs=None, history=None):
+        service.calls.append('medgemma_image')
+        await asyncio.sleep(delay_s)
+        return {'primary_diagnosis': {'disease': 'Pneumonia', 'confidence': 0.9}}
+
+    async def clinical_reasoning(symptoms=None, vital_signs=None, history=None):
+        service.calls.append('medgemma_clinical')
+        await asyncio.sleep(delay_s)
+        return {'primary_diagnosis': 'Community-acquired pneumonia'}
+
+    service._medgemma_image_analysis = image_analysis
+    service._medgemma_clinical_reasoning = clinical_reasoning
+    return service
+
+def analyze(service, **kwargs):
+    kwargs.setdefault('image', Image.new('RGB', (32, 32)))
+    kwargs.setdefault('symptoms', SYMPTOMS)
+    return asyncio.run(service.comprehensive_medical_analysis(**kwargs))
+
+@pytest.fixture(autouse=True)
+def cascade_enabled(monkeypatch):
+    monkeypatch.setattr(settings, 'ENABLE_MODEL_CASCADE', True)
+    monkeypatch.setattr(settings, 'CONSENSUS_THRESHOLD', 0.8)
+
+def test_confident_cheap_stages_skip_medgemma():
+    service = make_service()
+    results = analyze(service)
+    assert service.calls == []
+    assert set(results['cascade']['stages_skipped']) == {'medgemma_image', 'medgemma_clinical'}
+    assert results['combined_diagnosis']['consensus_level'] == 'legacy_only'
+    assert results['combined_diagnosis']['final_diagnosis'] == 'PNEUMONIA'
+
+def test_uncertain_stage_runs_only_its_medgemma_counterpart():
+    service = make_service(legacy_confidence=0.6)
+    results = analyze(service)
+    assert service.calls == ['medgemma_image']
+    assert list(results['cascade']['stages_skipped']) == ['medgemma_clinical']
+    assert results['medgemma_analysis']['primary_diagnosis']['disease'] == 'Pneumonia'
+
+def test_emergency_flags_force_medgemma():
+    service = make_service()
+    results = analyze(service, vital_signs={'heart_rate': 170})
+    assert sorted(service.calls) == ['medgemma_clinical', 'medgemma_image']
+    assert results['cascade']['stages_skipped'] == {}
+    assert results['emergency_flags']
+    assert results['priority'] == EMERGENCY_PRIORITY
+
+def test_disabled_cascade_runs_every_stage(monkeypatch):
+    monkeypatch.setattr(settings, 'ENABLE_MODEL_CASCADE', False)
+    service = make_service()
+    results = analyze(service)
+    assert sorted(service.calls) == ['medgemma_clinical', 'medgemma_image']
+    assert set(results['cascade']['stages_run']) == {'legacy_cnn', 'expert_system', 'medgemma_image', 'medgemma_clinical'}
+
+def test_medgemma_stages_run_concurrently(monkeypatch):
+    monkeypatch.setattr(settings, 'ENABLE_MODEL_CASCADE', False)
+    service = make_service(delay_s=0.3)
+    start = time.perf_counter()
+    results = analyze(service)
+    assert time.perf_counter() - start < 0.55
+    assert all(stage['status'] == 'ok' for stage in results['stages'].values())
+
+def test_slow_stage_times_out_without_blocking_the_others(monkeypatch):
+    monkeypatch.setattr(settings, 'ENABLE_MODEL_CASCADE', False)
+    monkeypatch.setitem(settings.ANALYSIS_STAGE_TIMEOUTS, 'medgemma_clinical', 0.05)
+    service = make_service(delay_s=0.2)
+    results = analyze(service)
+    assert results['stages']['medgemma_clinical']['status'] == 'timeout'
+    assert results['stages']['medgemma_image']['status'] == 'ok'
+    assert 'clinical_reasoning' not in results['medgemma_analysis']
+    assert results['combined_diagnosis']['consensus_level'] == 'high'
+
+def test_failing_stage_is_reported_and_the_analysis_completes():
+    service = make_service(legacy_confidence=0.6)
+
+    def broken(image):
+        raise RuntimeError("CUDA out of memory")
+
+    service._legacy_model_analysis = broken
+    results = analyze(service)
+    assert results['stages']['legacy_cnn']['status'] == 'error'
+    assert results['stages']['legacy_cnn']['error'] == 'CUDA out of memory'
+    # Without a legacy verdict the image stage is not skippable
+    assert 'medgemma_image' in service.calls
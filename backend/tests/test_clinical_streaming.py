@@ -0,0 +1,79 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent))
+sys.path.append(str(Path(__file__).parent.parent.parent / 'ml_models'))
+
+pytest.importorskip("torch")
+
+from app.services.ai_service import MedGemmaService
+from app.services.inference.cache import ResultCache
+from app.services.inference.metrics import Histogram
+from app.services.inference.streaming import sse_frame
+from app.services.llm.base import MULTIMODAL, TEXT
+from app.services.llm.fake import FakeBackend
+
+GENERATION = {'max_length': {MULTIMODAL: 2048, TEXT: 3072}, 'temperature': 0.2, 'top_p': 0.9, 'do_sample': False}
+SYMPTOMS = [{'name': 'cough', 'severity': 'moderate'}, {'name': 'fever', 'severity': 'severe'}]
+VITALS = {'temperature': 39.1, 'heart_rate': 104}
+
+def make_service(do_sample=False):
+    """MedGemmaService on the fake LLM backend with a response cache, without the legacy models"""
+    service = MedGemmaService.__new__(MedGemmaService)
+    service.generation_params = {**GENERATION, 'do_sample': do_sample}
+    service.backend = FakeBackend(
+        service.generation_params, {MULTIMODAL: 'fake/multimodal', TEXT: 'fake/text'}, tokens_per_second=5000
+    )
+    service.ttft_ms = {'image_analysis': Histogram(), 'clinical_reasoning': Histogram()}
+    service.response_cache = ResultCache('medgemma_clinical_reasoning', max_entries=8)
+    service.response_cache_bypasses = 0
+    return service
+
+def collect(service):
+    async def run():
+        return [event async for event in service.stream_clinical_reasoning(symptoms=SYMPTOMS, vital_signs=VITALS)]
+    return asyncio.run(run())
+
+def test_stream_sends_tokens_then_the_parsed_result():
+    events = collect(make_service())
+    assert [event['event'] for event in events[:-1]] == ['token'] * (len(events) - 1) and len(events) > 2
+    result = events[-1]
+    assert result['event'] == 'result' and not result['data']['cached']
+    assert 'raw_response' not in result['data']['analysis'] and result['data']['ttft_ms'] is not None
+
+def test_streamed_result_is_shared_with_later_streams_and_the_blocking_path():
+    service = make_service()
+    streamed = collect(service)[-1]['data']['analysis']
+
+    replayed = collect(service)
+    assert [event['event'] for event in replayed] == ['result']
+    assert replayed[0]['data']['cached'] and replayed[0]['data']['analysis'] == streamed
+    assert asyncio.run(service._medgemma_clinical_reasoning(SYMPTOMS, VITALS)) == streamed
+    assert service.response_cache.get_metrics()['hits'] == 2
+
+def test_sampled_streams_bypass_the_cache(monkeypatch):
+    monkeypatch.setattr('app.core.config.settings.LLM_RESPONSE_CACHE_SAMPLED', False)
+    service = make_service(do_sample=True)
+    collect(service)
+    assert collect(service)[0]['event'] == 'token'
+    assert service.response_cache_bypasses == 2 and service.response_cache.get_metrics()['entries'] == 0
+
+def parse_sse(body):
+    events = []
+    for frame in body.split("\n\n")[:-1]:
+        fields = dict(line.split(": ", 1) for line in frame.split("\n"))
+        events.append({'event': fields['event'], 'data': json.loads(fields['data'])})
+    return events
+
+def test_sse_frames_round_trip_the_stream():
+    events = collect(make_service())
+    events.insert(1, {'event': 'token', 'data': '{\n  "primary_diagnosis":\n\n'})
+    body = ''.join(sse_frame(event) for event in events)
+    assert body.endswith("\n\n")
+    # Newlines inside a token are escaped, so every frame is exactly two lines
+    assert all(frame.count("\n") == 1 for frame in body.split("\n\n")[:-1])
+    assert parse_sse(body) == events
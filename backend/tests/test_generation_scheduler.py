@@ -0,0 +1,91 @@
+import os
+import sys
+from concurrent.futures import wait
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+
+from app.services.inference.generation import GenerationScheduler
+from app.services.inference.lazy import LazyModel
+from app.services.inference.prefix_cache import PrefixCache
+
+from tiny_lm import tiny_model, tiny_tokenizer
+
+# A tiny random GPT-2 built offline by default; name a Hub model to benchmark with something closer to production
+MODEL_NAME = os.environ.get("GENERATION_TEST_MODEL")
+
+PROMPTS = [
+    "Patient presents with fever and cough for three days.",
+    "Chest pain.",
+    "A 64 year old with shortness of breath, oxygen saturation 91 percent, history of COPD and smoking.",
+    "Headache",
+    "Rash on both arms after starting a new antibiotic last week, no fever.",
+]
+MAX_NEW_TOKENS = [8, 16, 5, 12, 9]
+PREFIX = "Clinical case analysis. List the most likely diagnoses and the next tests to order.\n"
+
+@pytest.fixture(scope="module")
+def tiny_lm():
+    if not MODEL_NAME:
+        tokenizer = tiny_tokenizer()
+        return tokenizer, tiny_model(tokenizer)
+    tokenizer = transformers.AutoTokenizer.from_pretrained(MODEL_NAME)
+    # float64 keeps padded and unpadded forward passes numerically identical for argmax
+    model = transformers.AutoModelForCausalLM.from_pretrained(MODEL_NAME).double().eval()
+    return tokenizer, model
+
+def make_scheduler(tiny_lm, **kwargs):
+    tokenizer, model = tiny_lm
+    return GenerationScheduler(LazyModel(MODEL_NAME or 'tiny-gpt2', lambda: model), lambda: tokenizer, **kwargs)
+
+def generate_alone(tiny_lm, prompt, max_new_tokens):
+    tokenizer, model = tiny_lm
+    inputs = tokenizer(prompt, return_tensors="pt")
+    with torch.no_grad():
+        outputs = model.generate(
+            **inputs,
+            max_new_tokens=max_new_tokens,
+            do_sample=False,
+            pad_token_id=tokenizer.eos_token_id
+        )
+    return tokenizer.decode(outputs[0, inputs['input_ids'].shape[1]:], skip_special_tokens=True)
+
+def test_batched_output_matches_sequential_generate(tiny_lm):
+    """Five prompts through a batch of three: later prompts join while earlier ones are decoding"""
+    scheduler = make_scheduler(tiny_lm, max_batch_size=3)
+    futures = [scheduler.submit(p, max_new_tokens=n) for p, n in zip(PROMPTS, MAX_NEW_TOKENS)]
+    results = [f.result(timeout=60) for f in futures]
+    scheduler.shutdown()
+
+    expected = [generate_alone(tiny_lm, p, n) for p, n in zip(PROMPTS, MAX_NEW_TOKENS)]
+    assert results == expected
+    assert scheduler.get_metrics()['batch_size']['max'] > 1
+
+def test_token_budget_limits_batch(tiny_lm):
+    """A budget smaller than two sequences forces them to run one at a time"""
+    scheduler = make_scheduler(tiny_lm, max_batch_size=4, max_tokens_in_flight=30)
+    futures = [scheduler.submit(p, max_new_tokens=10) for p in PROMPTS[:3]]
+    wait(futures, timeout=60)
+    scheduler.shutdown()
+
+    assert all(f.exception() is None for f in futures)
+    assert scheduler.get_metrics()['batch_size']['max'] == 1
+
+def test_prefix_cache_matches_full_prefill(tiny_lm):
+    """Prompts that share a cached preamble decode exactly as if the whole prompt were prefilled"""
+    prefix_cache = PrefixCache(max_bytes=64 * 1024 * 1024)
+    scheduler = make_scheduler(tiny_lm, max_batch_size=3, prefix_cache=prefix_cache)
+    prompts = [PREFIX + p for p in PROMPTS]
+    futures = [scheduler.submit(p, max_new_tokens=n, prefix=PREFIX) for p, n in zip(prompts, MAX_NEW_TOKENS)]
+    results = [f.result(timeout=60) for f in futures]
+    scheduler.shutdown()
+
+    expected = [generate_alone(tiny_lm, p, n) for p, n in zip(prompts, MAX_NEW_TOKENS)]
+    assert results == expected
+    metrics = prefix_cache.get_metrics()
+    assert metrics['misses'] == 1 and metrics['hits'] >= 1
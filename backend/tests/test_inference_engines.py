@@ -0,0 +1,103 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+torch = pytest.importorskip("torch")
+
+from app.services.inference.engines import (
+    EagerEngine, QuantizedEngine, TorchScriptEngine, artifact_path, build_engine
+)
+
+CPU = torch.device('cpu')
+
+def tiny_classifier():
+    torch.manual_seed(0)
+    return torch.nn.Sequential(
+        torch.nn.Conv2d(3, 4, kernel_size=3, stride=2),
+        torch.nn.ReLU(),
+        torch.nn.AdaptiveAvgPool2d(1),
+        torch.nn.Flatten(),
+        torch.nn.Linear(4, 2)
+    ).eval()
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    model = tiny_classifier()
+    path = tmp_path / "best_model.pth"
+    torch.save(model.state_dict(), path)
+    return str(path), model
+
+def export_torchscript(model, checkpoint_path):
+    example = torch.randn(1, 3, 32, 32)
+    traced = torch.jit.freeze(torch.jit.trace(model, example))
+    traced.save(artifact_path(checkpoint_path, 'torchscript'))
+
+def test_artifact_path_sits_next_to_the_checkpoint():
+    assert artifact_path('/models/pneumonia/best_model.pth', 'torchscript') == '/models/pneumonia/best_model.torchscript.pt'
+    assert artifact_path('/models/pneumonia/best_model.pth', 'onnx') == '/models/pneumonia/best_model.onnx'
+
+def test_eager_engine_reports_size_and_runs(checkpoint):
+    _, model = checkpoint
+    engine = build_engine('eager', 'unused.pth', lambda: model, CPU)
+    assert isinstance(engine, EagerEngine)
+    assert engine.nbytes == sum(p.numel() * p.element_size() for p in model.parameters())
+    assert engine(torch.randn(2, 3, 32, 32)).shape == (2, 2)
+
+def test_torchscript_engine_matches_eager(checkpoint):
+    path, model = checkpoint
+    export_torchscript(model, path)
+    batch = torch.randn(4, 3, 32, 32)
+    engine = build_engine('torchscript', path, lambda: model, CPU)
+    assert isinstance(engine, TorchScriptEngine)
+    with torch.no_grad():
+        expected = model(batch)
+    assert torch.allclose(engine(batch), expected, atol=1e-5)
+
+def test_onnx_engine_matches_eager(checkpoint):
+    pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    path, model = checkpoint
+    example = torch.randn(1, 3, 32, 32)
+    torch.onnx.export(
+        model, example, artifact_path(path, 'onnx'),
+        input_names=['input'], output_names=['logits'],
+        dynamic_axes={'input': {0: 'batch'}, 'logits': {0: 'batch'}}
+    )
+    batch = torch.randn(3, 3, 32, 32)
+    engine = build_engine('onnx', path, lambda: model, CPU)
+    with torch.no_grad():
+        expected = model(batch)
+    assert torch.allclose(engine(batch), expected, atol=1e-4)
+
+def test_int8_precision_serves_the_quantized_graph(checkpoint):
+    """precision='int8' loads the quantized artifact whatever the fp32 engine, within quantization error"""
+    path, model = checkpoint
+    quantized = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    example = torch.randn(1, 3, 32, 32)
+    torch.jit.freeze(torch.jit.trace(quantized, example)).save(artifact_path(path, 'int8'))
+    batch = torch.randn(4, 3, 32, 32)
+    engine = build_engine('onnx', path, lambda: model, CPU, precision='int8')
+    assert isinstance(engine, QuantizedEngine)
+    with torch.no_grad():
+        expected = model(batch)
+    assert torch.allclose(engine(batch), expected, atol=0.05)
+
+def test_missing_int8_artifact_names_the_quantize_script(checkpoint):
+    path, model = checkpoint
+    with pytest.raises(FileNotFoundError, match="quantize_model.py"):
+        build_engine('eager', path, lambda: model, CPU, precision='int8')
+
+def test_missing_artifact_names_the_export_script(checkpoint):
+    path, model = checkpoint
+    with pytest.raises(FileNotFoundError, match="export_model.py"):
+        build_engine('torchscript', path, lambda: model, CPU)
+
+def test_unsupported_engine_and_precision(checkpoint):
+    path, model = checkpoint
+    with pytest.raises(ValueError):
+        build_engine('tensorrt', path, lambda: model, CPU)
+    with pytest.raises(ValueError):
+        build_engine('eager', path, lambda: model, CPU, precision='fp16')
@@ -0,0 +1,61 @@
+import asyncio
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.inference.executor import InferenceExecutor, InferenceQueueFullError
+
+def test_run_returns_result_off_the_event_loop():
+    executor = InferenceExecutor({'vision': 2})
+
+    async def run():
+        loop_thread = threading.get_ident()
+        worker_thread = await executor.run('vision', threading.get_ident)
+        return loop_thread, worker_thread, await executor.run('vision', pow, 2, 10)
+
+    loop_thread, worker_thread, result = asyncio.run(run())
+    executor.shutdown()
+    assert worker_thread != loop_thread
+    assert result == 1024
+
+def test_exceptions_propagate_to_the_caller():
+    executor = InferenceExecutor({'vision': 1})
+
+    def fail():
+        raise ValueError("bad image")
+
+    with pytest.raises(ValueError):
+        executor.submit('vision', fail).result(timeout=5)
+    executor.shutdown()
+
+def test_full_pool_rejects_new_work():
+    executor = InferenceExecutor({'vision': 1}, max_queue=1)
+    release = threading.Event()
+    started = threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    running = executor.submit('vision', block)
+    assert started.wait(5)
+    queued = executor.submit('vision', block)
+    with pytest.raises(InferenceQueueFullError):
+        executor.submit('vision', block)
+    release.set()
+    running.result(timeout=5)
+    queued.result(timeout=5)
+    executor.shutdown()
+    metrics = executor.get_metrics('vision')
+    assert metrics['rejected'] == 1
+    assert metrics['completed'] == 2
+
+def test_unknown_pool_is_created_on_demand():
+    executor = InferenceExecutor({})
+    assert executor.submit('preprocess', len, [1, 2, 3]).result(timeout=5) == 3
+    assert executor.get_metrics('preprocess')['workers'] == 1
+    executor.shutdown()
@@ -0,0 +1,95 @@
+import os
+import sys
+from concurrent.futures import Future
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent))
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+torch = pytest.importorskip("torch")
+np = pytest.importorskip("numpy")
+pytest.importorskip("torchvision")
+
+from app.services.inference.workers import InferenceWorkerPool, slim_checkpoint_path, write_slim_checkpoint
+from ml_models.disease_classifiers.pneumonia.training.pneumonia_classifier import get_model
+from ml_models.disease_classifiers.pneumonia.training.preprocessing import Preprocessor
+
+# The smallest of the supported architectures keeps worker start-up and weight files cheap
+ARCHITECTURE = 'efficientnet_b0'
+
+@pytest.fixture(scope="module")
+def checkpoint(tmp_path_factory):
+    torch.manual_seed(0)
+    model = get_model(ARCHITECTURE, num_classes=2, pretrained=False).eval()
+    path = tmp_path_factory.mktemp("models") / "best_model.pth"
+    torch.save({'model_type': ARCHITECTURE, 'model_state_dict': model.state_dict(), 'optimizer_state_dict': {}}, path)
+    return str(path), model
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = InferenceWorkerPool(num_workers=2, threads_per_worker=1)
+    yield pool
+    pool.shutdown()
+
+def images(n):
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 256, (224, 224, 3), dtype=np.uint8) for _ in range(n)]
+
+def test_slim_checkpoint_drops_training_state(checkpoint):
+    path, model = checkpoint
+    slim_path = write_slim_checkpoint(path, ARCHITECTURE)
+    assert slim_path == slim_checkpoint_path(path, ARCHITECTURE)
+    slim = torch.load(slim_path, map_location='cpu')
+    assert set(slim) == {'model_type', 'model_state_dict'}
+    assert slim['model_state_dict'].keys() == model.state_dict().keys()
+    mtime = os.path.getmtime(slim_path)
+    assert write_slim_checkpoint(path, ARCHITECTURE) == slim_path
+    assert os.path.getmtime(slim_path) == mtime
+
+def test_slim_checkpoint_rejects_the_wrong_architecture(checkpoint, tmp_path):
+    path, _ = checkpoint
+    # Even with a fresh slim copy of the right architecture already written
+    write_slim_checkpoint(path, ARCHITECTURE)
+    with pytest.raises(ValueError):
+        write_slim_checkpoint(path, 'resnet50')
+    with pytest.raises(FileNotFoundError):
+        write_slim_checkpoint(str(tmp_path / "missing.pth"), ARCHITECTURE)
+
+def test_worker_probabilities_match_the_in_process_model(pool, checkpoint):
+    path, model = checkpoint
+    batch = images(3)
+    probabilities = pool.submit('pneumonia/efficientnet_b0/v1', ARCHITECTURE, path, batch).result(timeout=120)
+    with torch.no_grad():
+        expected = torch.softmax(model(Preprocessor(pin_memory=False).batch(batch)), dim=1).numpy()
+    assert probabilities.shape == (3, 2)
+    assert np.allclose(probabilities, expected, atol=1e-4)
+    assert pool.get_metrics()['in_flight'] == 0
+
+def test_dead_worker_fails_only_its_own_batches(pool, checkpoint):
+    path, _ = checkpoint
+    # Both workers have just replied, so the kill lands right after a result was sent
+    warm = [pool.submit('pneumonia/efficientnet_b0/v1', ARCHITECTURE, path, images(1)) for _ in range(2)]
+    assert all(f.result(timeout=120).shape == (1, 2) for f in warm)
+    # Stand-ins for batches in flight on each worker
+    lost, survivor = Future(), Future()
+    with pool._lock:
+        pool._pending[-1] = (0, lost)
+        pool._pending[-2] = (1, survivor)
+    restarts = pool.get_metrics()['restarts']
+
+    pool._processes[0].kill()
+    with pytest.raises(RuntimeError):
+        lost.result(timeout=30)
+    assert not survivor.done()
+    with pool._lock:
+        pool._pending.pop(-2)
+    assert pool.get_metrics()['restarts'] == restarts + 1
+
+    # Batches queue on the replacement until it is up; the surviving worker keeps serving
+    futures = [
+        pool.submit('pneumonia/efficientnet_b0/v1', ARCHITECTURE, path, images(1)) for _ in range(4)
+    ]
+    assert all(f.result(timeout=120).shape == (1, 2) for f in futures)
+    assert pool.get_metrics()['alive'] == 2
@@ -0,0 +1,211 @@
+import asyncio
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.jobs import runner as runner_module
+from app.services.jobs.runner import JobRunner
+from app.services.jobs.store import FAILED, QUEUED, RUNNING, SUCCEEDED, JobStore
+
+@pytest.fixture
+def store(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    yield store
+    store.close()
+
+def test_job_lifecycle(store):
+    job, created = store.enqueue('analysis', {'symptoms': ['cough']}, owner='user:1')
+    assert created and job['status'] == QUEUED
+    claimed = store.claim(['analysis'])
+    assert claimed['id'] == job['id'] and claimed['status'] == RUNNING and claimed['attempts'] == 1
+    assert store.claim(['analysis']) is None
+    store.complete(job['id'], {'diagnosis': 'Pneumonia'})
+    finished = store.get(job['id'])
+    assert finished['status'] == SUCCEEDED and finished['result'] == {'diagnosis': 'Pneumonia'}
+
+def test_idempotency_key_is_scoped_to_owner(store):
+    first, _ = store.enqueue('analysis', {}, owner='user:1', idempotency_key='upload-1')
+    again, created = store.enqueue('analysis', {}, owner='user:1', idempotency_key='upload-1')
+    other, other_created = store.enqueue('analysis', {}, owner='user:2', idempotency_key='upload-1')
+    assert not created and again['id'] == first['id']
+    assert other_created and other['id'] != first['id']
+
+def test_failed_run_is_retried_until_attempts_run_out(store):
+    job, _ = store.enqueue('analysis', {}, max_attempts=2)
+    store.claim(['analysis'])
+    assert store.fail(job['id'], "timeout", retry_delay=60) == QUEUED
+    # Not runnable until the backoff has elapsed
+    assert store.claim(['analysis']) is None
+    store._db.execute("UPDATE jobs SET available_at = 0 WHERE id = ?", (job['id'],))
+    assert store.claim(['analysis'])['attempts'] == 2
+    assert store.fail(job['id'], "timeout", retry_delay=60) == FAILED
+    assert store.get(job['id'])['error'] == "timeout"
+
+def test_only_expired_leases_are_requeued(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    store = JobStore(path, lease_s=60)
+    job, _ = store.enqueue('analysis', {})
+    store.claim(['analysis'])
+
+    # Another process sharing the queue must not take a job whose worker is alive
+    other = JobStore(path)
+    assert other.requeue_expired() == 0
+    store._db.execute("UPDATE jobs SET lease_expires_at = 0 WHERE id = ?", (job['id'],))
+    store._db.commit()
+    assert other.requeue_expired() == 1
+    assert other.claim(['analysis'])['lease_owner'] == other.worker_id
+
+    # The first worker has lost the job; its outcome is not recorded
+    assert store.heartbeat([job['id']]) == 0
+    assert not store.complete(job['id'], 'stale')
+    assert store.fail(job['id'], "stale") is None
+    assert other.complete(job['id'], 'done')
+    assert other.get(job['id'])['result'] == 'done'
+    store.close()
+    other.close()
+
+def test_heartbeat_extends_the_lease(store):
+    job, _ = store.enqueue('analysis', {})
+    claimed = store.claim(['analysis'])
+    store._db.execute("UPDATE jobs SET lease_expires_at = 0 WHERE id = ?", (job['id'],))
+    assert store.heartbeat([job['id']]) == 1
+    assert store.get(job['id'])['lease_expires_at'] >= claimed['lease_expires_at']
+    assert store.requeue_expired() == 0
+
+def test_release_does_not_use_up_an_attempt(store):
+    job, _ = store.enqueue('analysis', {})
+    store.claim(['analysis'])
+    store.release(job['id'])
+    assert store.get(job['id'])['attempts'] == 0
+    assert store.claim(['analysis'])['attempts'] == 1
+
+def run_jobs(path, handler, submissions=1, **kwargs):
+    """Start a runner, submit jobs, wait for them to finish; returns the finished jobs and the runner"""
+    async def run():
+        runner = JobRunner(path, **kwargs)
+        runner.register('analysis', handler)
+        await runner.start()
+        try:
+            jobs = [(await runner.submit('analysis', {'n': i}))[0] for i in range(submissions)]
+            return [await runner.wait(job['id'], timeout=10) for job in jobs], runner
+        finally:
+            await runner.stop()
+    return asyncio.run(run())
+
+def test_runner_retries_a_failing_handler(tmp_path):
+    attempts = []
+
+    async def flaky(payload):
+        attempts.append(payload)
+        if len(attempts) == 1:
+            raise RuntimeError("model busy")
+        return {'ok': True}
+
+    (job,), runner = run_jobs(str(tmp_path / "jobs.sqlite3"), flaky, max_attempts=2, retry_backoff_s=0.01)
+    assert job['status'] == SUCCEEDED and job['attempts'] == 2
+    assert runner.retried == 1 and runner.completed == 1
+
+def test_runner_fails_after_the_last_attempt(tmp_path):
+    async def broken(payload):
+        raise ValueError("bad payload")
+
+    (job,), runner = run_jobs(str(tmp_path / "jobs.sqlite3"), broken, max_attempts=2, retry_backoff_s=0.01)
+    assert job['status'] == FAILED and job['error'] == "bad payload"
+    assert runner.failed == 1
+
+def test_runner_times_out_slow_handlers(tmp_path):
+    async def slow(payload):
+        await asyncio.sleep(5)
+
+    (job,), _ = run_jobs(str(tmp_path / "jobs.sqlite3"), slow, timeout_s=0.05)
+    assert job['status'] == FAILED and job['error'] == "TimeoutError"
+
+def test_worker_survives_queue_errors(tmp_path, monkeypatch):
+    monkeypatch.setattr(runner_module, 'STORE_RETRY_SECONDS', 0.01)
+    real_claim = JobStore.claim
+    failures = []
+
+    def locked_once(self, kinds):
+        if not failures:
+            failures.append(1)
+            raise sqlite3.OperationalError("database is locked")
+        return real_claim(self, kinds)
+
+    monkeypatch.setattr(JobStore, 'claim', locked_once)
+
+    async def handler(payload):
+        return payload['n']
+
+    jobs, _ = run_jobs(str(tmp_path / "jobs.sqlite3"), handler, submissions=3)
+    assert failures == [1]
+    assert [job['result'] for job in jobs] == [0, 1, 2]
+
+def test_stop_returns_running_jobs_to_the_queue(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+
+    async def interrupted():
+        started = asyncio.Event()
+
+        async def hang(payload):
+            started.set()
+            await asyncio.sleep(60)
+
+        runner = JobRunner(path)
+        runner.register('analysis', hang)
+        await runner.start()
+        job, _ = await runner.submit('analysis', {})
+        await asyncio.wait_for(started.wait(), 5)
+        await runner.stop()
+        return job
+
+    job = asyncio.run(interrupted())
+    store = JobStore(path)
+    requeued = store.get(job['id'])
+    store.close()
+    assert requeued['status'] == QUEUED and requeued['attempts'] == 0
+
+    async def resume(payload):
+        return 'done'
+
+    async def restart():
+        runner = JobRunner(path)
+        runner.register('analysis', resume)
+        await runner.start()
+        try:
+            return await runner.wait(job['id'], timeout=10)
+        finally:
+            await runner.stop()
+
+    assert asyncio.run(restart())['result'] == 'done'
+
+def test_runner_recovers_jobs_of_a_dead_runner_and_prunes(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    dead = JobStore(path, lease_s=0.1)
+    job, _ = dead.enqueue('analysis', {})
+    dead.claim(['analysis'])
+    finished, _ = dead.enqueue('analysis', {})
+    dead._db.execute(
+        "UPDATE jobs SET status = ?, finished_at = 0 WHERE id = ?", (SUCCEEDED, finished['id'])
+    )
+    dead._db.commit()
+    dead.close()
+
+    async def handler(payload):
+        return 'recovered'
+
+    async def run():
+        runner = JobRunner(path, lease_s=0.3, retention_s=60)
+        runner.register('analysis', handler)
+        await runner.start()
+        try:
+            return await runner.wait(job['id'], timeout=10), await runner.get(finished['id']), runner
+        finally:
+            await runner.stop()
+
+    recovered, pruned, runner = asyncio.run(run())
+    assert recovered['result'] == 'recovered' and runner.recovered == 1
+    assert pruned is None
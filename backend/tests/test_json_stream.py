@@ -0,0 +1,77 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.inference.json_stream import JsonObjectTracker, parse_json_object
+
+SCHEMA = {'primary_diagnosis': (str, dict), 'differential_diagnoses': list, 'urgency_level': (int, float, str)}
+RESPONSE = '{"primary_diagnosis": {"disease": "Pneumonia", "note": "brace } in \\"quotes\\""}, "differential_diagnoses": ["Bronchitis", "TB"], "urgency_level": 3}'
+
+def test_tracker_completes_exactly_when_the_object_closes():
+    tracker = JsonObjectTracker(SCHEMA)
+    text = 'Here is the analysis:\n```json\n' + RESPONSE + '\n```\nLet me know if you need more.'
+    closed_at = None
+    for i, ch in enumerate(text):
+        if tracker.feed(ch):
+            closed_at = i
+            break
+    assert closed_at == text.index(RESPONSE) + len(RESPONSE) - 1
+    assert json.loads(tracker.text) == json.loads(RESPONSE)
+
+def test_braces_inside_strings_do_not_close_the_object():
+    tracker = JsonObjectTracker()
+    assert not tracker.feed('{"note": "a } and a ] and {"')
+    assert tracker.feed(', "n": 1}')
+
+def test_chunked_feed_matches_whole_feed():
+    whole = JsonObjectTracker(SCHEMA)
+    whole.feed(RESPONSE)
+    chunked = JsonObjectTracker(SCHEMA)
+    for start in range(0, len(RESPONSE), 7):
+        chunked.feed(RESPONSE[start:start + 7])
+    assert chunked.complete and chunked.text == whole.text
+    assert chunked.keys == whole.keys == ['primary_diagnosis', 'differential_diagnoses', 'urgency_level']
+
+def test_validate_reports_schema_violations():
+    source, tracker = parse_json_object('{"primary_diagnosis": 5, "extra": true}', SCHEMA)
+    errors = tracker.validate(json.loads(source))
+    assert "Missing field: differential_diagnoses" in errors
+    assert "Field primary_diagnosis has type int" in errors
+    assert "Unexpected field: extra" in errors
+
+def test_truncated_output_is_not_an_object():
+    source, tracker = parse_json_object(RESPONSE[:-10], SCHEMA)
+    assert source is None
+    assert not tracker.complete
+
+class CharTokenizer:
+    """One token per character of ``vocab``"""
+
+    def __init__(self, vocab):
+        self.vocab = vocab
+
+    def decode(self, token_ids, skip_special_tokens=False):
+        return ''.join(self.vocab[i] for i in token_ids)
+
+def test_stopping_criteria_stops_generation_at_the_closing_brace():
+    torch = pytest.importorskip("torch")
+    pytest.importorskip("transformers")
+    from app.services.llm.local import JsonObjectStoppingCriteria
+
+    prompt = 'Q?'
+    output = 'Sure: ' + RESPONSE + ' trailing text'
+    text = prompt + output
+    vocab = sorted(set(text))
+    ids = [vocab.index(ch) for ch in text]
+    criteria = JsonObjectStoppingCriteria(CharTokenizer(vocab), prompt_length=len(prompt), schema=SCHEMA)
+
+    stopped_at = None
+    for length in range(len(prompt) + 1, len(ids) + 1):
+        if criteria(torch.tensor([ids[:length]]), None)[0].item():
+            stopped_at = length
+            break
+    assert text[len(prompt):stopped_at] == 'Sure: ' + RESPONSE
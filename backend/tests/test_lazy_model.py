@@ -0,0 +1,69 @@
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+pytest.importorskip("torch")
+
+from app.services.inference.lazy import LazyModel
+
+class SlowLoader:
+    """Counts calls; the first ``failures`` calls raise"""
+
+    def __init__(self, delay_s=0.0, failures=0):
+        self.delay_s = delay_s
+        self.failures = failures
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        time.sleep(self.delay_s)
+        if self.calls <= self.failures:
+            raise RuntimeError("checkpoint not found")
+        return object()
+
+def test_concurrent_first_calls_share_one_load():
+    loader = SlowLoader(delay_s=0.1)
+    lazy = LazyModel('medgemma', loader)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(lazy.get())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert loader.calls == 1 and lazy.loads == 1
+    assert len(set(map(id, results))) == 1
+
+def test_failed_load_is_retried_by_the_next_caller():
+    loader = SlowLoader(failures=1)
+    lazy = LazyModel('medgemma', loader)
+    with pytest.raises(RuntimeError):
+        lazy.get()
+    assert not lazy.loaded
+    assert lazy.get() is not None and loader.calls == 2
+
+def test_model_in_use_is_not_unloaded():
+    unloaded = []
+    lazy = LazyModel('medgemma', SlowLoader(), on_unload=lambda: unloaded.append(True))
+    with lazy.use() as model:
+        assert model is not None
+        assert not lazy.unload()
+    assert lazy.unload()
+    assert unloaded == [True] and not lazy.loaded
+    assert lazy.get_status()['unloads'] == 1
+
+def test_idle_model_is_unloaded_and_reloaded_on_demand():
+    loader = SlowLoader()
+    lazy = LazyModel('medgemma', loader, idle_unload_s=0.5)
+    lazy.get()
+    deadline = time.monotonic() + 5
+    while lazy.loaded and time.monotonic() < deadline:
+        time.sleep(0.1)
+    assert not lazy.loaded and lazy.unloads == 1
+    with lazy.use():
+        pass
+    assert loader.calls == 2
@@ -0,0 +1,74 @@
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.inference.json_stream import parse_json_object
+from app.services.inference.streaming import TokenStream
+from app.services.llm.base import MULTIMODAL, TEXT, build_llm_backend
+from app.services.llm.fake import FakeBackend
+
+SCHEMA = {
+    'primary_diagnosis': (str, dict),
+    'differential_diagnoses': list,
+    'urgency_level': (int, float, str),
+    'warning_signs': (str, list)
+}
+GENERATION = {'max_length': {MULTIMODAL: 2048, TEXT: 3072}, 'temperature': 0.2, 'top_p': 0.9, 'do_sample': True}
+MODELS = {MULTIMODAL: 'fake/multimodal', TEXT: 'fake/text'}
+
+def make_backend(**kwargs):
+    return FakeBackend(GENERATION, MODELS, **kwargs)
+
+def test_fake_response_is_deterministic_and_valid():
+    backend = make_backend()
+    first = backend.submit(TEXT, "Fever and cough", schema=SCHEMA).result()
+    assert backend.submit(TEXT, "Fever and cough", schema=SCHEMA).result() == first
+    assert backend.submit(TEXT, "Chest pain", schema=SCHEMA).result() != first
+    source, tracker = parse_json_object(first, SCHEMA)
+    assert source is not None
+    assert tracker.validate(json.loads(source)) == []
+
+def test_fake_latency_and_token_rate():
+    backend = make_backend(latency_ms=100, tokens_per_second=500, response_tokens=50)
+    start = time.perf_counter()
+    backend.submit(TEXT, "Shortness of breath", schema=SCHEMA).result()
+    elapsed = time.perf_counter() - start
+    tokens = backend.get_status()['tokens_generated']
+    assert elapsed >= 0.1 + (tokens - 1) / 500
+
+def test_fake_stream_matches_result():
+    backend = make_backend(tokens_per_second=2000)
+
+    async def run():
+        stream = TokenStream(backend.get_tokenizer, asyncio.get_running_loop())
+        future = backend.submit(MULTIMODAL, "Chest X-ray", schema=SCHEMA, stream=stream)
+        future.add_done_callback(lambda _: stream.end())
+        deltas = [delta async for delta in stream]
+        return deltas, stream, future.result()
+
+    deltas, stream, result = asyncio.run(run())
+    assert len(deltas) > 1
+    assert ''.join(deltas) == result == stream.text
+    assert stream.ttft_ms is not None
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        build_llm_backend("nonexistent", GENERATION)
+
+def test_max_length_is_per_model_and_counts_the_prompt():
+    backend = FakeBackend(
+        {**GENERATION, 'max_length': {MULTIMODAL: 12, TEXT: 40}}, MODELS, response_tokens=100
+    )
+    prompt = "Fever and cough"
+    assert backend.generation_kwargs(TEXT)['max_length'] == 40
+    assert backend.get_status()['tokens_generated'] == 0
+    backend.submit(MULTIMODAL, prompt, schema=SCHEMA).result()
+    assert backend.get_status()['tokens_generated'] == 12 - 3
+    backend.submit(TEXT, prompt, schema=SCHEMA).result()
+    assert backend.get_status()['tokens_generated'] == 12 - 3 + 40 - 3
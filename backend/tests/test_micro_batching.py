@@ -0,0 +1,91 @@
+import sys
+import threading
+from concurrent.futures import wait
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.inference.batching import MicroBatcher
+from app.services.inference.priority import EMERGENCY_PRIORITY, ROUTINE_PRIORITY
+
+def double_all(key, items):
+    return [item * 2 for item in items]
+
+def test_concurrent_requests_share_a_batch():
+    """Requests submitted within the window run as one batched call, each getting its own result"""
+    calls = []
+
+    def batch_fn(key, items):
+        calls.append(list(items))
+        return double_all(key, items)
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=8, max_wait_ms=200)
+    futures = [batcher.submit('resnet50', i) for i in range(5)]
+    assert [f.result(timeout=5) for f in futures] == [0, 2, 4, 6, 8]
+    batcher.shutdown()
+    assert calls == [[0, 1, 2, 3, 4]]
+
+def test_full_batch_dispatches_before_the_window_closes():
+    batcher = MicroBatcher(double_all, max_batch_size=2, max_wait_ms=60_000)
+    futures = [batcher.submit('resnet50', i) for i in range(4)]
+    assert [f.result(timeout=5) for f in futures] == [0, 2, 4, 6]
+    batcher.shutdown()
+    assert batcher.get_metrics()['batch_size']['max'] == 2
+
+def test_keys_are_batched_separately():
+    seen = {}
+
+    def batch_fn(key, items):
+        seen.setdefault(key, []).extend(items)
+        return double_all(key, items)
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=8, max_wait_ms=50)
+    futures = [batcher.submit(key, i) for i, key in enumerate(['a', 'b', 'a', 'b'])]
+    wait(futures, timeout=5)
+    batcher.shutdown()
+    assert seen == {'a': [0, 2], 'b': [1, 3]}
+
+def test_batch_failure_reaches_every_caller():
+    def batch_fn(key, items):
+        raise ValueError("model crashed")
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=4, max_wait_ms=50)
+    futures = [batcher.submit('resnet50', i) for i in range(3)]
+    for future in futures:
+        with pytest.raises(ValueError):
+            future.result(timeout=5)
+    batcher.shutdown()
+
+def test_result_count_mismatch_fails_the_batch():
+    batcher = MicroBatcher(lambda key, items: items[:-1], max_batch_size=4, max_wait_ms=50)
+    futures = [batcher.submit('resnet50', i) for i in range(2)]
+    for future in futures:
+        with pytest.raises(RuntimeError):
+            future.result(timeout=5)
+    batcher.shutdown()
+
+def test_dispatch_receives_the_most_urgent_priority():
+    priorities = []
+
+    def dispatch(fn, priority):
+        priorities.append(priority)
+        threading.Thread(target=fn).start()
+
+    batcher = MicroBatcher(double_all, max_batch_size=3, max_wait_ms=200, dispatch=dispatch)
+    futures = [
+        batcher.submit('resnet50', 1, priority=ROUTINE_PRIORITY),
+        batcher.submit('resnet50', 2, priority=EMERGENCY_PRIORITY),
+        batcher.submit('resnet50', 3, priority=ROUTINE_PRIORITY)
+    ]
+    assert [f.result(timeout=5) for f in futures] == [2, 4, 6]
+    batcher.shutdown()
+    assert priorities == [EMERGENCY_PRIORITY]
+
+def test_shutdown_drains_queued_requests():
+    batcher = MicroBatcher(double_all, max_batch_size=1, max_wait_ms=0)
+    futures = [batcher.submit('resnet50', i) for i in range(10)]
+    batcher.shutdown()
+    assert all(f.done() for f in futures)
+    assert [f.result() for f in futures] == [i * 2 for i in range(10)]
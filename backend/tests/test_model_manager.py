@@ -0,0 +1,85 @@
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.inference.model_manager import ModelManager
+
+class Loader:
+    """Factory that counts constructions; ``warmups`` records what was warmed up"""
+
+    def __init__(self, delay_s=0.0, fail=False):
+        self.delay_s = delay_s
+        self.fail = fail
+        self.calls = 0
+        self.warmups = []
+
+    def __call__(self):
+        self.calls += 1
+        time.sleep(self.delay_s)
+        if self.fail:
+            raise FileNotFoundError("best_model.pth")
+        return object()
+
+    def warmup(self, instance):
+        self.warmups.append(instance)
+
+def preload(manager, names):
+    async def run():
+        manager.start(names)
+        await manager._task
+    asyncio.run(run())
+
+def test_preload_warms_up_before_reporting_ready():
+    manager = ModelManager()
+    loader = Loader()
+    manager.register('pneumonia/resnet50', loader, warmup=loader.warmup)
+    assert not manager.ready
+    preload(manager, ['pneumonia/resnet50'])
+    assert manager.ready
+    assert loader.calls == 1 and len(loader.warmups) == 1
+    status = manager.get_status()['components']['pneumonia/resnet50']
+    assert status['state'] == 'ready' and status['warmup_seconds'] is not None
+
+def test_concurrent_first_requests_share_one_load():
+    manager = ModelManager()
+    loader = Loader(delay_s=0.1)
+    manager.register('enhanced_ai', loader, warmup=loader.warmup)
+
+    async def first_requests():
+        return await asyncio.gather(*(manager.get('enhanced_ai') for _ in range(4)))
+
+    instances = asyncio.run(first_requests())
+    assert loader.calls == 1 and len({id(instance) for instance in instances}) == 1
+    # Loaded on demand, not warmed up: only a preload warms
+    assert loader.warmups == [] and manager.get_status()['components']['enhanced_ai']['state'] == 'loaded'
+
+def test_failed_or_unknown_preload_is_not_ready():
+    manager = ModelManager()
+    manager.register('pneumonia/resnet50', Loader(fail=True))
+    manager.register('pneumonia/densenet121', Loader())
+    preload(manager, ['pneumonia/resnet50', 'pneumonia/densenet121', 'pneumonia/vit'])
+    assert not manager.ready
+    components = manager.get_status()['components']
+    assert components['pneumonia/resnet50']['state'] == 'failed'
+    assert components['pneumonia/resnet50']['error'] == "best_model.pth"
+    # A failure does not stop the rest of the preload
+    assert components['pneumonia/densenet121']['state'] == 'ready'
+
+def test_stop_cancels_a_running_preload():
+    manager = ModelManager()
+    release = threading.Event()
+    manager.register('medgemma', lambda: release.wait(5))
+
+    async def run():
+        manager.start(['medgemma'])
+        await asyncio.sleep(0.05)
+        await manager.stop()
+        release.set()
+        return manager._task.cancelled()
+
+    assert asyncio.run(run())
+    assert not manager.ready
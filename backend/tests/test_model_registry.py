@@ -0,0 +1,107 @@
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.inference.registry import ModelKey, ModelRegistry
+
+MB = 1024 * 1024
+CHECKPOINTS = {
+    'pneumonia/resnet50/v1': 'pneumonia/resnet50_v1.pth',
+    'pneumonia/resnet50/v2': 'pneumonia/resnet50_v2.pth',
+    'pneumonia/densenet121/v1': 'pneumonia/densenet121_v1.pth',
+    'pneumonia/efficientnet_b0/v1': 'pneumonia/efficientnet_b0_v1.pth'
+}
+
+def make_registry(memory_budget_mb=0, loader=None):
+    loaded = []
+
+    def load(key, path):
+        loaded.append(key)
+        return {'key': key, 'path': path}
+
+    registry = ModelRegistry(
+        CHECKPOINTS,
+        loader or load,
+        memory_budget_mb=memory_budget_mb,
+        root='/models',
+        sizeof=lambda model: 40 * MB
+    )
+    return registry, loaded
+
+def test_resolve_defaults_to_last_listed_version():
+    registry, _ = make_registry()
+    assert registry.resolve('pneumonia', 'resnet50') == ModelKey('pneumonia', 'resnet50', 'v2')
+    assert registry.resolve('pneumonia', 'resnet50', 'v1') == ModelKey('pneumonia', 'resnet50', 'v1')
+    with pytest.raises(ValueError):
+        registry.resolve('pneumonia', 'vgg16')
+    with pytest.raises(ValueError):
+        registry.resolve('pneumonia', 'resnet50', 'v3')
+
+def test_get_loads_once_and_then_hits():
+    registry, loaded = make_registry()
+    key = registry.resolve('pneumonia', 'densenet121')
+    model = registry.get(key)
+    assert model['path'] == '/models/pneumonia/densenet121_v1.pth'
+    assert registry.get(key) is model
+    assert loaded == [key]
+    assert registry.get_metrics()['hits'] == 1
+
+def test_least_recently_used_model_is_evicted_over_budget():
+    registry, loaded = make_registry(memory_budget_mb=100)
+    resnet, densenet, efficientnet = (
+        registry.resolve('pneumonia', name) for name in ('resnet50', 'densenet121', 'efficientnet_b0')
+    )
+    registry.get(resnet)
+    registry.get(densenet)
+    registry.get(resnet)
+    registry.get(efficientnet)
+
+    assert not registry.is_resident(densenet)
+    assert registry.is_resident(resnet) and registry.is_resident(efficientnet)
+    assert registry.resident_bytes <= 100 * MB
+
+    registry.get(densenet)
+    assert loaded.count(densenet) == 2
+    assert registry.get_metrics()['evictions'] == 2
+
+def test_model_larger_than_budget_stays_resident():
+    registry, _ = make_registry(memory_budget_mb=10)
+    key = registry.resolve('pneumonia', 'resnet50')
+    registry.get(key)
+    assert registry.is_resident(key)
+
+def test_concurrent_requests_share_one_load():
+    calls = []
+
+    def slow_load(key, path):
+        calls.append(key)
+        time.sleep(0.1)
+        return object()
+
+    registry, _ = make_registry(loader=slow_load)
+    key = registry.resolve('pneumonia', 'resnet50')
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        models = list(pool.map(lambda _: registry.get(key), range(4)))
+    assert len(calls) == 1
+    assert all(model is models[0] for model in models)
+
+def test_failed_load_is_retried():
+    attempts = []
+
+    def flaky_load(key, path):
+        attempts.append(key)
+        if len(attempts) == 1:
+            raise FileNotFoundError(path)
+        return object()
+
+    registry, _ = make_registry(loader=flaky_load)
+    key = registry.resolve('pneumonia', 'resnet50')
+    with pytest.raises(FileNotFoundError):
+        registry.get(key)
+    assert registry.get(key) is not None
+    assert len(attempts) == 2
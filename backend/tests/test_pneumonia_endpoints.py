@@ -0,0 +1,103 @@
+import asyncio
+import io
+import json
+import sys
+import zipfile
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+pytest.importorskip("torch")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.endpoints import pneumonia
+from app.core.config import settings
+
+ENSEMBLE_RESULT = {
+    'prediction': 'PNEUMONIA',
+    'confidence': 0.8,
+    'probabilities': {'NORMAL': 0.2, 'PNEUMONIA': 0.8},
+    'models': {'resnet50': {'prediction': 'PNEUMONIA', 'confidence': 0.8, 'probabilities': {'NORMAL': 0.2, 'PNEUMONIA': 0.8}}},
+    'weights': {'resnet50': 1.0},
+    'skipped': {'densenet121': "No checkpoint registered for pneumonia/densenet121"},
+    'failed': {'efficientnet_b0': "CUDA out of memory"}
+}
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(pneumonia.router, prefix="/pneumonia")
+    return TestClient(app)
+
+def test_diagnose_reports_ensemble_members_left_out(client, monkeypatch):
+    calls = []
+
+    async def predict_bytes_async(data, model_type='resnet50', tenant=None, **kwargs):
+        calls.append(model_type)
+        return ENSEMBLE_RESULT
+
+    monkeypatch.setattr(pneumonia.pneumonia_service, 'predict_bytes_async', predict_bytes_async)
+    response = client.post(
+        "/pneumonia/diagnose",
+        files={'file': ('xray.png', b'png bytes', 'image/png')},
+        data={'model_type': 'ensemble'}
+    )
+    assert response.status_code == 200
+    assert calls == ['ensemble']
+    body = response.json()
+    assert body['skipped'] == ENSEMBLE_RESULT['skipped']
+    assert body['failed'] == ENSEMBLE_RESULT['failed']
+    assert body['weights'] == {'resnet50': 1.0}
+
+def zip_of(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+def test_diagnose_batch_streams_results_in_input_order(client, monkeypatch):
+    monkeypatch.setattr(settings, 'PNEUMONIA_BULK_MAX_IN_FLIGHT', 2)
+
+    async def predict_bytes_async(data, model_type='resnet50', tenant=None, rate_limit=True, **kwargs):
+        assert not rate_limit
+        if data == b'corrupt':
+            raise ValueError("Error processing image: cannot identify image file")
+        # Earlier images finish last, so results complete out of order
+        await asyncio.sleep(0.05 if data == b'a' else 0)
+        return {'prediction': 'NORMAL', 'confidence': 0.9, 'image': data.decode()}
+
+    monkeypatch.setattr(pneumonia.pneumonia_service, 'predict_bytes_async', predict_bytes_async)
+    archive = zip_of({'scans/b.png': b'b', 'scans/.hidden.png': b'x', 'scans/notes.txt': b'x', 'scans/c.jpg': b'corrupt'})
+    response = client.post(
+        "/pneumonia/diagnose-batch",
+        files=[('files', ('a.png', b'a', 'image/png')), ('files', ('batch.zip', archive, 'application/zip'))]
+    )
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('application/x-ndjson')
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [(line['index'], line['filename']) for line in lines[:-1]] == [
+        (0, 'a.png'), (1, 'scans/b.png'), (2, 'scans/c.jpg')
+    ]
+    assert lines[0]['image'] == 'a' and lines[1]['image'] == 'b'
+    assert 'cannot identify image file' in lines[2]['error']
+    summary = lines[-1]['summary']
+    assert summary['total'] == 3 and summary['succeeded'] == 2 and summary['failed'] == 1
+
+def test_unreadable_archive_is_reported_and_the_batch_continues(client, monkeypatch):
+    async def predict_bytes_async(data, **kwargs):
+        return {'prediction': 'NORMAL', 'confidence': 0.9}
+
+    monkeypatch.setattr(pneumonia.pneumonia_service, 'predict_bytes_async', predict_bytes_async)
+    response = client.post(
+        "/pneumonia/diagnose-batch",
+        files=[('files', ('broken.zip', b'not a zip', 'application/zip')), ('files', ('a.png', b'a', 'image/png'))]
+    )
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[0]['filename'] == 'broken.zip' and lines[0]['error'].startswith("Unreadable upload")
+    assert lines[1]['filename'] == 'a.png' and lines[1]['index'] == 1
+    assert lines[-1]['summary']['failed'] == 1
@@ -0,0 +1,64 @@
+import asyncio
+import io
+import sys
+import tempfile
+from concurrent.futures import Future
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+pytest.importorskip("torch")
+Image = pytest.importorskip("PIL.Image")
+np = pytest.importorskip("numpy")
+
+from app.services.pneumonia_service import PneumoniaService
+
+def xray_png(size=(300, 260)):
+    gradient = np.tile(np.arange(size[0], dtype=np.uint8), (size[1], 1))
+    buffer = io.BytesIO()
+    Image.fromarray(gradient).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+@pytest.fixture
+def service(monkeypatch):
+    """PneumoniaService whose inference records the decoded arrays instead of running a model"""
+    service = PneumoniaService()
+    service.cache = None
+    service.arrays = []
+
+    def infer(image_array, model_type, priority=None):
+        service.arrays.append(image_array)
+        future = Future()
+        future.set_result({'prediction': 'NORMAL', 'model_type': model_type, 'mean': float(image_array.mean())})
+        return future
+
+    monkeypatch.setattr(service, '_infer', infer)
+    return service
+
+def test_bytes_and_file_objects_decode_like_a_decoded_image(service):
+    raw = xray_png()
+    consumed = io.BytesIO(raw)
+    consumed.read()
+    spooled = tempfile.SpooledTemporaryFile(max_size=16)
+    spooled.write(raw)
+
+    expected = service.predict_image(Image.open(io.BytesIO(raw)))
+    # Already-read buffers and spooled uploads are rewound before decoding
+    for source in (raw, consumed, spooled):
+        assert service.predict_bytes(source) == expected
+    assert all(array.shape == (224, 224, 3) and array.dtype == np.uint8 for array in service.arrays)
+    assert all(np.array_equal(array, service.arrays[0]) for array in service.arrays)
+
+def test_invalid_upload_is_a_value_error(service):
+    with pytest.raises(ValueError):
+        service.predict_bytes(b"not an image")
+    assert service.arrays == []
+
+def test_async_prediction_decodes_in_memory(service, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    result = asyncio.run(service.predict_bytes_async(io.BytesIO(xray_png()), model_type='densenet121'))
+    assert result['model_type'] == 'densenet121' and len(service.arrays) == 1
+    # Nothing is staged on disk on the way
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,113 @@
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+torch = pytest.importorskip("torch")
+
+from app.services.inference.prefix_cache import PrefixCache, template_prefix
+
+PREFIX = "Clinical case analysis.\n"
+
+def tokenizer(text, add_special_tokens=True):
+    return {'input_ids': [ord(char) for char in text]}
+
+class FakeModel:
+    """Returns a one-layer cache per forward pass; blocks while ``gate`` is clear"""
+
+    device = torch.device('cpu')
+
+    def __init__(self, gate=None, fail=False):
+        self.gate = gate
+        self.fail = fail
+        self.calls = 0
+        self.started = threading.Event()
+
+    def __call__(self, input_ids, use_cache):
+        self.calls += 1
+        self.started.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.fail:
+            raise RuntimeError("CUDA out of memory")
+        states = torch.zeros(1, 1, input_ids.shape[1], 2)
+        return type('Outputs', (), {'past_key_values': ((states, states.clone()),)})()
+
+def test_prefix_state_is_reused():
+    cache = PrefixCache(max_bytes=1024 * 1024)
+    model = FakeModel()
+    first = cache.get('medgemma', model, tokenizer, PREFIX)
+    assert cache.get('medgemma', model, tokenizer, PREFIX) is first
+    assert model.calls == 1
+    past = first.past_key_values(batch_size=3)
+    assert past[0][0].shape == (3, 1, len(PREFIX), 2)
+    metrics = cache.get_metrics()
+    assert metrics['hits'] == 1 and metrics['misses'] == 1 and metrics['tokens_reused'] == len(PREFIX)
+
+def test_split_and_template_prefix():
+    cache = PrefixCache(max_bytes=1024)
+    assert template_prefix(PREFIX + "Symptoms: {symptoms}\n") == PREFIX
+    assert cache.split(tokenizer, PREFIX + "Fever", PREFIX) == (tokenizer(PREFIX)['input_ids'], [ord(c) for c in "Fever"])
+    assert cache.split(tokenizer, "Fever", PREFIX) is None
+    assert cache.split(tokenizer, PREFIX, PREFIX) is None
+
+def test_concurrent_misses_share_one_prefill_without_blocking_other_keys():
+    cache = PrefixCache(max_bytes=1024 * 1024)
+    gate = threading.Event()
+    slow = FakeModel(gate)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        waiting = [pool.submit(cache.get, 'medgemma', slow, tokenizer, PREFIX) for _ in range(3)]
+        assert slow.started.wait(5)
+        # A different key is served while the first prefill is still running
+        other = FakeModel()
+        assert cache.get('draft', other, tokenizer, PREFIX) is not None and other.calls == 1
+        gate.set()
+        entries = [future.result(timeout=5) for future in waiting]
+    assert slow.calls == 1
+    assert all(entry is entries[0] for entry in entries)
+    assert cache.get_metrics()['coalesced'] == 2
+
+def test_failed_prefill_reaches_waiters_and_is_not_cached():
+    cache = PrefixCache(max_bytes=1024 * 1024)
+    gate = threading.Event()
+    failing = FakeModel(gate, fail=True)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(cache.get, 'medgemma', failing, tokenizer, PREFIX)
+        assert failing.started.wait(5)
+        follower = pool.submit(cache.get, 'medgemma', failing, tokenizer, PREFIX)
+        while cache.get_metrics()['coalesced'] == 0:
+            time.sleep(0.01)
+        gate.set()
+        for future in (leader, follower):
+            with pytest.raises(RuntimeError):
+                future.result(timeout=5)
+    model = FakeModel()
+    cache.get('medgemma', model, tokenizer, PREFIX)
+    assert model.calls == 1
+
+def test_prefix_invalidated_while_prefilling_is_not_stored():
+    cache = PrefixCache(max_bytes=1024 * 1024)
+    gate = threading.Event()
+    slow = FakeModel(gate)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        pending = pool.submit(cache.get, 'medgemma', slow, tokenizer, PREFIX)
+        assert slow.started.wait(5)
+        cache.invalidate('medgemma')
+        gate.set()
+        assert pending.result(timeout=5) is not None
+    assert cache.get_metrics()['entries'] == 0 and cache.bytes == 0
+
+def test_entries_are_evicted_past_the_byte_budget():
+    # One prefix of len(PREFIX) tokens holds 2 float32 tensors of len(PREFIX) * 2 values
+    entry_bytes = 2 * len(PREFIX) * 2 * 4
+    cache = PrefixCache(max_bytes=entry_bytes)
+    model = FakeModel()
+    cache.get('medgemma', model, tokenizer, PREFIX)
+    cache.get('draft', model, tokenizer, PREFIX)
+    metrics = cache.get_metrics()
+    assert metrics['entries'] == 1 and metrics['evictions'] == 1 and metrics['bytes'] == entry_bytes
@@ -0,0 +1,59 @@
+import io
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+torch = pytest.importorskip("torch")
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+
+from ml_models.disease_classifiers.pneumonia.training.preprocessing import MEAN, STD, Preprocessor, decode_image
+
+def random_images(count, size=224, seed=0):
+    return list(np.random.default_rng(seed).integers(0, 256, (count, size, size, 3), dtype=np.uint8))
+
+def jpeg(size):
+    x, y = np.meshgrid(np.linspace(0, 255, size[0]), np.linspace(0, 255, size[1]))
+    buffer = io.BytesIO()
+    Image.fromarray(((x + y) / 2).astype(np.uint8)).convert('RGB').save(buffer, format='JPEG', quality=95)
+    buffer.seek(0)
+    return buffer
+
+def test_batch_matches_per_image_normalization():
+    images = random_images(3)
+    batch = Preprocessor(max_batch_size=4, pin_memory=False).batch(images)
+    mean = torch.tensor(MEAN).view(3, 1, 1)
+    std = torch.tensor(STD).view(3, 1, 1)
+    expected = torch.stack([(torch.from_numpy(image).permute(2, 0, 1).float() / 255 - mean) / std for image in images])
+    assert batch.shape == (3, 3, 224, 224) and batch.dtype == torch.float32
+    assert torch.allclose(batch, expected, atol=1e-5)
+
+def test_buffer_is_reused_per_thread():
+    preprocessor = Preprocessor(max_batch_size=4, pin_memory=False)
+    first = preprocessor.batch(random_images(2)).data_ptr()
+    assert preprocessor.batch(random_images(4, seed=1)).data_ptr() == first
+    # Oversized batches get their own tensor instead of growing the shared buffer
+    assert preprocessor.batch(random_images(5)).data_ptr() != first
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(preprocessor.batch(random_images(1)).data_ptr()))
+    thread.start()
+    thread.join()
+    assert other[0] != first
+
+def test_large_jpeg_draft_decode_matches_full_decode():
+    source = jpeg((2000, 1800))
+    draft = decode_image(source)
+    source.seek(0)
+    full = decode_image(source, draft=False)
+    assert draft.shape == full.shape == (224, 224, 3) and draft.dtype == np.uint8
+    assert np.abs(draft.astype(int) - full.astype(int)).mean() < 2
+
+def test_grayscale_is_resized_to_rgb():
+    image = Image.fromarray(np.zeros((512, 400), dtype=np.uint8))
+    array = Preprocessor(pin_memory=False).resize(image)
+    assert array.shape == (224, 224, 3) and array.dtype == np.uint8
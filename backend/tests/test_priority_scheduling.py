@@ -0,0 +1,77 @@
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.emergency.screening import triage_priority
+from app.services.inference.executor import InferenceExecutor
+from app.services.inference.priority import (
+    EMERGENCY_PRIORITY, ROUTINE_PRIORITY, PriorityQueue, clamp_priority, effective_priority
+)
+from app.services.jobs.store import JobStore
+
+def test_aging_raises_priority_but_never_to_emergency():
+    assert effective_priority(ROUTINE_PRIORITY, 0, 30) == ROUTINE_PRIORITY
+    assert effective_priority(ROUTINE_PRIORITY, 45, 30) == 2.5
+    assert effective_priority(ROUTINE_PRIORITY, 3600, 30) == EMERGENCY_PRIORITY - 1
+    assert effective_priority(2, 3600, 0) == 2
+    assert effective_priority(EMERGENCY_PRIORITY, 0, 30) == EMERGENCY_PRIORITY
+    assert clamp_priority(0) == ROUTINE_PRIORITY and clamp_priority(9) == EMERGENCY_PRIORITY
+
+def test_queue_orders_by_priority_then_arrival():
+    queue = PriorityQueue()
+    for item, priority in [('a', 1), ('b', 3), ('c', 1), ('d', 5), ('e', 3)]:
+        queue.push(item, priority)
+    assert queue.depth() == {'1': 2, '2': 0, '3': 2, '4': 0, '5': 1}
+    assert [queue.pop() for _ in range(5)] == ['d', 'b', 'e', 'a', 'c']
+
+def test_aged_work_overtakes_newer_higher_tiers_but_not_emergencies():
+    queue = PriorityQueue(aging_s=0.02)
+    queue.push('old routine', ROUTINE_PRIORITY)
+    time.sleep(0.1)
+    queue.push('new severe', 3)
+    queue.push('emergency', EMERGENCY_PRIORITY)
+    assert [queue.pop() for _ in range(3)] == ['emergency', 'old routine', 'new severe']
+
+def test_executor_runs_queued_emergencies_first():
+    executor = InferenceExecutor({'vision': 1})
+    release = threading.Event()
+    started = threading.Event()
+    order = []
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    executor.submit('vision', block)
+    assert started.wait(5)
+    futures = [
+        executor.submit('vision', order.append, name, priority=priority)
+        for name, priority in [('routine', ROUTINE_PRIORITY), ('severe', 3), ('emergency', EMERGENCY_PRIORITY)]
+    ]
+    release.set()
+    for future in futures:
+        future.result(timeout=5)
+    executor.shutdown()
+    assert order == ['emergency', 'severe', 'routine']
+    assert executor.get_metrics('vision')['queue_wait_ms_by_priority']['5']['count'] == 1
+
+def test_job_queue_claims_by_priority_with_aging(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"), aging_s=30)
+    routine, _ = store.enqueue('analysis', {}, priority=ROUTINE_PRIORITY)
+    severe, _ = store.enqueue('analysis', {}, priority=3)
+    emergency, _ = store.enqueue('analysis', {}, priority=EMERGENCY_PRIORITY)
+    # The routine job has been waiting long enough to age past the severe one
+    store._db.execute("UPDATE jobs SET available_at = available_at - 3600 WHERE id = ?", (routine['id'],))
+    assert [store.claim(['analysis'])['id'] for _ in range(3)] == [emergency['id'], routine['id'], severe['id']]
+    store.close()
+
+def test_triage_priority():
+    assert triage_priority() == ROUTINE_PRIORITY
+    assert triage_priority([{'name': 'cough', 'severity': 'mild'}]) == ROUTINE_PRIORITY
+    assert triage_priority([{'name': 'cough', 'severity': 'moderate'}, {'name': 'fever', 'severity': 'severe'}]) == 3
+    assert triage_priority([{'name': 'severe chest pain', 'severity': 'moderate'}]) == EMERGENCY_PRIORITY
+    assert triage_priority(vital_signs={'oxygen_saturation': 86}) == EMERGENCY_PRIORITY
+    assert triage_priority(vital_signs={'blood_pressure': '120/80', 'heart_rate': 88}) == ROUTINE_PRIORITY
@@ -0,0 +1,129 @@
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.inference.cache import ResultCache
+
+PREDICTION = {'prediction': 'PNEUMONIA', 'confidence': 0.93, 'probabilities': {'NORMAL': 0.07, 'PNEUMONIA': 0.93}}
+
+def test_hit_returns_an_independent_copy():
+    cache = ResultCache('predictions')
+    cache.put('sha256:abc|resnet50|v1', PREDICTION)
+    first = cache.get('sha256:abc|resnet50|v1')
+    first['prediction'] = 'NORMAL'
+    assert cache.get('sha256:abc|resnet50|v1') == PREDICTION
+    assert cache.get('sha256:def|resnet50|v1') is None
+    metrics = cache.get_metrics()
+    assert metrics['hits'] == 2 and metrics['misses'] == 1
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResultCache('predictions', max_entries=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.get_metrics()['evictions'] == 1
+
+def test_entries_expire_after_ttl():
+    cache = ResultCache('predictions', ttl_seconds=0.05)
+    cache.put('a', PREDICTION)
+    assert cache.get('a') == PREDICTION
+    time.sleep(0.1)
+    assert cache.get('a') is None
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    cache = ResultCache('predictions', disk_dir=str(tmp_path))
+    cache.put('a', PREDICTION)
+
+    restarted = ResultCache('predictions', disk_dir=str(tmp_path))
+    assert restarted.get('a') == PREDICTION
+    assert restarted.get('a') == PREDICTION
+    metrics = restarted.get_metrics()
+    assert metrics['disk_hits'] == 1 and metrics['hits'] == 1
+
+def test_clear_empties_both_tiers(tmp_path):
+    cache = ResultCache('predictions', disk_dir=str(tmp_path))
+    cache.put('a', PREDICTION)
+    cache.clear()
+    assert cache.get('a') is None
+    assert ResultCache('predictions', disk_dir=str(tmp_path)).get('a') is None
+
+def test_concurrent_misses_share_one_computation():
+    cache = ResultCache('llm_responses')
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {'primary_diagnosis': 'Pneumonia'}
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_compute('prompt-hash', compute) for _ in range(5)))
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(result == {'primary_diagnosis': 'Pneumonia'} for result in results)
+    assert cache.get_metrics()['coalesced'] == 4
+    assert cache.get('prompt-hash') == {'primary_diagnosis': 'Pneumonia'}
+
+def test_uncacheable_values_and_failures_are_not_stored():
+    cache = ResultCache('llm_responses')
+
+    async def unparsed():
+        return {'raw_response': 'not json'}
+
+    async def failing():
+        raise RuntimeError("generation failed")
+
+    async def run():
+        value = await cache.get_or_compute('a', unparsed, cacheable=lambda v: 'raw_response' not in v)
+        with pytest.raises(RuntimeError):
+            await cache.get_or_compute('b', failing)
+        return value
+
+    assert asyncio.run(run()) == {'raw_response': 'not json'}
+    assert cache.get('a') is None and cache.get('b') is None
+    assert cache.get_metrics()['in_flight'] == 0
+
+def test_cancelled_caller_does_not_cancel_the_computation():
+    cache = ResultCache('llm_responses')
+
+    async def compute():
+        await asyncio.sleep(0.05)
+        return 'done'
+
+    async def run():
+        impatient = asyncio.ensure_future(cache.get_or_compute('a', compute))
+        patient = asyncio.ensure_future(cache.get_or_compute('a', compute))
+        await asyncio.sleep(0.01)
+        impatient.cancel()
+        return await patient
+
+    assert asyncio.run(run()) == 'done'
+    assert cache.get('a') == 'done'
+
+def test_async_disk_access_runs_off_the_event_loop(tmp_path):
+    cache = ResultCache('predictions', max_entries=1, disk_dir=str(tmp_path))
+    threads = []
+    for name in ('_disk_get', '_disk_put'):
+        real = getattr(cache, name)
+        setattr(cache, name, lambda *args, real=real: threads.append(threading.current_thread().name) or real(*args))
+
+    async def roundtrip():
+        await cache.put_async('a', PREDICTION)
+        await cache.put_async('b', PREDICTION)
+        # 'a' was evicted from memory, so this read goes to disk
+        return await cache.get_async('a'), await cache.get_async('a')
+
+    assert asyncio.run(roundtrip()) == (PREDICTION, PREDICTION)
+    assert len(threads) == 3
+    assert all(name.startswith('cache-predictions') for name in threads)
+    assert cache.get_metrics()['disk_hits'] == 1 and cache.get_metrics()['hits'] == 1
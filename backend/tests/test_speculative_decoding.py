@@ -0,0 +1,107 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+
+from app.services.inference.prefix_cache import PrefixCache
+from app.services.inference.speculative import SpeculativeDecoder
+
+from tiny_lm import tiny_model, tiny_tokenizer
+
+# Two small causal LMs sharing a tokenizer stand in for MedGemma 27B (target) and 4B (draft): tiny
+# random GPT-2s built offline, unless both are named to test with Hub models (e.g. distilgpt2 and
+# sshleifer/tiny-gpt2)
+TARGET_MODEL = os.environ.get("SPECULATIVE_TEST_TARGET")
+DRAFT_MODEL = os.environ.get("SPECULATIVE_TEST_DRAFT")
+
+PROMPTS = [
+    "Patient presents with fever and cough for three days.",
+    "Chest pain radiating to the left arm, sweating and nausea.",
+    "A 64 year old with shortness of breath, oxygen saturation 91 percent, history of COPD and smoking.",
+]
+PREFIX = "Clinical case analysis. List the most likely diagnoses and the next tests to order.\n"
+
+def load(name):
+    # float64 keeps one-token and multi-token forward passes numerically identical for argmax
+    return transformers.AutoModelForCausalLM.from_pretrained(name).double().eval()
+
+@pytest.fixture(scope="module")
+def models():
+    if not (TARGET_MODEL and DRAFT_MODEL):
+        tokenizer = tiny_tokenizer()
+        return tokenizer, tiny_model(tokenizer, layers=4, width=64), tiny_model(tokenizer, seed=1)
+    tokenizer = transformers.AutoTokenizer.from_pretrained(TARGET_MODEL)
+    return tokenizer, load(TARGET_MODEL), load(DRAFT_MODEL)
+
+def generate_alone(tokenizer, model, prompt, max_new_tokens):
+    inputs = tokenizer(prompt, return_tensors="pt")
+    with torch.no_grad():
+        outputs = model.generate(
+            **inputs,
+            max_new_tokens=max_new_tokens,
+            do_sample=False,
+            pad_token_id=tokenizer.eos_token_id
+        )
+    return outputs[0, inputs['input_ids'].shape[1]:].tolist()
+
+def speculate(decoder, tokenizer, target, draft, prompt, max_new_tokens, **kwargs):
+    with torch.no_grad():
+        return decoder.generate(
+            target, draft, tokenizer(prompt)['input_ids'], max_new_tokens,
+            eos_token_id=tokenizer.eos_token_id, **kwargs
+        )
+
+def test_greedy_output_matches_target(models):
+    """Whatever the draft proposes, greedy speculative decoding reproduces the target's own output"""
+    tokenizer, target, draft = models
+    decoder = SpeculativeDecoder(num_draft_tokens=4)
+    for prompt in PROMPTS:
+        assert speculate(decoder, tokenizer, target, draft, prompt, 24) == generate_alone(tokenizer, target, prompt, 24)
+    metrics = decoder.get_metrics()
+    assert metrics['drafted'] > 0
+    assert metrics['tokens_per_target_pass'] >= 1.0
+
+def test_identical_draft_is_always_accepted(models):
+    """With the target as its own draft every proposal is accepted: k + 1 tokens per target pass"""
+    tokenizer, target, _ = models
+    decoder = SpeculativeDecoder(num_draft_tokens=3)
+    tokens = speculate(decoder, tokenizer, target, target, PROMPTS[0], 17)
+    assert tokens == generate_alone(tokenizer, target, PROMPTS[0], 17)
+    assert decoder.get_metrics()['acceptance_rate'] == 1.0
+
+def test_prefix_cache_and_stop(models):
+    """Starting both models from cached prefix state, and stopping early, matches plain decoding"""
+    tokenizer, target, draft = models
+    prefix_cache = PrefixCache(max_bytes=64 * 1024 * 1024)
+    prompt = PREFIX + PROMPTS[1]
+    prefix_ids, suffix_ids = prefix_cache.split(tokenizer, prompt, PREFIX)
+    expected = generate_alone(tokenizer, target, prompt, 20)
+    stop_after = expected[9]
+
+    seen = []
+    with torch.no_grad():
+        tokens = SpeculativeDecoder(num_draft_tokens=4).generate(
+            target, draft, prefix_ids + suffix_ids, 20,
+            eos_token_id=tokenizer.eos_token_id,
+            on_token=seen.append,
+            stop=lambda token: token == stop_after,
+            target_past=prefix_cache.get('target', target, tokenizer, PREFIX).past_key_values(),
+            draft_past=prefix_cache.get('draft', draft, tokenizer, PREFIX).past_key_values(),
+            past_length=len(prefix_ids)
+        )
+    assert tokens == expected[:expected.index(stop_after) + 1]
+    assert seen == tokens
+
+def test_sampling_runs_within_budget(models):
+    tokenizer, target, draft = models
+    torch.manual_seed(0)
+    decoder = SpeculativeDecoder(num_draft_tokens=4)
+    tokens = speculate(decoder, tokenizer, target, draft, PROMPTS[2], 16, do_sample=True, temperature=0.7, top_p=0.9)
+    assert 1 <= len(tokens) <= 16
+    assert 0.0 <= decoder.get_metrics()['acceptance_rate'] <= 1.0
@@ -0,0 +1,24 @@
+import torch
+import transformers
+from tokenizers import Tokenizer, decoders, models, pre_tokenizers
+
+EOS = "<|endoftext|>"
+
+def tiny_tokenizer():
+    """Byte-level GPT-2 style tokenizer with no merges: one token per byte, plus end of text"""
+    alphabet = pre_tokenizers.ByteLevel.alphabet()
+    vocab = {char: index for index, char in enumerate(sorted(alphabet))}
+    vocab[EOS] = len(vocab)
+    tokenizer = Tokenizer(models.BPE(vocab=vocab, merges=[]))
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    return transformers.PreTrainedTokenizerFast(tokenizer_object=tokenizer, eos_token=EOS, bos_token=EOS)
+
+def tiny_model(tokenizer, layers=2, width=32, seed=0):
+    """Randomly initialised GPT-2; float64 keeps padded and unpadded forward passes identical for argmax"""
+    torch.manual_seed(seed)
+    config = transformers.GPT2Config(
+        vocab_size=len(tokenizer), n_positions=512, n_embd=width, n_layer=layers, n_head=2,
+        bos_token_id=tokenizer.eos_token_id, eos_token_id=tokenizer.eos_token_id
+    )
+    return transformers.GPT2LMHeadModel(config).double().eval()
@@ -0,0 +1,140 @@
+import os
+import argparse
+import torch
+from pneumonia_classifier import get_model
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Configuration Parameters
+CONFIG = {
+    'model_save_dir': 'ml_models/disease_classifiers/pneumonia/models',
+    'image_size': 224,
+    'model_type': 'resnet50',
+    'num_classes': 2,
+    'onnx_opset': 17,
+    'parity_batch_sizes': [1, 4],
+    'parity_tolerance': 1e-4  # Max absolute difference in class probabilities vs eager
+}
+
+# Artifact naming must match backend/app/services/inference/engines.py
+ARTIFACT_SUFFIXES = {
+    'torchscript': '.torchscript.pt',
+    'onnx': '.onnx'
+}
+
+def artifact_path(checkpoint_path, engine):
+    """Path of the exported artifact for a checkpoint and engine type"""
+    return os.path.splitext(checkpoint_path)[0] + ARTIFACT_SUFFIXES[engine]
+
+def load_eager_model(checkpoint_path, model_type):
+    """Load a trained checkpoint into its eager nn.Module on CPU"""
+    logger.info(f"Loading {model_type} checkpoint from {checkpoint_path}")
+    model = get_model(model_type, CONFIG['num_classes'])
+    checkpoint = torch.load(checkpoint_path, map_location='cpu')
+    model.load_state_dict(checkpoint['model_state_dict'])
+    model.eval()
+    return model
+
+def example_input(batch_size=1):
+    return torch.randn(batch_size, 3, CONFIG['image_size'], CONFIG['image_size'])
+
+def export_torchscript(model, output_path):
+    """Trace and freeze the model into a TorchScript graph"""
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example_input(2))
+        frozen = torch.jit.freeze(traced)
+    frozen.save(output_path)
+    logger.info(f"TorchScript model saved to {output_path}")
+    return output_path
+
+def export_onnx(model, output_path):
+    """Export the model to ONNX with a dynamic batch axis"""
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            example_input(1),
+            output_path,
+            input_names=['input'],
+            output_names=['logits'],
+            dynamic_axes={'input': {0: 'batch'}, 'logits': {0: 'batch'}},
+            opset_version=CONFIG['onnx_opset'],
+            do_constant_folding=True
+        )
+    logger.info(f"ONNX model saved to {output_path}")
+    return output_path
+
+def torchscript_runner(path):
+    model = torch.jit.load(path, map_location='cpu').eval()
+    def run(batch):
+        with torch.no_grad():
+            return model(batch)
+    return run
+
+def onnx_runner(path):
+    import onnxruntime as ort
+    session = ort.InferenceSession(path, providers=['CPUExecutionProvider'])
+    input_name = session.get_inputs()[0].name
+    def run(batch):
+        return torch.from_numpy(session.run(None, {input_name: batch.numpy()})[0])
+    return run
+
+def check_parity(model, runner, batch_sizes=None, tolerance=None):
+    """
+    Compare class probabilities from an exported engine against eager mode.
+    Returns the largest absolute difference seen and whether it is within tolerance.
+    """
+    batch_sizes = batch_sizes or CONFIG['parity_batch_sizes']
+    tolerance = tolerance if tolerance is not None else CONFIG['parity_tolerance']
+    torch.manual_seed(0)
+
+    max_diff = 0.0
+    for batch_size in batch_sizes:
+        batch = example_input(batch_size)
+        with torch.no_grad():
+            expected = torch.softmax(model(batch), dim=1)
+        actual = torch.softmax(runner(batch), dim=1)
+        max_diff = max(max_diff, (expected - actual).abs().max().item())
+
+    return max_diff, max_diff <= tolerance
+
+def main():
+    parser = argparse.ArgumentParser(description='Export a pneumonia checkpoint to TorchScript and ONNX')
+    parser.add_argument('--checkpoint', default=os.path.join(CONFIG['model_save_dir'], 'best_model.pth'))
+    parser.add_argument('--model-type', default=CONFIG['model_type'],
+                        choices=['resnet50', 'densenet121', 'efficientnet_b0'])
+    parser.add_argument('--formats', nargs='+', default=['torchscript', 'onnx'],
+                        choices=list(ARTIFACT_SUFFIXES))
+    parser.add_argument('--tolerance', type=float, default=CONFIG['parity_tolerance'])
+    args = parser.parse_args()
+
+    if not os.path.exists(args.checkpoint):
+        logger.error(f"Error: Model not found at {args.checkpoint}")
+        logger.error("Please train the model first using pneumonia_classifier.py")
+        return 1
+
+    model = load_eager_model(args.checkpoint, args.model_type)
+
+    exporters = {
+        'torchscript': (export_torchscript, torchscript_runner),
+        'onnx': (export_onnx, onnx_runner)
+    }
+
+    failed = False
+    for fmt in args.formats:
+        export, runner = exporters[fmt]
+        path = export(model, artifact_path(args.checkpoint, fmt))
+
+        max_diff, ok = check_parity(model, runner(path), tolerance=args.tolerance)
+        if ok:
+            logger.info(f"{fmt} parity OK: max probability difference {max_diff:.2e}")
+        else:
+            logger.error(f"{fmt} parity FAILED: max probability difference {max_diff:.2e} > {args.tolerance:.2e}")
+            failed = True
+
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
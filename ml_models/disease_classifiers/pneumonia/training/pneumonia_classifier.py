@@ -64,16 +64,18 @@ class PneumoniaDataset(Dataset):
         
         return image, label
 
-def get_model(model_type, num_classes):
-    """Initialize the specified model architecture"""
+def get_model(model_type, num_classes, pretrained=None):
+    """Initialize the specified model architecture (ImageNet weights unless pretrained=False)"""
+    if pretrained is None:
+        pretrained = CONFIG['use_pretrained']
     if model_type == 'resnet50':
-        model = models.resnet50(pretrained=CONFIG['use_pretrained'])
+        model = models.resnet50(pretrained=pretrained)
         model.fc = nn.Linear(model.fc.in_features, num_classes)
     elif model_type == 'densenet121':
-        model = models.densenet121(pretrained=CONFIG['use_pretrained'])
+        model = models.densenet121(pretrained=pretrained)
         model.classifier = nn.Linear(model.classifier.in_features, num_classes)
     elif model_type == 'efficientnet_b0':
-        model = models.efficientnet_b0(pretrained=CONFIG['use_pretrained'])
+        model = models.efficientnet_b0(pretrained=pretrained)
         model.classifier[1] = nn.Linear(model.classifier[1].in_features, num_classes)
     else:
         raise ValueError(f"Unsupported model type: {model_type}")
@@ -163,6 +165,7 @@ def train_model(model, train_loader, val_loader, criterion, optimizer, num_epoch
                 'model_state_dict': model.state_dict(),
                 'optimizer_state_dict': optimizer.state_dict(),
                 'val_acc': val_acc,
+                'model_type': CONFIG['model_type'],
             }, os.path.join(CONFIG['model_save_dir'], 'best_model.pth'))
         else:
             patience_counter += 1
@@ -1,9 +1,9 @@
 import os
 import torch
-from torchvision import transforms
 from PIL import Image
 import matplotlib.pyplot as plt
 from pneumonia_classifier import get_model, CONFIG
+from preprocessing import Preprocessor
 import logging
 
 # Set up logging
@@ -44,18 +44,9 @@ def predict_image(model, image_path):
     """Make prediction for a single image"""
     logger.info(f"Processing image: {image_path}")
     
-    # Load and preprocess image
-    image = Image.open(image_path).convert('RGB')
-    
-    # Define transform
-    transform = transforms.Compose([
-        transforms.Resize((CONFIG['image_size'], CONFIG['image_size'])),
-        transforms.ToTensor(),
-        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-    ])
-    
-    # Transform image
-    image_tensor = transform(image).unsqueeze(0).to(CONFIG['device'])
+    # Decode and preprocess image (shared with the backend service)
+    preprocessor = Preprocessor(CONFIG['image_size'], max_batch_size=1)
+    image_tensor = preprocessor.batch([preprocessor.decode(image_path)]).to(CONFIG['device'])
     
     # Make prediction
     with torch.no_grad():
@@ -0,0 +1,83 @@
+import threading
+import numpy as np
+import torch
+from PIL import Image
+
+# ImageNet statistics used when training the classifiers in pneumonia_classifier.py
+IMAGE_SIZE = 224
+MEAN = (0.485, 0.456, 0.406)
+STD = (0.229, 0.224, 0.225)
+
+# JPEG draft decoding is only used when the source can be reduced by at least this
+# factor relative to the target; the decoded image is still at least 2x the target
+# so the final resize keeps antialiasing comparable to full-resolution decoding.
+DRAFT_OVERSAMPLE = 2
+
+def decode_image(source, size=IMAGE_SIZE, draft=True):
+    """
+    Decode an image file (path or file object) to an RGB uint8 array of shape [size, size, 3].
+
+    Large JPEGs are decoded at a reduced scale (1/2, 1/4 or 1/8) by the decoder
+    itself, which skips most of the IDCT work for multi-megapixel X-rays.
+    """
+    image = Image.open(source)
+    if draft and image.format == 'JPEG':
+        target = size * DRAFT_OVERSAMPLE
+        if min(image.size) >= 2 * target:
+            image.draft('RGB', (target, target))
+    return resize_image(image, size)
+
+def resize_image(image, size=IMAGE_SIZE):
+    """Convert a PIL image to RGB and resize it to an RGB uint8 array of shape [size, size, 3]"""
+    # Same filter torchvision's Resize applies to PIL images, so results match training
+    image = image.convert('RGB')
+    if image.size != (size, size):
+        image = image.resize((size, size), Image.BILINEAR)
+    return np.asarray(image, dtype=np.uint8)
+
+class Preprocessor:
+    """
+    Turns uint8 [H, W, 3] images into a normalized float32 [N, 3, H, W] batch in one
+    vectorized pass.
+
+    Batches are written into a preallocated buffer (pinned when CUDA is available, so
+    the host-to-device copy can be asynchronous). Each thread gets its own buffer; the
+    returned tensor is a view into it and is only valid until the same thread builds
+    its next batch.
+    """
+
+    def __init__(self, size=IMAGE_SIZE, mean=MEAN, std=STD, max_batch_size=16, pin_memory=None):
+        self.size = size
+        self.max_batch_size = max_batch_size
+        self.pin_memory = torch.cuda.is_available() if pin_memory is None else pin_memory
+        # (x / 255 - mean) / std == x * scale - shift
+        std = torch.tensor(std, dtype=torch.float32).view(1, 3, 1, 1)
+        self._scale = 1.0 / (255.0 * std)
+        self._shift = torch.tensor(mean, dtype=torch.float32).view(1, 3, 1, 1) / std
+        self._local = threading.local()
+
+    def decode(self, source, draft=True):
+        return decode_image(source, self.size, draft)
+
+    def resize(self, image):
+        return resize_image(image, self.size)
+
+    def _buffer(self, batch_size):
+        if batch_size > self.max_batch_size:
+            return torch.empty((batch_size, 3, self.size, self.size), dtype=torch.float32)
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None:
+            buffer = torch.empty((self.max_batch_size, 3, self.size, self.size), dtype=torch.float32)
+            if self.pin_memory:
+                buffer = buffer.pin_memory()
+            self._local.buffer = buffer
+        return buffer[:batch_size]
+
+    def batch(self, images):
+        """Normalize a sequence of uint8 [size, size, 3] arrays into a [N, 3, size, size] tensor"""
+        stacked = torch.from_numpy(np.stack(images))
+        out = self._buffer(len(images))
+        # One strided copy converts HWC uint8 to CHW float32, then normalize in place
+        out.copy_(stacked.permute(0, 3, 1, 2))
+        out.mul_(self._scale).sub_(self._shift)
+        return out
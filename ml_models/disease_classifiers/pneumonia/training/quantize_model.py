@@ -0,0 +1,181 @@
+import os
+import copy
+import json
+import time
+import argparse
+import torch
+import torch.nn as nn
+from torch.utils.data import DataLoader
+from torchvision import transforms
+from pneumonia_classifier import get_model, PneumoniaDataset
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Configuration Parameters
+CONFIG = {
+    'data_dir': 'ml_models/data_preparation/datasets/pneumonia',
+    'model_save_dir': 'ml_models/disease_classifiers/pneumonia/models',
+    'results_dir': 'ml_models/disease_classifiers/pneumonia/results/quantization',
+    'image_size': 224,
+    'model_type': 'resnet50',
+    'num_classes': 2,
+    'batch_size': 32,
+    'calibration_batches': 20,   # Batches from the validation split used to calibrate activations
+    'latency_runs': 50,          # Single-image forward passes timed per model
+    'quantized_engine': 'x86',   # Must match the backend's QuantizedEngine
+    'num_threads': 1             # Threads used while timing, to mirror one serving worker
+}
+
+# Artifact naming must match backend/app/services/inference/engines.py
+INT8_SUFFIX = '.int8.torchscript.pt'
+
+def int8_artifact_path(checkpoint_path):
+    return os.path.splitext(checkpoint_path)[0] + INT8_SUFFIX
+
+def load_fp32_model(checkpoint_path, model_type):
+    """Load a trained checkpoint on CPU"""
+    logger.info(f"Loading {model_type} checkpoint from {checkpoint_path}")
+    model = get_model(model_type, CONFIG['num_classes'])
+    checkpoint = torch.load(checkpoint_path, map_location='cpu')
+    model.load_state_dict(checkpoint['model_state_dict'])
+    model.eval()
+    return model
+
+def get_loader(split):
+    transform = transforms.Compose([
+        transforms.Resize((CONFIG['image_size'], CONFIG['image_size'])),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+    ])
+    dataset = PneumoniaDataset(os.path.join(CONFIG['data_dir'], split), transform=transform)
+    return DataLoader(dataset, batch_size=CONFIG['batch_size'], shuffle=False, num_workers=4)
+
+def quantize_dynamic(model):
+    """Dynamic INT8 quantization: Linear weights are quantized, activations at runtime"""
+    return torch.ao.quantization.quantize_dynamic(copy.deepcopy(model), {nn.Linear}, dtype=torch.qint8)
+
+def quantize_static(model, calibration_loader, num_batches):
+    """Static post-training quantization (FX graph mode) calibrated on the validation split"""
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+    torch.backends.quantized.engine = CONFIG['quantized_engine']
+    qconfig_mapping = get_default_qconfig_mapping(CONFIG['quantized_engine'])
+    example_inputs = (torch.randn(1, 3, CONFIG['image_size'], CONFIG['image_size']),)
+    prepared = prepare_fx(copy.deepcopy(model), qconfig_mapping, example_inputs)
+
+    logger.info(f"Calibrating on up to {num_batches} validation batches...")
+    with torch.no_grad():
+        for i, (inputs, _) in enumerate(calibration_loader):
+            if i >= num_batches:
+                break
+            prepared(inputs)
+
+    return convert_fx(prepared)
+
+def save_torchscript(model, output_path):
+    example = torch.randn(1, 3, CONFIG['image_size'], CONFIG['image_size'])
+    with torch.no_grad():
+        traced = torch.jit.freeze(torch.jit.trace(model, example))
+    traced.save(output_path)
+    logger.info(f"Quantized model saved to {output_path}")
+
+def evaluate_accuracy(model, loader):
+    correct = 0
+    total = 0
+    with torch.no_grad():
+        for inputs, labels in loader:
+            _, preds = model(inputs).max(1)
+            correct += preds.eq(labels).sum().item()
+            total += labels.size(0)
+    return 100. * correct / total if total else 0.0
+
+def measure_latency_ms(model):
+    """Median single-image latency"""
+    example = torch.randn(1, 3, CONFIG['image_size'], CONFIG['image_size'])
+    timings = []
+    with torch.no_grad():
+        for _ in range(5):
+            model(example)
+        for _ in range(CONFIG['latency_runs']):
+            start = time.perf_counter()
+            model(example)
+            timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+def weights_size_mb(model):
+    return sum(t.numel() * t.element_size() for t in model.state_dict().values()) / 1024 / 1024
+
+def file_size_mb(path):
+    return os.path.getsize(path) / 1024 / 1024
+
+def main():
+    parser = argparse.ArgumentParser(description='Quantize a pneumonia checkpoint to INT8 for CPU serving')
+    parser.add_argument('--checkpoint', default=os.path.join(CONFIG['model_save_dir'], 'best_model.pth'))
+    parser.add_argument('--model-type', default=CONFIG['model_type'],
+                        choices=['resnet50', 'densenet121', 'efficientnet_b0'])
+    parser.add_argument('--mode', default='static', choices=['static', 'dynamic'])
+    parser.add_argument('--calibration-batches', type=int, default=CONFIG['calibration_batches'])
+    args = parser.parse_args()
+
+    if not os.path.exists(args.checkpoint):
+        logger.error(f"Error: Model not found at {args.checkpoint}")
+        logger.error("Please train the model first using pneumonia_classifier.py")
+        return 1
+
+    torch.set_num_threads(CONFIG['num_threads'])
+    model = load_fp32_model(args.checkpoint, args.model_type)
+
+    if args.mode == 'static':
+        quantized = quantize_static(model, get_loader('val'), args.calibration_batches)
+    else:
+        quantized = quantize_dynamic(model)
+
+    output_path = int8_artifact_path(args.checkpoint)
+    save_torchscript(quantized, output_path)
+
+    # Report accuracy and latency change on the test split
+    logger.info("Evaluating fp32 and int8 models on the test split...")
+    test_loader = get_loader('test')
+    fp32_acc = evaluate_accuracy(model, test_loader)
+    int8_acc = evaluate_accuracy(quantized, test_loader)
+    fp32_latency = measure_latency_ms(model)
+    int8_latency = measure_latency_ms(quantized)
+
+    report = {
+        'model_type': args.model_type,
+        'mode': args.mode,
+        'checkpoint': args.checkpoint,
+        'artifact': output_path,
+        'test_accuracy': {
+            'fp32': fp32_acc,
+            'int8': int8_acc,
+            'delta': int8_acc - fp32_acc
+        },
+        'latency_ms': {
+            'fp32': fp32_latency,
+            'int8': int8_latency,
+            'speedup': fp32_latency / int8_latency if int8_latency else None
+        },
+        'size_mb': {
+            'fp32_weights': weights_size_mb(model),
+            'int8_artifact': file_size_mb(output_path)
+        }
+    }
+
+    os.makedirs(CONFIG['results_dir'], exist_ok=True)
+    report_path = os.path.join(CONFIG['results_dir'], f"{args.model_type}_{args.mode}.json")
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    logger.info(f"Test accuracy: fp32 {fp32_acc:.2f}% -> int8 {int8_acc:.2f}% ({int8_acc - fp32_acc:+.2f})")
+    logger.info(f"Latency: fp32 {fp32_latency:.1f}ms -> int8 {int8_latency:.1f}ms")
+    logger.info(f"Report saved to {report_path}")
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())